@@ -42,6 +42,11 @@ CSRF_TRUSTED_ORIGINS = [
     'https://pagos.colegionuevosiglo.edu.ar',
     'https://colegio-nuevo-siglo-production.up.railway.app'
 ]
+
+# Proxies delante de la app (Railway): la IP real del cliente es la que agrega
+# el último a X-Forwarded-For. Se usa para el límite de la consulta pública.
+PROXIES_CONFIABLES = int(os.environ.get('PROXIES_CONFIABLES', '1'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -99,6 +104,29 @@ DATABASES = {
     )
 }
 
+# Lookups de pg_trgm para la búsqueda de alumnos (solo con PostgreSQL)
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
+# Caché compartida entre workers de gunicorn (tabla en la base de datos).
+# La tabla se crea con `python manage.py createcachetable` (ver build.sh).
+# Guarda claves por DNI (versiones de la vista de familia), por IP (límite de
+# la consulta pública) y por faceta; con el default de Django (300 entradas,
+# se borra un tercio al llenarse) se perderían versiones y contadores en
+# plena temporada de pagos. MAX_ENTRIES alcanza para varias claves por
+# familia y por IP; al llenarse se borra 1/CULL_FREQUENCY de la tabla.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'portal_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '50000')),
+            'CULL_FREQUENCY': int(os.environ.get('CACHE_CULL_FREQUENCY', '10')),
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -162,6 +190,8 @@ else:
 
 ANYMAIL = {
     'RESEND_API_KEY': os.environ.get('RESEND_API_KEY'),
+    # Webhook de eventos (rebotes/quejas) para la lista de supresión de emails
+    'RESEND_SIGNING_SECRET': os.environ.get('RESEND_SIGNING_SECRET'),
 }
 
 DEFAULT_FROM_EMAIL = os.environ.get(
@@ -169,6 +199,22 @@ DEFAULT_FROM_EMAIL = os.environ.get(
     'Colegio Nuevo Siglo <cobranzasns@colegionuevosiglo.edu.ar>'
 )
 
+# Campañas de avisos programadas (manage.py enviar_campanias vía cron).
+# Solo se envía dentro de esta franja horaria local, para no competir con los
+# padres que usan el portal durante el día. Puede cruzar la medianoche (ej: 22 a 6).
+CAMPANIAS_HORA_INICIO = int(os.environ.get('CAMPANIAS_HORA_INICIO', '1'))
+CAMPANIAS_HORA_FIN = int(os.environ.get('CAMPANIAS_HORA_FIN', '6'))
+# Una ejecución en curso sin avances (tandas enviadas) durante estos minutos
+# se da por muerta y la próxima corrida la retoma sin reenviar lo ya enviado.
+CAMPANIAS_MINUTOS_SIN_PROGRESO = int(os.environ.get('CAMPANIAS_MINUTOS_SIN_PROGRESO', '60'))
+
+# Auditoría: los registros se encolan en memoria y un hilo los inserta en lote
+# (ver portal/auditoria_services.py). Los tests que leen la auditoría la
+# desactivan con override_settings: el hilo no ve las transacciones de cada test.
+AUDITORIA_ASINCRONA = os.environ.get('AUDITORIA_ASINCRONA', 'True').lower() in ('true', '1', 'yes')
+# Meses de auditoría que quedan en la tabla (manage.py archivar_auditoria)
+AUDITORIA_RETENCION_MESES = int(os.environ.get('AUDITORIA_RETENCION_MESES', '12'))
+
 # Static files configuration for production
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
@@ -207,4 +253,8 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
     },
+    # Archivos que no son imágenes (meses de auditoría archivados)
+    "archivos": {
+        "BACKEND": "cloudinary_storage.storage.RawMediaCloudinaryStorage",
+    },
 }
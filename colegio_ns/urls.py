@@ -11,6 +11,10 @@ urlpatterns = [
     path('', include('portal.urls')),  # Portal de padres en la raíz
 ]
 
+# Webhooks de anymail (rebotes de Resend -> lista de supresión), solo si están configurados
+if settings.ANYMAIL.get('RESEND_SIGNING_SECRET'):
+    urlpatterns += [path('anymail/', include('anymail.urls'))]
+
 # Servir archivos media en desarrollo
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
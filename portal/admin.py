@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Alumno, ConceptoDeuda, RegistroDeuda
+from django.contrib.auth.models import User
+from .busqueda_services import buscar_alumnos
+from .responsables_services import propagar_email
+from .vista_familia_services import invalidar_familias, invalidar_familias_de
+from .models import (
+    Alumno, ConceptoDeuda, RegistroDeuda, EmailSuprimido,
+    CampaniaAviso, EjecucionCampania, SaldoFamilia, Responsable, Vinculo,
+)
 
 
 class RegistroDeudaInline(admin.TabularInline):
@@ -9,13 +16,34 @@ class RegistroDeudaInline(admin.TabularInline):
     can_delete = False
 
 
+class VinculoAlumnoInline(admin.TabularInline):
+    # Los roles alumno/padre/madre/tutor se regeneran desde las columnas al guardar;
+    # acá se agregan los responsables extra (rol 'otro')
+    model = Vinculo
+    extra = 0
+    raw_id_fields = ['responsable']
+
+
 @admin.register(Alumno)
 class AlumnoAdmin(admin.ModelAdmin):
-    list_display = ['documento', 'apellido', 'nombres', 'curso_completo', 'saldo_moroso']
+    list_display = ['documento', 'apellido', 'nombres', 'curso_completo', 'saldo_moroso', 'deudas_pendientes']
     list_filter = ['nivel', 'curso', 'division']
     search_fields = ['documento', 'apellido', 'nombres', 'padre_dni', 'madre_dni', 'tutor_dni']
-    readonly_fields = ['saldo_moroso']
-    inlines = [RegistroDeudaInline]
+    readonly_fields = ['saldo_moroso', 'deudas_pendientes']
+    inlines = [VinculoAlumnoInline, RegistroDeudaInline]
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidar_familias_de(Alumno.objects.filter(documento=form.instance.documento))
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Índice de términos (DNI exacto o prefijo) en vez de icontains sobre seis columnas
+        if not search_term:
+            return queryset, False
+        coincidencias = buscar_alumnos(search_term)
+        if coincidencias is None:
+            return queryset.none(), False
+        return queryset.filter(documento__in=coincidencias), False
     
     fieldsets = (
         ('Datos del Alumno', {
@@ -41,7 +69,7 @@ class AlumnoAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Estado de Cuenta', {
-            'fields': ('saldo_moroso', 'recargo', 'familia')
+            'fields': ('saldo_moroso', 'deudas_pendientes', 'recargo', 'familia')
         }),
     )
 
@@ -59,3 +87,59 @@ class RegistroDeudaAdmin(admin.ModelAdmin):
     list_filter = ['estado', 'concepto']
     search_fields = ['alumno__apellido', 'alumno__nombres', 'alumno__documento']
     raw_id_fields = ['alumno']
+
+
+@admin.register(SaldoFamilia)
+class SaldoFamiliaAdmin(admin.ModelAdmin):
+    list_display = ['familia', 'saldo', 'deudas_pendientes', 'alumnos', 'fecha_actualizacion']
+    search_fields = ['familia']
+    readonly_fields = ['familia', 'saldo', 'deudas_pendientes', 'alumnos', 'fecha_actualizacion']
+
+
+@admin.register(EmailSuprimido)
+class EmailSuprimidoAdmin(admin.ModelAdmin):
+    list_display = ['email', 'motivo', 'fecha']
+    list_filter = ['motivo']
+    search_fields = ['email']
+    readonly_fields = ['fecha']
+
+
+class EjecucionCampaniaInline(admin.TabularInline):
+    model = EjecucionCampania
+    extra = 0
+    readonly_fields = [
+        'periodo', 'estado', 'destinatarios', 'enviados', 'fallidos', 'fecha_inicio', 'fecha_progreso', 'fecha_fin',
+    ]
+    can_delete = False
+
+
+@admin.register(CampaniaAviso)
+class CampaniaAvisoAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'dia_del_mes', 'solo_vencidas', 'activa']
+    list_filter = ['activa']
+    inlines = [EjecucionCampaniaInline]
+
+
+class VinculoResponsableInline(admin.TabularInline):
+    model = Vinculo
+    extra = 0
+    raw_id_fields = ['alumno']
+
+
+@admin.register(Responsable)
+class ResponsableAdmin(admin.ModelAdmin):
+    list_display = ['dni', 'nombre', 'email', 'telefono']
+    search_fields = ['=dni', 'nombre', 'email']
+    inlines = [VinculoResponsableInline]
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Corrección de email: se copia a las columnas de sus alumnos y a su usuario
+        if change and 'email' in form.changed_data:
+            propagar_email(obj.dni, obj.email)
+            User.objects.filter(perfil__dni=obj.dni).update(email=obj.email)
+    
+    def save_related(self, request, form, formsets, change):
+        # Los vínculos se guardan después del responsable: recién ahora cambia su vista del portal
+        super().save_related(request, form, formsets, change)
+        invalidar_familias([form.instance.dni])
@@ -0,0 +1,245 @@
+"""
+auditoria_services.py — Registro de auditoría: escritura diferida y retención.
+
+RegistroAuditoria.log() se llama en el camino de cada login, logout, envío y
+verificación de pago. Con AUDITORIA_ASINCRONA (default en producción) el
+registro no se inserta en el momento: se encola en memoria del proceso y un
+hilo del propio worker los inserta con bulk_create cuando se juntan
+AUDITORIA_LOTE (default: 50) o cada AUDITORIA_INTERVALO_SEGUNDOS (default: 2).
+
+- La fecha del registro es la del evento (se asigna al encolar), no la del
+  insert.
+- Si la cola llega a AUDITORIA_MAXIMO_ENCOLADOS (default: 5000), por ejemplo
+  con la base caída, log() vuelve a insertar en el momento.
+- Si un insert en lote falla por un registro inválido (usuario borrado
+  mientras estaba en cola, datos que no entran en la columna), se insertan
+  de a uno y los inválidos se descartan con un error en el log: una fila
+  mala no traba la cola. Si falla por otra causa (base caída), los registros
+  vuelven a la cola para el próximo intento.
+- Al terminar el proceso (atexit: reinicio de gunicorn, fin de un comando)
+  se vacía la cola de forma sincrónica.
+
+Un registro encolado se pierde solo si el proceso muere sin pasar por atexit
+(SIGKILL), con a lo sumo el último intervalo de eventos.
+
+Retención (`manage.py archivar_auditoria`, vía cron): los meses completos
+anteriores a AUDITORIA_RETENCION_MESES (default: 12) se exportan a
+auditoria/auditoria-AAAA-MM.jsonl.gz en el storage 'archivos' (o el default)
+y se borran de la tabla con un DELETE por rango de timestamp. Así la tabla
+viva queda acotada a un año y los filtros por rango de fechas del panel
+recorren el índice de timestamp.
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import queue
+import tempfile
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_cola = queue.Queue()
+_despertar = threading.Event()
+_lock_hilo = threading.Lock()
+_lock_vaciado = threading.Lock()
+_hilo = None
+
+
+def _config():
+    return {
+        'lote': getattr(settings, 'AUDITORIA_LOTE', 50),
+        'intervalo': getattr(settings, 'AUDITORIA_INTERVALO_SEGUNDOS', 2),
+        'maximo': getattr(settings, 'AUDITORIA_MAXIMO_ENCOLADOS', 5000),
+    }
+
+
+def _iniciar_hilo():
+    """Arranca el hilo de vaciado la primera vez que se encola (ya en el worker)."""
+    global _hilo
+    if _hilo is not None and _hilo.is_alive():
+        return
+    with _lock_hilo:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_vaciar_periodicamente, name='auditoria', daemon=True)
+            _hilo.start()
+
+
+def _vaciar_periodicamente():
+    while True:
+        _despertar.wait(_config()['intervalo'])
+        _despertar.clear()
+        try:
+            vaciar_auditoria()
+        except Exception:
+            logger.exception("[AUDITORIA] Falló el insert en lote; se reintenta en el próximo ciclo")
+        finally:
+            # Conexión propia del hilo: no dejarla abierta entre ciclos
+            connection.close()
+
+
+def _insertar_de_a_uno(registros):
+    """
+    Inserta los registros uno por uno descartando los inválidos. Ante un
+    error que no es del registro, devuelve a la cola los que faltan.
+
+    Returns:
+        int con la cantidad de registros insertados
+    """
+    insertados = 0
+    for posicion, registro in enumerate(registros):
+        try:
+            with transaction.atomic():
+                registro.save()
+        except (IntegrityError, DataError) as error:
+            logger.error(
+                f"[AUDITORIA] Registro descartado ({error}): usuario={registro.usuario_id} "
+                f"accion={registro.accion!r} fecha={registro.timestamp:%Y-%m-%d %H:%M:%S} "
+                f"detalles={registro.detalles!r}"
+            )
+        except Exception:
+            for pendiente in registros[posicion:]:
+                _cola.put(pendiente)
+            raise
+        else:
+            insertados += 1
+    return insertados
+
+
+def vaciar_auditoria():
+    """
+    Inserta todos los registros encolados con bulk_create. Si el lote tiene
+    registros inválidos, inserta de a uno y descarta esos; si el insert falla
+    por otra causa, los devuelve a la cola y propaga el error.
+
+    Returns:
+        int con la cantidad de registros insertados
+    """
+    from .models import RegistroAuditoria
+
+    with _lock_vaciado:
+        registros = []
+        while True:
+            try:
+                registros.append(_cola.get_nowait())
+            except queue.Empty:
+                break
+        if not registros:
+            return 0
+        try:
+            RegistroAuditoria.objects.bulk_create(registros, batch_size=_config()['lote'])
+        except (IntegrityError, DataError):
+            # El lote se revirtió: los registros vuelven a ser nuevos
+            for registro in registros:
+                registro.pk = None
+                registro._state.adding = True
+            return _insertar_de_a_uno(registros)
+        except Exception:
+            for registro in registros:
+                _cola.put(registro)
+            raise
+    return len(registros)
+
+
+def registrar(registro):
+    """
+    Guarda un RegistroAuditoria (sin guardar): lo encola si la escritura
+    diferida está activa y la cola tiene lugar, o lo inserta en el momento.
+    Devuelve el mismo registro; si quedó encolado todavía no tiene pk.
+    """
+    config = _config()
+    if not getattr(settings, 'AUDITORIA_ASINCRONA', False) or _cola.qsize() >= config['maximo']:
+        registro.save()
+        return registro
+    _iniciar_hilo()
+    _cola.put(registro)
+    if _cola.qsize() >= config['lote']:
+        _despertar.set()
+    return registro
+
+
+def _vaciar_al_salir():
+    try:
+        cantidad = vaciar_auditoria()
+    except Exception:
+        logger.exception(f"[AUDITORIA] No se pudieron guardar {_cola.qsize()} registros al salir")
+        return
+    if cantidad:
+        logger.info(f"[AUDITORIA] {cantidad} registros guardados al salir")
+
+
+atexit.register(_vaciar_al_salir)
+
+
+def _sumar_meses(inicio, meses):
+    """Primer instante del mes que está `meses` después (o antes) de `inicio`."""
+    indice = inicio.year * 12 + inicio.month - 1 + meses
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def limite_retencion(meses=None):
+    """Inicio del mes más viejo que se conserva en la tabla."""
+    if meses is None:
+        meses = getattr(settings, 'AUDITORIA_RETENCION_MESES', 12)
+    ahora = timezone.localtime()
+    return _sumar_meses(ahora, -meses)
+
+
+def meses_a_archivar(limite):
+    """
+    Meses con registros anteriores a `limite`.
+
+    Returns:
+        list de tuplas (inicio, fin) en hora local, de la más vieja a la más nueva
+    """
+    from .models import RegistroAuditoria
+
+    meses = RegistroAuditoria.objects.filter(timestamp__lt=limite).dates('timestamp', 'month')
+    return [(_sumar_meses(mes, 0), _sumar_meses(mes, 1)) for mes in meses]
+
+
+def _storage_archivos():
+    from django.core.files.storage import default_storage, storages
+
+    return storages['archivos'] if 'archivos' in settings.STORAGES else default_storage
+
+
+def archivar_mes(inicio, fin):
+    """
+    Exporta los registros de [inicio, fin) a un JSONL comprimido en el
+    storage y, si se guardó, los borra de la tabla.
+
+    Returns:
+        tupla (nombre del archivo, cantidad de registros)
+    """
+    from .models import RegistroAuditoria
+
+    registros = RegistroAuditoria.objects.filter(timestamp__gte=inicio, timestamp__lt=fin)
+    cantidad = 0
+    ultimo_id = 0
+    with tempfile.TemporaryFile() as temporal:
+        with gzip.GzipFile(fileobj=temporal, mode='wb') as comprimido:
+            for fila in registros.order_by('timestamp', 'id').values(
+                'id', 'timestamp', 'usuario_id', 'usuario__username', 'accion', 'detalles', 'ip_address',
+            ).iterator(chunk_size=2000):
+                fila['timestamp'] = fila['timestamp'].isoformat()
+                fila['usuario'] = fila.pop('usuario__username')
+                comprimido.write(json.dumps(fila, ensure_ascii=False).encode() + b'\n')
+                cantidad += 1
+                ultimo_id = max(ultimo_id, fila['id'])
+        if not cantidad:
+            return None, 0
+        temporal.seek(0)
+        nombre = _storage_archivos().save(f"auditoria/auditoria-{inicio:%Y-%m}.jsonl.gz", File(temporal))
+
+    # Solo lo exportado (un insert diferido tardío queda para la próxima corrida)
+    registros.filter(id__lte=ultimo_id).delete()
+    logger.info(f"[AUDITORIA] {inicio:%Y-%m}: {cantidad} registros archivados en {nombre}")
+    return nombre, cantidad
@@ -0,0 +1,320 @@
+"""
+busqueda_services.py — Búsqueda de alumnos por DNI, apellido o nombre
+(propios o de padre, madre y tutor) desde una sola caja de texto.
+
+En lugar de icontains (que castea documento a texto y recorre toda la tabla),
+cada alumno tiene sus palabras normalizadas en TerminoBusqueda, con índice:
+- DNI completo (7+ dígitos): coincidencia exacta.
+- Resto: búsqueda por prefijo, resuelta como rango sobre el índice.
+
+Para búsquedas aproximadas (typeahead, errores de tipeo) cada alumno tiene
+además un documento desnormalizado en Alumno.texto_busqueda:
+- PostgreSQL: similitud de trigramas (pg_trgm) con índice GIN.
+- Otros motores: índice de trigramas en memoria, por proceso, que se
+  reconstruye cuando cambia la versión guardada en la caché compartida.
+
+La versión se renueva al confirmarse la transacción que cambió alumnos, y
+dentro de indice_diferido() (importaciones, vía saldos_diferidos()) una sola
+vez al salir del bloque en lugar de una por alumno guardado.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION_INDICE = 'portal:busqueda_version'
+
+# A partir de esta cantidad de dígitos el texto se toma como DNI completo
+DIGITOS_DNI_COMPLETO = 7
+
+# Campos de Alumno que alimentan el índice, por origen
+CAMPOS_INDEXADOS = {
+    'alumno': ('documento', 'apellido', 'nombres'),
+    'padre': ('padre_dni', 'padre_nombre'),
+    'madre': ('madre_dni', 'madre_nombre'),
+    'tutor': ('tutor_dni', 'tutor_nombre'),
+}
+
+
+def normalizar_texto(texto):
+    """
+    Pasa a minúsculas, quita acentos y separa en palabras alfanuméricas.
+
+    Returns:
+        list de palabras (puede estar vacía)
+    """
+    if texto is None:
+        return []
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r'[a-z0-9]+', texto.lower())
+
+
+def terminos_alumno(alumno):
+    """
+    Términos de búsqueda de un alumno.
+
+    Returns:
+        set de tuplas (termino, origen)
+    """
+    terminos = set()
+    for origen, campos in CAMPOS_INDEXADOS.items():
+        for campo in campos:
+            for palabra in normalizar_texto(getattr(alumno, campo)):
+                terminos.add((palabra[:50], origen))
+    return terminos
+
+
+def texto_busqueda_alumno(alumno):
+    """Documento de búsqueda: nombres, DNIs, curso y barrio, normalizados."""
+    partes = [
+        alumno.apellido, alumno.nombres, alumno.documento,
+        alumno.padre_nombre, alumno.padre_dni,
+        alumno.madre_nombre, alumno.madre_dni,
+        alumno.tutor_nombre, alumno.tutor_dni,
+        alumno.nivel, alumno.curso, alumno.division, alumno.barrio,
+    ]
+    return ' '.join(palabra for parte in partes for palabra in normalizar_texto(parte))
+
+
+def indexar_alumno(alumno):
+    """Regenera los términos de búsqueda de un alumno (2 consultas)."""
+    from .models import TerminoBusqueda
+
+    TerminoBusqueda.objects.filter(alumno=alumno).delete()
+    TerminoBusqueda.objects.bulk_create([
+        TerminoBusqueda(alumno=alumno, termino=termino, origen=origen)
+        for termino, origen in terminos_alumno(alumno)
+    ])
+    invalidar_indice_ngramas()
+
+
+def reindexar_alumnos(alumnos=None, batch_size=2000):
+    """
+    Reconstruye el índice completo (o el de un queryset de alumnos).
+    Necesario después de cargas con bulk_create, que no disparan señales.
+
+    Returns:
+        int con la cantidad de términos creados
+    """
+    from .models import Alumno, TerminoBusqueda
+
+    if alumnos is None:
+        alumnos = Alumno.objects.all()
+        TerminoBusqueda.objects.all().delete()
+    else:
+        TerminoBusqueda.objects.filter(alumno__in=alumnos).delete()
+
+    nuevos = []
+    documentos = []
+    for alumno in alumnos.iterator(chunk_size=batch_size):
+        alumno.texto_busqueda = texto_busqueda_alumno(alumno)
+        documentos.append(alumno)
+        nuevos.extend(
+            TerminoBusqueda(alumno_id=alumno.documento, termino=termino, origen=origen)
+            for termino, origen in terminos_alumno(alumno)
+        )
+    TerminoBusqueda.objects.bulk_create(nuevos, batch_size=batch_size)
+    Alumno.objects.bulk_update(documentos, ['texto_busqueda'], batch_size=batch_size)
+    invalidar_indice_ngramas()
+    logger.info(f"[BUSQUEDA] Índice reconstruido: {len(nuevos)} términos")
+    return len(nuevos)
+
+
+def _siguiente_prefijo(prefijo):
+    """Menor cadena mayor que todas las que empiezan con prefijo ('abc' -> 'abd')."""
+    return prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def filtro_termino(palabra):
+    """
+    Q sobre TerminoBusqueda para una palabra ya normalizada: igualdad si es un
+    DNI completo; si no, rango [prefijo, siguiente) que usa el índice en
+    cualquier motor, más startswith para descartar colaciones raras.
+    """
+    from django.db.models import Q
+
+    if palabra.isdigit() and len(palabra) >= DIGITOS_DNI_COMPLETO:
+        return Q(termino=palabra)
+    return Q(termino__gte=palabra, termino__lt=_siguiente_prefijo(palabra), termino__startswith=palabra)
+
+
+def buscar_alumnos(texto):
+    """
+    Documentos de los alumnos que coinciden con todas las palabras del texto.
+
+    Returns:
+        QuerySet de documentos (para usar como subconsulta en alumno__in),
+        o None si el texto no tiene palabras buscables.
+    """
+    from .models import Alumno, TerminoBusqueda
+
+    palabras = normalizar_texto(texto)
+    if not palabras:
+        return None
+
+    alumnos = Alumno.objects.all()
+    for palabra in palabras:
+        alumnos = alumnos.filter(documento__in=TerminoBusqueda.objects.filter(
+            filtro_termino(palabra)
+        ).values('alumno_id'))
+    return alumnos.values('documento')
+
+
+# ==================== BÚSQUEDA APROXIMADA ====================
+
+def ngramas(texto, n=3):
+    """
+    Trigramas de cada palabra, con relleno al estilo pg_trgm
+    ('gil' -> '  g', ' gi', 'gil', 'il ').
+    """
+    resultado = set()
+    for palabra in texto.split():
+        palabra = f"  {palabra} "
+        resultado.update(palabra[i:i + n] for i in range(len(palabra) - n + 1))
+    return resultado
+
+
+class IndiceNgramas:
+    """Índice invertido trigrama -> documentos de alumno, en memoria."""
+
+    def __init__(self, textos):
+        self.postings = defaultdict(set)
+        for documento, texto in textos:
+            for grama in ngramas(texto):
+                self.postings[grama].add(documento)
+
+    def buscar(self, consulta, limite, umbral):
+        """
+        Documentos que comparten al menos `umbral` de los trigramas de la
+        consulta, de mayor a menor coincidencia.
+
+        Returns:
+            list de tuplas (documento, similitud entre 0 y 1)
+        """
+        gramas = ngramas(consulta)
+        if not gramas:
+            return []
+        puntajes = Counter()
+        for grama in gramas:
+            puntajes.update(self.postings.get(grama, ()))
+        minimo = max(1, math.ceil(len(gramas) * umbral))
+        mejores = sorted(
+            (doc for doc, puntaje in puntajes.items() if puntaje >= minimo),
+            key=lambda doc: (-puntajes[doc], doc),
+        )[:limite]
+        return [(doc, puntajes[doc] / len(gramas)) for doc in mejores]
+
+
+_indice = None
+_indice_version = None
+_indice_lock = threading.Lock()
+
+
+_estado = threading.local()
+
+
+def _publicar_version():
+    cache.set(CLAVE_VERSION_INDICE, time.time_ns(), None)
+
+
+def invalidar_indice_ngramas():
+    """
+    Fuerza a todos los workers a reconstruir su índice en memoria, una vez
+    confirmada la transacción en curso. Dentro de indice_diferido() solo
+    marca el índice como pendiente.
+    """
+    if getattr(_estado, 'diferido', None) is not None:
+        _estado.diferido = True
+        return
+    transaction.on_commit(_publicar_version)
+
+
+@contextmanager
+def indice_diferido():
+    """
+    Junta las invalidaciones del bloque en una sola al salir (importaciones:
+    sin esto cada alumno guardado haría reconstruir el índice).
+    """
+    if getattr(_estado, 'diferido', None) is not None:
+        yield
+        return
+    _estado.diferido = False
+    try:
+        yield
+    finally:
+        pendiente = _estado.diferido
+        _estado.diferido = None
+        if pendiente:
+            invalidar_indice_ngramas()
+
+
+def _version_indice():
+    """
+    Versión compartida del índice. Si falta (nunca creada o descartada de la
+    caché) se crea una nueva con add(), nunca se asume 0: un worker con un
+    índice viejo de la versión 0 no lo daría por vigente.
+    """
+    version = cache.get(CLAVE_VERSION_INDICE)
+    if version is None:
+        cache.add(CLAVE_VERSION_INDICE, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION_INDICE) or time.time_ns()
+    return version
+
+
+def obtener_indice_ngramas():
+    """Índice del proceso; se reconstruye si cambió la versión compartida."""
+    global _indice, _indice_version
+    from .models import Alumno
+
+    version = _version_indice()
+    with _indice_lock:
+        if _indice is None or _indice_version != version:
+            _indice = IndiceNgramas(Alumno.objects.values_list('documento', 'texto_busqueda').iterator())
+            _indice_version = version
+        return _indice
+
+
+def buscar_similares(texto, limite=10):
+    """
+    Alumnos cuyo documento de búsqueda se parece al texto (typeahead).
+
+    Returns:
+        list de Alumno, con atributo `similitud`, de mayor a menor
+    """
+    from .models import Alumno
+
+    consulta = ' '.join(normalizar_texto(texto))
+    if len(consulta) < 2:
+        return []
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # El operador <% usa el índice GIN y el umbral pg_trgm.word_similarity_threshold
+        return list(
+            Alumno.objects.filter(texto_busqueda__trigram_word_similar=consulta)
+            .annotate(similitud=TrigramWordSimilarity(consulta, 'texto_busqueda'))
+            .order_by('-similitud', 'apellido', 'nombres')[:limite]
+        )
+
+    umbral = getattr(settings, 'BUSQUEDA_UMBRAL_SIMILITUD', 0.5)
+    coincidencias = obtener_indice_ngramas().buscar(consulta, limite, umbral)
+    alumnos = Alumno.objects.in_bulk([doc for doc, _ in coincidencias])
+    resultado = []
+    for documento, similitud in coincidencias:
+        if documento in alumnos:
+            alumnos[documento].similitud = similitud
+            resultado.append(alumnos[documento])
+    return resultado
@@ -0,0 +1,219 @@
+"""
+comprobantes_services.py — Normalización de los comprobantes que suben los padres.
+
+Las fotos de celular llegan de 5-10 MB. Antes de guardarlas (Cloudinary o disco):
+- Imágenes: se decodifican ya reducidas (draft de JPEG), se rotan según EXIF,
+  se achican a COMPROBANTE_DIMENSION_MAXIMA y se re-codifican en
+  COMPROBANTE_FORMATO con COMPROBANTE_CALIDAD, sin metadatos EXIF/GPS.
+- PDFs: se guardan tal cual y se genera una miniatura de la primera página
+  (requiere pypdfium2; sin él el PDF se acepta sin miniatura).
+El resultado se escribe en un TemporaryUploadedFile (en disco) en lugar de
+un buffer en memoria.
+
+El navegador ya manda la imagen achicada (ver portal_padre.html); esto es la
+red de seguridad para envíos sin JavaScript o desde otros clientes.
+
+Miniaturas para la revisión en el admin:
+- Cloudinary: URLs de transformación (c_limit, q_auto, f_auto; pg_1 para
+  PDFs), que Cloudinary genera y cachea en su CDN. No se guarda nada.
+- Otros storages (disco): un derivado generado con Pillow al subir el
+  comprobante, en Pago.miniatura (`manage.py generar_miniaturas` completa
+  los comprobantes viejos).
+"""
+
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+FORMATOS = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+
+def _config():
+    return {
+        'dimension': getattr(settings, 'COMPROBANTE_DIMENSION_MAXIMA', 1600),
+        'calidad': getattr(settings, 'COMPROBANTE_CALIDAD', 80),
+        'formato': getattr(settings, 'COMPROBANTE_FORMATO', 'WEBP'),
+        'miniatura': getattr(settings, 'COMPROBANTE_DIMENSION_MINIATURA', 320),
+        'maximo_mb': getattr(settings, 'COMPROBANTE_TAMANIO_MAXIMO_MB', 15),
+    }
+
+
+def es_pdf(archivo):
+    """True si el archivo empieza con la firma de PDF (no se confía en la extensión)."""
+    archivo.seek(0)
+    firma = archivo.read(5)
+    archivo.seek(0)
+    return firma == b'%PDF-'
+
+
+def _guardar_imagen(imagen, nombre, formato, calidad):
+    """Codifica la imagen en un TemporaryUploadedFile, sin metadatos."""
+    extension, content_type = FORMATOS[formato]
+    if formato == 'JPEG' and imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    salida = TemporaryUploadedFile(f"{nombre}.{extension}", content_type, 0, None)
+    imagen.save(salida, format=formato, quality=calidad, optimize=True)
+    salida.size = salida.tell()
+    salida.seek(0)
+    return salida
+
+
+def usa_cloudinary():
+    """True si los archivos subidos van a Cloudinary (se pueden transformar por URL)."""
+    from django.core.files.storage import storages
+
+    return type(storages['default']).__module__.startswith('cloudinary_storage')
+
+
+def url_cloudinary(url, dimension, pdf=False):
+    """
+    URL de entrega de Cloudinary con la imagen limitada a `dimension` px,
+    calidad y formato automáticos; de un PDF, la primera página como JPG.
+    """
+    transformacion = f'c_limit,w_{dimension},h_{dimension},q_auto'
+    if pdf:
+        transformacion = f'pg_1,{transformacion}'
+        url = os.path.splitext(url)[0] + '.jpg'
+    else:
+        transformacion = f'{transformacion},f_auto'
+    return url.replace('/upload/', f'/upload/{transformacion}/', 1)
+
+
+def miniatura_imagen(imagen, nombre, config=None):
+    """Derivado chico de una imagen ya abierta (storages sin transformación por URL)."""
+    from PIL import Image, ImageOps
+
+    config = config or _config()
+    imagen.draft('RGB', (config['miniatura'], config['miniatura']))
+    miniatura = ImageOps.exif_transpose(imagen)
+    if miniatura.mode not in ('RGB', 'RGBA'):
+        miniatura = miniatura.convert('RGBA' if 'A' in miniatura.getbands() else 'RGB')
+    miniatura.thumbnail((config['miniatura'], config['miniatura']), Image.LANCZOS)
+    return _guardar_imagen(miniatura, f"{nombre}_miniatura", config['formato'], config['calidad'])
+
+
+def _normalizar_imagen(archivo, nombre, config):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        imagen = Image.open(archivo)
+        # JPEG: decodificar directo a una escala reducida (mucha menos memoria)
+        imagen.draft('RGB', (config['dimension'], config['dimension']))
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() else 'RGB')
+        imagen.thumbnail((config['dimension'], config['dimension']), Image.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('El comprobante debe ser una imagen (JPG, PNG, WEBP) o un PDF')
+
+    # La imagen nueva no arrastra info EXIF/ICC del original
+    limpia = Image.new(imagen.mode, imagen.size)
+    limpia.paste(imagen)
+    miniatura = None if usa_cloudinary() else miniatura_imagen(limpia, nombre, config)
+    return _guardar_imagen(limpia, nombre, config['formato'], config['calidad']), miniatura
+
+
+def primera_pagina_pdf(archivo, dimension):
+    """
+    Primera página de un PDF como imagen PIL de `dimension` px de lado mayor.
+
+    Returns:
+        Image, o None si pypdfium2 no está instalado o el PDF no se puede leer
+    """
+    if pypdfium2 is None:
+        return None
+    archivo.seek(0)
+    try:
+        # Los uploads grandes ya están en disco: pdfium los lee desde ahí
+        if hasattr(archivo, 'temporary_file_path'):
+            documento = pypdfium2.PdfDocument(archivo.temporary_file_path())
+        else:
+            documento = pypdfium2.PdfDocument(archivo.read())
+        try:
+            pagina = documento[0]
+            escala = dimension / max(pagina.get_size())
+            return pagina.render(scale=escala).to_pil()
+        finally:
+            documento.close()
+    except Exception as e:
+        logger.warning(f"[COMPROBANTES] No se pudo leer el PDF {archivo.name}: {e}")
+        return None
+    finally:
+        archivo.seek(0)
+
+
+def miniatura_pdf(archivo, nombre, config=None):
+    """
+    Miniatura de la primera página de un PDF.
+
+    Returns:
+        TemporaryUploadedFile, o None si pypdfium2 no está instalado o el PDF no se puede leer
+    """
+    config = config or _config()
+    imagen = primera_pagina_pdf(archivo, config['miniatura'])
+    if imagen is None:
+        return None
+    return _guardar_imagen(imagen, f"{nombre}_miniatura", config['formato'], config['calidad'])
+
+
+def normalizar_comprobante(archivo):
+    """
+    Valida y normaliza un comprobante subido.
+
+    Returns:
+        tupla (comprobante, miniatura): archivos listos para asignar a Pago;
+        miniatura es None para imágenes en Cloudinary (se transforman por URL)
+
+    Raises:
+        ValidationError si el archivo es demasiado grande o no es imagen ni PDF
+    """
+    config = _config()
+    if archivo.size > config['maximo_mb'] * 1024 * 1024:
+        raise ValidationError(f"El comprobante supera los {config['maximo_mb']} MB")
+
+    nombre = os.path.splitext(os.path.basename(archivo.name))[0][:80] or 'comprobante'
+    if es_pdf(archivo):
+        return archivo, miniatura_pdf(archivo, nombre, config)
+
+    original = archivo.size
+    comprobante, miniatura = _normalizar_imagen(archivo, nombre, config)
+    logger.info(f"[COMPROBANTES] {archivo.name}: {original // 1024} KB -> {comprobante.size // 1024} KB")
+    return comprobante, miniatura
+
+
+def url_miniatura(pago):
+    """URL de la miniatura del comprobante para listados ('' si no hay)."""
+    if pago.miniatura:
+        return pago.miniatura.url
+    if pago.comprobante and usa_cloudinary():
+        return url_cloudinary(pago.comprobante.url, _config()['miniatura'], pdf=pago.es_pdf)
+    return ''
+
+
+def url_vista_previa(pago):
+    """
+    URL de la imagen para revisar el comprobante en pantalla: en Cloudinary
+    una versión reducida; en disco el comprobante (ya normalizado al subirlo).
+    Para PDFs, la primera página.
+    """
+    if not pago.comprobante:
+        return ''
+    if usa_cloudinary():
+        return url_cloudinary(pago.comprobante.url, getattr(settings, 'COMPROBANTE_DIMENSION_VISTA_PREVIA', 1200),
+                              pdf=pago.es_pdf)
+    if pago.es_pdf:
+        return pago.miniatura.url if pago.miniatura else ''
+    return pago.comprobante.url
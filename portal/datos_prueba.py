@@ -0,0 +1,148 @@
+"""
+datos_prueba.py — Generador de un conjunto de datos realista para pruebas de
+rendimiento y análisis de planes de consulta.
+
+Todo se inserta con bulk_create, así que sembrar ~1000 alumnos con sus deudas,
+pagos y auditoría tarda segundos. Solo debe usarse sobre bases de prueba.
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .busqueda_services import reindexar_alumnos
+from .responsables_services import sincronizar_vinculos
+from .saldos_services import recalcular_saldos
+
+from .models import (
+    Alumno, ConceptoDeuda, PerfilUsuario, Pago, RegistroAuditoria, RegistroDeuda,
+)
+
+APELLIDOS = ['Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez', 'García',
+             'Rodríguez', 'Sánchez', 'Romero', 'Sosa', 'Torres', 'Álvarez', 'Ruiz']
+NOMBRES = ['Sofía', 'Mateo', 'Valentina', 'Benjamín', 'Isabella', 'Thiago',
+           'Emma', 'Santiago', 'Martina', 'Joaquín', 'Catalina', 'Lautaro']
+BARRIOS = ['Centro', 'Nueva Córdoba', 'General Paz', 'Alta Córdoba', 'Cerro', 'Jardín']
+
+# Distribución de estados de deuda: (estado, peso)
+ESTADOS_DEUDA = [
+    ('pendiente', 55), ('pagado', 20), ('pago_verificado', 10),
+    ('comprobante_enviado', 5), ('parcial', 5), ('no_corresponde', 5),
+]
+
+
+def sembrar_datos(alumnos=1000, conceptos=20, pagos=5000, auditoria=10000,
+                  usuarios=True, semilla=0):
+    """
+    Crea alumnos (con hermanos que comparten responsables), una deuda por
+    alumno y concepto, pagos sobre esas deudas y registros de auditoría.
+
+    Returns:
+        dict con la cantidad de filas creadas por modelo.
+    """
+    rnd = random.Random(semilla)
+    ahora = timezone.now()
+
+    conceptos_objs = ConceptoDeuda.objects.bulk_create([
+        ConceptoDeuda(codigo=f'{i}_CUOTA_{i}', nombre=f'{i}_Cuota {i}', orden=i)
+        for i in range(1, conceptos + 1)
+    ])
+
+    alumnos_objs = []
+    for i in range(alumnos):
+        familia = i // 2  # de a dos hermanos por familia
+        apellido = rnd.choice(APELLIDOS)
+        alumnos_objs.append(Alumno(
+            documento=45_000_000 + i,
+            apellido=apellido,
+            nombres=rnd.choice(NOMBRES),
+            nivel=rnd.choice(['I5', 'P', 'S']),
+            curso=str(rnd.randint(1, 6)),
+            division=rnd.choice('ABC'),
+            barrio=rnd.choice(BARRIOS),
+            familia=familia,
+            padre_nombre=f'{rnd.choice(NOMBRES)} {apellido}',
+            padre_dni=20_000_000 + familia,
+            padre_email=f'padre{familia}@example.com',
+            madre_nombre=f'{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}',
+            madre_dni=25_000_000 + familia,
+            madre_email=f'madre{familia}@example.com' if rnd.random() < 0.7 else '',
+        ))
+    alumnos_objs = Alumno.objects.bulk_create(alumnos_objs)
+    sembrados = Alumno.objects.filter(documento__gte=45_000_000, documento__lt=45_000_000 + alumnos)
+    reindexar_alumnos(sembrados)
+    sincronizar_vinculos(sembrados)
+
+    estados, pesos = zip(*ESTADOS_DEUDA)
+    deudas_objs = []
+    for alumno in alumnos_objs:
+        for concepto in conceptos_objs:
+            estado = rnd.choices(estados, pesos)[0]
+            monto = Decimal(rnd.randint(20, 90) * 1000)
+            if estado in ('pagado', 'pago_verificado', 'no_corresponde'):
+                monto = Decimal('0')
+            deudas_objs.append(RegistroDeuda(
+                alumno=alumno, concepto=concepto, monto=monto, estado=estado, periodo='',
+                fecha_vencimiento=(ahora - timedelta(days=rnd.randint(-30, 300))).date(),
+            ))
+    deudas_objs = RegistroDeuda.objects.bulk_create(deudas_objs, batch_size=2000)
+
+    usuarios_objs = []
+    if usuarios:
+        password = make_password(None)  # inutilizable, se hashea una sola vez
+        usuarios_objs = User.objects.bulk_create([
+            User(username=str(alumno.documento), password=password,
+                 first_name=alumno.nombres, last_name=alumno.apellido,
+                 email=f'usuario{alumno.documento}@example.com' if rnd.random() < 0.5 else '')
+            for alumno in alumnos_objs
+        ], batch_size=2000)
+        usuarios_objs = list(User.objects.filter(username__in=[u.username for u in usuarios_objs]))
+        PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(usuario=u, dni=int(u.username), rol='padre',
+                          must_change_password=rnd.random() < 0.3)
+            for u in usuarios_objs
+        ], batch_size=2000)
+
+    # auto_now_add pisa la fecha en bulk_create: se reparte después con bulk_update
+    pagos_objs = Pago.objects.bulk_create([
+        Pago(
+            numero_operacion=f'OP-SEED-{i:06d}',
+            deuda=rnd.choice(deudas_objs),
+            monto_pagado=Decimal(rnd.randint(10, 90) * 1000),
+            estado=rnd.choices(['pendiente', 'verificado', 'rechazado'], [20, 75, 5])[0],
+            usuario_responsable=rnd.choice(usuarios_objs) if usuarios_objs else None,
+        )
+        for i in range(pagos)
+    ], batch_size=2000)
+    for pago in pagos_objs:
+        pago.fecha_envio = ahora - timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+    Pago.objects.bulk_update(pagos_objs, ['fecha_envio'], batch_size=2000)
+
+    recalcular_saldos()  # bulk_create no dispara las señales de saldo
+
+    acciones = [accion for accion, _ in RegistroAuditoria.ACCION_CHOICES]
+    registros = RegistroAuditoria.objects.bulk_create([
+        RegistroAuditoria(
+            usuario=rnd.choice(usuarios_objs) if usuarios_objs else None,
+            accion=rnd.choice(acciones),
+            detalles='Registro de prueba',
+            ip_address=f'10.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}',
+        )
+        for _ in range(auditoria)
+    ], batch_size=2000)
+    for registro in registros:
+        registro.timestamp = ahora - timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+    RegistroAuditoria.objects.bulk_update(registros, ['timestamp'], batch_size=2000)
+
+    return {
+        'conceptos': len(conceptos_objs),
+        'alumnos': len(alumnos_objs),
+        'deudas': len(deudas_objs),
+        'usuarios': len(usuarios_objs),
+        'pagos': len(pagos_objs),
+        'auditoria': len(registros),
+    }
@@ -0,0 +1,184 @@
+"""
+duplicados_services.py — Detección de comprobantes repetidos.
+
+Hay padres que mandan la misma captura de una transferencia para varias
+deudas o varios hijos. Al subir cada comprobante se guardan dos huellas:
+- Pago.comprobante_sha256: SHA-256 del archivo guardado (mismo archivo).
+- Pago.comprobante_phash: hash perceptual de 64 bits (dHash) de la imagen o
+  de la primera página del PDF; sobrevive a recompresiones y recortes
+  menores (la misma captura reenviada o sacada de nuevo).
+
+Para no comparar cada comprobante contra todos, el dHash se parte en 4
+bandas de 16 bits guardadas en HuellaComprobante (una fila indexada por
+banda). Dos huellas a distancia de Hamming <= 3 comparten al menos una banda
+entera, así que los candidatos salen de una búsqueda por índice y solo esos
+se comparan bit a bit contra COMPROBANTE_DISTANCIA_DUPLICADO (default: 3,
+que es también el máximo que las bandas garantizan encontrar).
+
+Las bandas que no distinguen nada no se usan como índice: las de un solo
+dígito repetido (0000, ffff: zonas lisas o degradés, comunes en capturas
+con fondo blanco) no se guardan, y las que ya comparten más de
+COMPROBANTE_CANDIDATOS_POR_BANDA pagos (default: 50) se ignoran al buscar.
+Así una banda común no trae miles de candidatos; a cambio, dos comprobantes
+parecidos que solo coinciden en esas bandas no se detectan (los idénticos
+siguen saliendo por SHA-256).
+
+`manage.py generar_huellas` completa los comprobantes subidos antes.
+"""
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+BANDAS = 4
+DIGITOS_BANDA = 16 // BANDAS  # dígitos hexadecimales por banda
+
+# Una imagen lisa (o casi) da todos los bits en 0: no distingue nada
+HUELLA_VACIA = '0' * 16
+
+
+def huella_perceptual(imagen):
+    """
+    dHash de 64 bits de una imagen PIL: se reduce a 9x8 en escala de grises
+    y cada bit indica si un píxel es más claro que su vecino de la derecha.
+
+    Returns:
+        str con 16 dígitos hexadecimales
+    """
+    from PIL import Image
+
+    pixeles = imagen.convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    bits = 0
+    for fila in range(8):
+        for columna in range(8):
+            i = fila * 9 + columna
+            bits = (bits << 1) | (pixeles[i] > pixeles[i + 1])
+    return f'{bits:016x}'
+
+
+def calcular_huellas(archivo):
+    """
+    SHA-256 y hash perceptual de un comprobante (imagen o PDF).
+
+    Returns:
+        tupla (sha256, phash); phash es '' si el archivo no se puede leer
+        como imagen (o es un PDF y falta pypdfium2)
+    """
+    from PIL import Image, UnidentifiedImageError
+    from .comprobantes_services import es_pdf, primera_pagina_pdf
+
+    archivo.seek(0)
+    sha256 = hashlib.sha256()
+    for bloque in archivo.chunks():
+        sha256.update(bloque)
+    archivo.seek(0)
+
+    if es_pdf(archivo):
+        imagen = primera_pagina_pdf(archivo, 64)
+    else:
+        try:
+            imagen = Image.open(archivo)
+            imagen.draft('L', (64, 64))
+        except (UnidentifiedImageError, OSError):
+            imagen = None
+    phash = huella_perceptual(imagen) if imagen is not None else ''
+    archivo.seek(0)
+    return sha256.hexdigest(), phash
+
+
+def bandas_huella(phash):
+    """
+    Claves de las bandas de un phash: número de banda + sus dígitos. Omite
+    las de un solo dígito repetido (0000, ffff), que no distinguen nada.
+    """
+    if not phash or phash == HUELLA_VACIA:
+        return []
+    bandas = []
+    for i in range(BANDAS):
+        digitos = phash[i * DIGITOS_BANDA:(i + 1) * DIGITOS_BANDA]
+        if len(set(digitos)) > 1:
+            bandas.append(f'{i}{digitos}')
+    return bandas
+
+
+def distancia(phash1, phash2):
+    """Cantidad de bits distintos entre dos hashes perceptuales."""
+    return bin(int(phash1, 16) ^ int(phash2, 16)).count('1')
+
+
+def guardar_bandas(pagos):
+    """Crea las filas HuellaComprobante de los pagos (con comprobante_phash ya guardado)."""
+    from .models import HuellaComprobante
+
+    HuellaComprobante.objects.bulk_create([
+        HuellaComprobante(pago=pago, banda=banda)
+        for pago in pagos
+        for banda in bandas_huella(pago.comprobante_phash)
+    ])
+
+
+def buscar_duplicados(pagos):
+    """
+    Otros pagos con el mismo comprobante (SHA-256) o uno parecido (phash),
+    para una página de pagos: 3 consultas indexadas como máximo.
+
+    Returns:
+        dict pago_id -> list de dicts (id, numero_operacion, exacto), solo
+        para los pagos con algún duplicado
+    """
+    from .models import HuellaComprobante, Pago
+
+    pagos = [pago for pago in pagos if pago.comprobante_sha256]
+    if not pagos:
+        return {}
+    maxima = getattr(settings, 'COMPROBANTE_DISTANCIA_DUPLICADO', 3)
+    por_banda = getattr(settings, 'COMPROBANTE_CANDIDATOS_POR_BANDA', 50)
+
+    mismos = {}
+    for pago_id, numero, sha256 in Pago.objects.filter(
+        comprobante_sha256__in={pago.comprobante_sha256 for pago in pagos}
+    ).values_list('id', 'numero_operacion', 'comprobante_sha256'):
+        mismos.setdefault(sha256, []).append((pago_id, numero))
+
+    candidatos = {}
+    bandas = {banda for pago in pagos for banda in bandas_huella(pago.comprobante_phash)}
+    if bandas:
+        # Bandas compartidas por demasiados pagos: no sirven para acotar
+        bandas -= set(
+            HuellaComprobante.objects.filter(banda__in=bandas).values('banda')
+            .annotate(cantidad=Count('id')).filter(cantidad__gt=por_banda)
+            .values_list('banda', flat=True)
+        )
+    if bandas:
+        for banda, pago_id, numero, phash in HuellaComprobante.objects.filter(banda__in=bandas).values_list(
+            'banda', 'pago_id', 'pago__numero_operacion', 'pago__comprobante_phash',
+        ):
+            candidatos.setdefault(banda, []).append((pago_id, numero, phash))
+
+    resultado = {}
+    for pago in pagos:
+        encontrados = {
+            pago_id: {'id': pago_id, 'numero_operacion': numero, 'exacto': True}
+            for pago_id, numero in mismos.get(pago.comprobante_sha256, [])
+            if pago_id != pago.id
+        }
+        for banda in bandas_huella(pago.comprobante_phash):
+            for pago_id, numero, phash in candidatos.get(banda, []):
+                if (pago_id != pago.id and pago_id not in encontrados
+                        and distancia(pago.comprobante_phash, phash) <= maxima):
+                    encontrados[pago_id] = {'id': pago_id, 'numero_operacion': numero, 'exacto': False}
+        if encontrados:
+            resultado[pago.id] = sorted(encontrados.values(), key=lambda d: d['id'])
+    return resultado
+
+
+def marcar_duplicados(pagos):
+    """Asigna pago.duplicados (list, vacía si no hay) a cada pago del listado."""
+    pagos = list(pagos)
+    duplicados = buscar_duplicados(pagos)
+    for pago in pagos:
+        pago.duplicados = duplicados.get(pago.id, [])
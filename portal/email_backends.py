@@ -0,0 +1,84 @@
+"""
+email_backends.py — Backend de email simulado para medir rendimiento sin Resend.
+
+Simula la latencia de la API y una tasa configurable de respuestas 429
+(rate limit), y registra la duración de cada intento de envío. Lo usa el
+comando `benchmark_emails`; no envía nada a ningún lado.
+
+Configuración (settings.EMAIL_BENCHMARK, todas opcionales):
+    LATENCIA_MS: latencia media por envío en milisegundos (default: 120).
+    JITTER_MS: variación aleatoria ± sobre la latencia (default: 40).
+    TASA_429: probabilidad entre 0 y 1 de responder 429 (default: 0).
+"""
+
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+def _error_rate_limit():
+    """Construye el mismo error que lanza anymail ante un 429 de Resend."""
+    try:
+        import requests
+        from anymail.exceptions import AnymailAPIError
+    except ImportError:
+        error = Exception('429 Too Many Requests (simulado)')
+        error.status_code = 429
+        return error
+
+    response = requests.Response()
+    response.status_code = 429
+    response.reason = 'Too Many Requests'
+    response._content = b'{"name": "rate_limit_exceeded", "message": "Too many requests (simulado)"}'
+    return AnymailAPIError(
+        'Resend API response 429 (simulado)',
+        status_code=429, response=response, esp_name='Resend',
+    )
+
+
+class BenchmarkEmailBackend(BaseEmailBackend):
+    """
+    Backend falso con latencia y rate limit inyectados.
+
+    send_mail() abre una conexión nueva por llamada, así que las mediciones y
+    el generador aleatorio son de clase: se comparten entre instancias.
+    """
+    _lock = threading.Lock()
+    _random = random.Random()
+    mediciones = []  # lista de (segundos, exito)
+
+    @classmethod
+    def reiniciar(cls, semilla=None):
+        """Vacía las mediciones y reinicia el generador aleatorio."""
+        with cls._lock:
+            cls.mediciones = []
+            cls._random = random.Random(semilla)
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently, **kwargs)
+        config = getattr(settings, 'EMAIL_BENCHMARK', {})
+        self.latencia = config.get('LATENCIA_MS', 120) / 1000
+        self.jitter = config.get('JITTER_MS', 40) / 1000
+        self.tasa_429 = config.get('TASA_429', 0)
+
+    def send_messages(self, email_messages):
+        enviados = 0
+        for message in email_messages:
+            inicio = time.perf_counter()
+            with self._lock:
+                espera = max(0, self.latencia + self._random.uniform(-self.jitter, self.jitter))
+                limitado = self._random.random() < self.tasa_429
+            time.sleep(espera)
+
+            with self._lock:
+                self.mediciones.append((time.perf_counter() - inicio, not limitado))
+
+            if limitado:
+                if not self.fail_silently:
+                    raise _error_rate_limit()
+                continue
+            enviados += 1
+        return enviados
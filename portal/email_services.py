@@ -17,9 +17,158 @@ import logging
 from django.core.mail import send_mail
 from django.conf import settings
 
+from .responsables_services import email_contacto
+
 logger = logging.getLogger(__name__)
 
 
+def normalizar_email(email):
+    """
+    Normaliza una dirección de email: recorta espacios y pasa a minúsculas.
+
+    Returns:
+        str — la dirección normalizada, o '' si no es una dirección válida.
+    """
+    from django.core.exceptions import ValidationError
+    from django.core.validators import validate_email
+
+    if not email:
+        return ''
+    email = str(email).strip().lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        return ''
+    return email
+
+
+def preparar_destinatarios(destinatarios):
+    """
+    Limpia la lista de destinatarios antes de encolarla: normaliza, descarta
+    direcciones con sintaxis inválida, elimina duplicados (un mismo email puede
+    figurar como padre, madre y tutor) y filtra la lista de supresión.
+
+    Returns:
+        dict con claves:
+            - "validos": list — emails listos para enviar (orden original).
+            - "invalidos": list — entradas descartadas por sintaxis.
+            - "suprimidos": list — emails presentes en la lista de supresión.
+    """
+    from .models import EmailSuprimido
+
+    validos = []
+    invalidos = []
+    vistos = set()
+
+    for original in destinatarios:
+        email = normalizar_email(original)
+        if not email:
+            if original and str(original).strip():
+                invalidos.append(original)
+            continue
+        if email in vistos:
+            continue
+        vistos.add(email)
+        validos.append(email)
+
+    # Una sola consulta contra la lista de supresión
+    suprimidos = set(
+        EmailSuprimido.objects.filter(email__in=validos).values_list('email', flat=True)
+    )
+    if suprimidos:
+        validos = [e for e in validos if e not in suprimidos]
+
+    return {
+        "validos": validos,
+        "invalidos": invalidos,
+        "suprimidos": sorted(suprimidos),
+    }
+
+
+def suprimir_email(email, motivo, detalle=''):
+    """Agrega (o actualiza) una dirección en la lista de supresión."""
+    from .models import EmailSuprimido
+
+    email = str(email or '').strip().lower()
+    if not email:
+        return None
+    suprimido, _ = EmailSuprimido.objects.update_or_create(
+        email=email,
+        defaults={'motivo': motivo, 'detalle': detalle[:500]},
+    )
+    logger.warning(f"[EMAIL_SUPRESION] {email} agregado a la lista de supresión ({motivo}).")
+    return suprimido
+
+
+def _es_fallo_permanente(error):
+    """
+    Indica si un error de envío es definitivo para el destinatario
+    (dirección rechazada o inválida), en cuyo caso no tiene sentido reintentar.
+    """
+    try:
+        from anymail.exceptions import AnymailAPIError, AnymailRecipientsRefused
+    except ImportError:
+        return False
+
+    if isinstance(error, AnymailRecipientsRefused):
+        return True
+    if isinstance(error, AnymailAPIError) and getattr(error, 'status_code', None) == 422:
+        # Resend responde 422 "Invalid `to` field" ante direcciones mal formadas
+        return '`to`' in str(error).lower()
+    return False
+
+
+def _es_rate_limit(error):
+    """Indica si el proveedor rechazó el envío por exceso de velocidad (HTTP 429)."""
+    return getattr(error, 'status_code', None) == 429
+
+
+def emails_por_alumno(alumnos):
+    """
+    Resuelve en bloque el email de contacto de cada alumno con una sola
+    consulta de perfiles (en lugar de una por alumno).
+
+    Prioridad: email del User (actualizado en primer login) > padre > madre
+    > tutor > email del alumno. Se toma el primero con sintaxis válida, ya
+    normalizado: uno mal cargado no tapa al siguiente.
+
+    Args:
+        alumnos: Iterable de Alumno (ya evaluado o queryset).
+
+    Returns:
+        dict {documento: email} — '' si el alumno no tiene email.
+    """
+    from .models import PerfilUsuario
+
+    alumnos = list(alumnos)
+    emails_usuario = dict(
+        PerfilUsuario.objects.filter(dni__in=[a.documento for a in alumnos])
+        .exclude(usuario__email='')
+        .values_list('dni', 'usuario__email')
+    )
+
+    resultado = {}
+    for alumno in alumnos:
+        resultado[alumno.documento] = (
+            normalizar_email(emails_usuario.get(alumno.documento))
+            or email_contacto(alumno)
+        )
+    return resultado
+
+
+def mensaje_a_html(mensaje):
+    """Convierte un aviso en texto plano a HTML, con las URLs como links clicables."""
+    import re
+
+    mensaje_html = mensaje.replace('\n', '<br>')
+    mensaje_html = re.sub(
+        r'(https?://[^\s<]+)',
+        r'<a href="\1" target="_blank" style="color:#1976D2;font-weight:bold;">\1</a>',
+        mensaje_html
+    )
+    return f'<div style="font-family:Arial,sans-serif;font-size:15px;line-height:1.6;color:#333;">{mensaje_html}</div>'
+
+
 def obtener_emails_desde_db():
     """
     Consulta la base de datos para obtener todos los emails de padres/responsables
@@ -40,20 +189,17 @@ def obtener_emails_desde_db():
     total_padres = perfiles_padre.count()
 
     for perfil in perfiles_padre:
-        user_email = perfil.usuario.email
-        if user_email and user_email.strip():
-            emails.add(user_email.strip().lower())
+        user_email = normalizar_email(perfil.usuario.email)
+        if user_email:
+            emails.add(user_email)
         else:
             # Fallback: buscar en el modelo Alumno por DNI del perfil
             if perfil.dni:
                 alumno = Alumno.objects.filter(documento=perfil.dni).first()
                 if alumno:
-                    fallback = (
-                        alumno.padre_email or alumno.madre_email
-                        or alumno.tutor_email or alumno.email
-                    )
-                    if fallback and fallback.strip():
-                        emails.add(fallback.strip().lower())
+                    fallback = normalizar_email(email_contacto(alumno))
+                    if fallback:
+                        emails.add(fallback)
 
     logger.info(
         f"[EMAIL_DB] {len(emails)} emails válidos encontrados "
@@ -73,10 +219,18 @@ def enviar_emails_masivos(
     mensaje_html=None,
     batch_size=50,
     delay=10,
+    reintentos=3,
+    espera_reintento=2,
+    al_terminar_tanda=None,
 ):
     """
     Envía emails en tandas para evitar rate-limits de Resend/Gmail.
 
+    Antes de enviar, los destinatarios pasan por preparar_destinatarios():
+    las direcciones inválidas, duplicadas o en la lista de supresión se
+    descartan sin consumir llamadas a la API. Los rechazos definitivos del
+    proveedor se agregan a la lista de supresión.
+
     Args:
         destinatarios: Lista de direcciones de email.
         asunto: Asunto del email.
@@ -84,12 +238,20 @@ def enviar_emails_masivos(
         mensaje_html: (Opcional) Cuerpo del email en HTML.
         batch_size: Cantidad de emails por tanda (default: 50).
         delay: Segundos de pausa entre tandas (default: 10).
+        reintentos: Reintentos por email ante un rate limit 429 (default: 3).
+        espera_reintento: Segundos de espera antes del primer reintento;
+            se duplica en cada reintento (default: 2).
+        al_terminar_tanda: (Opcional) Función que recibe la lista de emails
+            enviados con éxito en cada tanda, para registrar el progreso
+            (también se llama con la tanda en curso si el envío se aborta).
 
     Returns:
         dict con claves:
             - "enviados": int — cantidad de emails enviados con éxito.
             - "fallidos": list — lista de dicts {"email": str, "error": str}.
-            - "total": int — total de destinatarios.
+            - "total": int — total de destinatarios válidos.
+            - "descartados": int — inválidos + suprimidos que no se intentaron.
+            - "reintentos": int — reintentos realizados por rate limit.
     """
     # Importar excepciones de anymail (solo si están disponibles)
     try:
@@ -98,8 +260,19 @@ def enviar_emails_masivos(
         AnymailAPIError = None
         AnymailRequestsAPIError = None
 
+    preparados = preparar_destinatarios(destinatarios)
+    destinatarios = preparados['validos']
+    descartados = len(preparados['invalidos']) + len(preparados['suprimidos'])
+    if descartados:
+        logger.info(
+            f"[EMAIL_BATCH] {descartados} destinatarios descartados antes del envío "
+            f"({len(preparados['invalidos'])} inválidos, "
+            f"{len(preparados['suprimidos'])} en lista de supresión)"
+        )
+
     enviados = 0
     fallidos = []
+    total_reintentos = 0
     total = len(destinatarios)
 
     # Dividir en tandas
@@ -119,57 +292,85 @@ def enviar_emails_masivos(
     for idx, tanda in enumerate(tandas, start=1):
         logger.info(f"[EMAIL_BATCH] Procesando tanda {idx}/{total_tandas} ({len(tanda)} emails)...")
 
+        enviados_tanda = []
         for email_dest in tanda:
-            try:
-                send_mail(
-                    subject=asunto,
-                    message=mensaje_texto,
-                    from_email=from_email,
-                    recipient_list=[email_dest],
-                    html_message=mensaje_html,
-                    fail_silently=False,
-                )
-                enviados += 1
-                logger.debug(f"[EMAIL_BATCH]   ✓ Enviado a {email_dest}")
-
-            except Exception as e:
-                error_msg = str(e)
-                error_type = type(e).__name__
-
-                # Detectar errores de autenticación de Resend (API key inválida)
-                if AnymailAPIError and isinstance(e, AnymailAPIError):
-                    if '401' in error_msg or 'unauthorized' in error_msg.lower() or 'invalid api key' in error_msg.lower():
+            intento = 0
+            while True:
+                try:
+                    send_mail(
+                        subject=asunto,
+                        message=mensaje_texto,
+                        from_email=from_email,
+                        recipient_list=[email_dest],
+                        html_message=mensaje_html,
+                        fail_silently=False,
+                    )
+                    enviados += 1
+                    enviados_tanda.append(email_dest)
+                    logger.debug(f"[EMAIL_BATCH]   ✓ Enviado a {email_dest}")
+
+                except Exception as e:
+                    # Rate limit (429): reintentar con backoff exponencial
+                    if intento < reintentos and _es_rate_limit(e):
+                        espera = espera_reintento * (2 ** intento)
+                        intento += 1
+                        total_reintentos += 1
+                        logger.warning(
+                            f"[EMAIL_BATCH]   ↻ Rate limit enviando a {email_dest}, "
+                            f"reintento {intento}/{reintentos} en {espera}s"
+                        )
+                        time.sleep(espera)
+                        continue
+
+                    error_msg = str(e)
+                    error_type = type(e).__name__
+
+                    # Detectar errores de autenticación de Resend (API key inválida)
+                    if AnymailAPIError and isinstance(e, AnymailAPIError):
+                        if '401' in error_msg or 'unauthorized' in error_msg.lower() or 'invalid api key' in error_msg.lower():
+                            fallidos.append({"email": email_dest, "error": error_msg})
+                            logger.critical(
+                                "[EMAIL_BATCH] ERROR CRÍTICO: Error de autenticación con Resend API. "
+                                "Revisar la RESEND_API_KEY en las variables de entorno de Railway. "
+                                f"Detalle: {error_msg}"
+                            )
+                            logger.critical(
+                                f"[EMAIL_BATCH] Abortando envío: {enviados}/{total} enviados "
+                                f"antes del error de autenticación."
+                            )
+                            if al_terminar_tanda is not None:
+                                al_terminar_tanda(enviados_tanda)
+                            return {
+                                "enviados": enviados,
+                                "fallidos": fallidos,
+                                "total": total,
+                                "descartados": descartados,
+                                "reintentos": total_reintentos,
+                                "abortado": True,
+                                "razon": "RESEND_AUTH_ERROR",
+                            }
+
+                        # Otros errores de la API de Resend (rate limit, bad request, etc.)
                         fallidos.append({"email": email_dest, "error": error_msg})
-                        logger.critical(
-                            "[EMAIL_BATCH] ERROR CRÍTICO: Error de autenticación con Resend API. "
-                            "Revisar la RESEND_API_KEY en las variables de entorno de Railway. "
-                            f"Detalle: {error_msg}"
+                        logger.error(
+                            f"[EMAIL_BATCH]   ✗ Error de Resend API enviando a {email_dest} "
+                            f"({error_type}): {error_msg}\n{traceback.format_exc()}"
                         )
-                        logger.critical(
-                            f"[EMAIL_BATCH] Abortando envío: {enviados}/{total} enviados "
-                            f"antes del error de autenticación."
+                    else:
+                        # Error genérico (timeout, conexión, etc.)
+                        fallidos.append({"email": email_dest, "error": error_msg})
+                        logger.error(
+                            f"[EMAIL_BATCH]   ✗ Error inesperado enviando a {email_dest} "
+                            f"({error_type}): {error_msg}\n{traceback.format_exc()}"
                         )
-                        return {
-                            "enviados": enviados,
-                            "fallidos": fallidos,
-                            "total": total,
-                            "abortado": True,
-                            "razon": "RESEND_AUTH_ERROR",
-                        }
-
-                    # Otros errores de la API de Resend (rate limit, bad request, etc.)
-                    fallidos.append({"email": email_dest, "error": error_msg})
-                    logger.error(
-                        f"[EMAIL_BATCH]   ✗ Error de Resend API enviando a {email_dest} "
-                        f"({error_type}): {error_msg}\n{traceback.format_exc()}"
-                    )
-                else:
-                    # Error genérico (timeout, conexión, etc.)
-                    fallidos.append({"email": email_dest, "error": error_msg})
-                    logger.error(
-                        f"[EMAIL_BATCH]   ✗ Error inesperado enviando a {email_dest} "
-                        f"({error_type}): {error_msg}\n{traceback.format_exc()}"
-                    )
+
+                    # Rechazo definitivo: no volver a gastar cuota en esta dirección
+                    if _es_fallo_permanente(e):
+                        suprimir_email(email_dest, 'rechazado', error_msg)
+                break
+
+        if al_terminar_tanda is not None:
+            al_terminar_tanda(enviados_tanda)
 
         # Pausa entre tandas (no pausar después de la última)
         if idx < total_tandas:
@@ -185,6 +386,8 @@ def enviar_emails_masivos(
         "enviados": enviados,
         "fallidos": fallidos,
         "total": total,
+        "descartados": descartados,
+        "reintentos": total_reintentos,
     }
 
 
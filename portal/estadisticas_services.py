@@ -0,0 +1,263 @@
+"""
+estadisticas_services.py — Contadores materializados del panel administrativo.
+
+Las páginas del panel (dashboard, deudas, pagos, archivos) muestran los mismos
+KPIs: deudas pendientes, pagos pendientes/verificados, total recaudado, deuda
+total y cantidad de alumnos. En lugar de recalcular los agregados en cada carga,
+se guardan en la fila singleton EstadisticasPanel y se ajustan con deltas (F())
+cada vez que una deuda o un pago cambia de estado.
+
+Las operaciones masivas (importación, reset) recalculan todo. Como red de
+seguridad ante cambios hechos por fuera de estos puntos (Django admin, shell),
+la lectura fuerza un recálculo completo si el último tiene más de
+ESTADISTICAS_RECALCULO_MINUTOS (default: 60).
+
+Los números en vivo (recálculo, o ESTADISTICAS_EN_VIVO = True) salen de
+calcular_estadisticas(): una sola consulta por tabla con agregación condicional.
+
+Las facetas de los filtros de admin_deudas (nivel/curso/división con su
+cantidad de deudas) se guardan en la caché y se invalidan con cada recálculo
+completo (importación), alta de alumno o deuda que entra o sale del listado.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Estados de deuda que no cuentan como saldo pendiente
+ESTADOS_DEUDA_CERRADA = ['no_corresponde', 'pagado', 'pago_verificado']
+
+# Estados que admin_deudas no lista
+ESTADOS_DEUDA_OCULTA = ['no_corresponde', 'pagado']
+
+CLAVE_FACETAS = 'portal:facetas_deudas'
+
+
+def aporte_deuda(monto, estado):
+    """Lo que una deuda suma a los contadores: (deudas_count, total_deuda)."""
+    if monto and monto > 0 and estado not in ESTADOS_DEUDA_CERRADA:
+        return 1, monto
+    return 0, Decimal('0')
+
+
+def deuda_listada(monto, estado):
+    """True si admin_deudas lista la deuda (y cuenta en sus facetas)."""
+    return bool(monto and monto > 0 and estado not in ESTADOS_DEUDA_OCULTA)
+
+
+def _cambia_listado(antes, despues):
+    """True si el cambio (antes, despues) de una deuda la hace entrar o salir del listado."""
+    return (deuda_listada(*antes) if antes else False) != (deuda_listada(*despues) if despues else False)
+
+
+def aporte_pago(estado, monto):
+    """Lo que un pago suma a los contadores: (pendientes, verificados, recaudado)."""
+    if estado == 'pendiente':
+        return 1, 0, Decimal('0')
+    if estado == 'verificado':
+        return 0, 1, monto
+    return 0, 0, Decimal('0')
+
+
+def _estadisticas_como_dict(stats):
+    return {
+        'deudas_count': stats.deudas_count,
+        'total_deuda': stats.total_deuda,
+        'pagos_pendientes': stats.pagos_pendientes,
+        'pagos_verificados': stats.pagos_verificados,
+        'total_recaudado': stats.total_recaudado,
+        'alumnos_count': stats.alumnos_count,
+    }
+
+
+def calcular_estadisticas():
+    """
+    Calcula los KPIs en vivo con una consulta por tabla (3 en total),
+    usando agregación condicional (Count/Sum con filter=).
+
+    Returns:
+        dict con las mismas claves que obtener_estadisticas().
+    """
+    from .models import Alumno, Pago, RegistroDeuda
+
+    deuda_abierta = Q(monto__gt=0) & ~Q(estado__in=ESTADOS_DEUDA_CERRADA)
+    deudas = RegistroDeuda.objects.aggregate(
+        deudas_count=Count('id', filter=deuda_abierta),
+        total_deuda=Sum('monto', filter=deuda_abierta),
+    )
+    pagos = Pago.objects.aggregate(
+        pagos_pendientes=Count('id', filter=Q(estado='pendiente')),
+        pagos_verificados=Count('id', filter=Q(estado='verificado')),
+        total_recaudado=Sum('monto_pagado', filter=Q(estado='verificado')),
+    )
+    return {
+        'deudas_count': deudas['deudas_count'],
+        'total_deuda': deudas['total_deuda'] or Decimal('0'),
+        'pagos_pendientes': pagos['pagos_pendientes'],
+        'pagos_verificados': pagos['pagos_verificados'],
+        'total_recaudado': pagos['total_recaudado'] or Decimal('0'),
+        'alumnos_count': Alumno.objects.count(),
+    }
+
+
+def recalcular_estadisticas():
+    """Recalcula todos los contadores desde cero y los guarda."""
+    from .models import EstadisticasPanel
+
+    stats = EstadisticasPanel(fecha_recalculo=timezone.now(), **calcular_estadisticas())
+    stats.save()
+    invalidar_facetas()
+    logger.info("[ESTADISTICAS] Recálculo completo de los contadores del panel.")
+    return stats
+
+
+def obtener_estadisticas():
+    """
+    Devuelve los KPIs del panel con una sola consulta (la fila singleton),
+    o en vivo con calcular_estadisticas() si ESTADISTICAS_EN_VIVO = True.
+
+    Returns:
+        dict con claves deudas_count, total_deuda, pagos_pendientes,
+        pagos_verificados, total_recaudado y alumnos_count.
+    """
+    from .models import EstadisticasPanel
+
+    if getattr(settings, 'ESTADISTICAS_EN_VIVO', False):
+        return calcular_estadisticas()
+
+    stats = EstadisticasPanel.objects.filter(pk=1).first()
+    max_edad = timedelta(minutes=getattr(settings, 'ESTADISTICAS_RECALCULO_MINUTOS', 60))
+    if stats is None or stats.fecha_recalculo is None or timezone.now() - stats.fecha_recalculo > max_edad:
+        stats = recalcular_estadisticas()
+    return _estadisticas_como_dict(stats)
+
+
+def _aplicar_deltas(**deltas):
+    """Suma los deltas a la fila singleton con un UPDATE atómico."""
+    from .models import EstadisticasPanel
+
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    actualizadas = EstadisticasPanel.objects.filter(pk=1).update(
+        **{campo: F(campo) + valor for campo, valor in deltas.items()}
+    )
+    if not actualizadas:
+        # Todavía no existe la fila: el recálculo ya incluye este cambio
+        recalcular_estadisticas()
+
+
+def registrar_cambio_deuda(antes, despues):
+    """
+    Ajusta los contadores tras guardar un cambio de una deuda.
+
+    Args:
+        antes: (monto, estado) previos, o None si la deuda es nueva.
+        despues: (monto, estado) actuales, o None si la deuda se eliminó.
+    """
+    count_antes, monto_antes = aporte_deuda(*antes) if antes else (0, Decimal('0'))
+    count_despues, monto_despues = aporte_deuda(*despues) if despues else (0, Decimal('0'))
+    _aplicar_deltas(
+        deudas_count=count_despues - count_antes,
+        total_deuda=monto_despues - monto_antes,
+    )
+    # Las facetas cuentan otro conjunto que deudas_count (incluyen pago_verificado)
+    if _cambia_listado(antes, despues):
+        invalidar_facetas()
+
+
+def registrar_cambio_pago(antes, despues):
+    """
+    Ajusta los contadores tras guardar un cambio de un pago.
+
+    Args:
+        antes: (estado, monto_pagado) previos, o None si el pago es nuevo.
+        despues: (estado, monto_pagado) actuales.
+    """
+    pend_antes, verif_antes, recaudado_antes = aporte_pago(*antes) if antes else (0, 0, Decimal('0'))
+    pend_despues, verif_despues, recaudado_despues = aporte_pago(*despues)
+    _aplicar_deltas(
+        pagos_pendientes=pend_despues - pend_antes,
+        pagos_verificados=verif_despues - verif_antes,
+        total_recaudado=recaudado_despues - recaudado_antes,
+    )
+
+
+def registrar_cambios(deudas=(), pagos=()):
+    """
+    Ajusta los contadores tras muchos cambios (operaciones en lote) con un
+    solo UPDATE.
+
+    Args:
+        deudas: pares (antes, despues) como en registrar_cambio_deuda.
+        pagos: pares (antes, despues) como en registrar_cambio_pago.
+    """
+    deltas = dict.fromkeys(
+        ['deudas_count', 'total_deuda', 'pagos_pendientes', 'pagos_verificados', 'total_recaudado'], 0
+    )
+    cambia_listado = False
+    for antes, despues in deudas:
+        cambia_listado = cambia_listado or _cambia_listado(antes, despues)
+        count_antes, monto_antes = aporte_deuda(*antes) if antes else (0, Decimal('0'))
+        count_despues, monto_despues = aporte_deuda(*despues) if despues else (0, Decimal('0'))
+        deltas['deudas_count'] += count_despues - count_antes
+        deltas['total_deuda'] += monto_despues - monto_antes
+    for antes, despues in pagos:
+        pend_antes, verif_antes, recaudado_antes = aporte_pago(*antes) if antes else (0, 0, Decimal('0'))
+        pend_despues, verif_despues, recaudado_despues = aporte_pago(*despues)
+        deltas['pagos_pendientes'] += pend_despues - pend_antes
+        deltas['pagos_verificados'] += verif_despues - verif_antes
+        deltas['total_recaudado'] += recaudado_despues - recaudado_antes
+    _aplicar_deltas(**deltas)
+    if cambia_listado:
+        invalidar_facetas()
+
+
+def registrar_alta_alumno(cantidad=1):
+    """Ajusta el contador de alumnos tras crear alumnos fuera de una importación."""
+    _aplicar_deltas(alumnos_count=cantidad)
+    invalidar_facetas()
+
+
+def obtener_facetas_deudas():
+    """
+    Valores distintos de nivel, curso y división de los alumnos, con la
+    cantidad de deudas listadas en admin_deudas para cada uno.
+    Se reconstruye con una sola consulta agrupada cuando no está en caché.
+
+    Returns:
+        dict {'niveles': {valor: cantidad}, 'cursos': {...}, 'divisiones': {...}}
+    """
+    from .models import Alumno
+
+    facetas = cache.get(CLAVE_FACETAS)
+    if facetas is not None:
+        return facetas
+
+    deuda_listada = Q(deudas__monto__gt=0) & ~Q(deudas__estado__in=ESTADOS_DEUDA_OCULTA)
+    filas = (
+        Alumno.objects.order_by()
+        .values('nivel', 'curso', 'division')
+        .annotate(deudas_listadas=Count('deudas', filter=deuda_listada))
+    )
+
+    facetas = {'niveles': {}, 'cursos': {}, 'divisiones': {}}
+    for fila in filas:
+        for clave, campo in (('niveles', 'nivel'), ('cursos', 'curso'), ('divisiones', 'division')):
+            valor = fila[campo]
+            facetas[clave][valor] = facetas[clave].get(valor, 0) + fila['deudas_listadas']
+
+    cache.set(CLAVE_FACETAS, facetas, getattr(settings, 'FACETAS_CACHE_SEGUNDOS', 24 * 60 * 60))
+    return facetas
+
+
+def invalidar_facetas():
+    """Descarta las facetas cacheadas; se reconstruyen en la próxima consulta."""
+    cache.delete(CLAVE_FACETAS)
@@ -0,0 +1,66 @@
+"""
+limites_services.py — Límite de pedidos por IP para las vistas públicas.
+
+Token bucket guardado en la caché compartida: cada IP tiene `capacidad`
+fichas que se reponen a razón de `por_segundo`; cada pedido consume una y,
+sin fichas, el pedido se rechaza. El estado es (fichas, instante) y vence
+solo cuando el balde ya estaría lleno.
+
+No es atómico entre workers (lectura y escritura separadas): ante ráfagas
+simultáneas puede dejar pasar algún pedido de más, lo que alcanza para
+frenar bots y recargas sin bloquear al resto.
+"""
+
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. Detrás de PROXIES_CONFIABLES proxies se toma la entrada
+    de X-Forwarded-For que agregó el más externo (las anteriores las puede
+    inventar el cliente).
+    """
+    proxies = getattr(settings, 'PROXIES_CONFIABLES', 0)
+    reenviada = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if proxies and reenviada:
+        ips = [ip.strip() for ip in reenviada.split(',') if ip.strip()]
+        if ips:
+            return ips[-min(proxies, len(ips))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def consumir_ficha(clave, capacidad, por_segundo):
+    """
+    Consume una ficha del balde `clave`.
+
+    Returns:
+        True si el pedido puede seguir, False si se agotó el límite
+    """
+    ahora = time.time()
+    clave = f'portal:limite:{clave}'
+    fichas, instante = cache.get(clave, (capacidad, ahora))
+    fichas = min(capacidad, fichas + (ahora - instante) * por_segundo)
+    if fichas < 1:
+        return False
+    cache.set(clave, (fichas - 1, ahora), math.ceil(capacidad / por_segundo))
+    return True
+
+
+def permitir_consulta_publica(request):
+    """Límite de la consulta pública de deudas, por IP."""
+    ip = ip_cliente(request)
+    permitido = consumir_ficha(
+        f'consulta:{ip}',
+        capacidad=getattr(settings, 'CONSULTA_PUBLICA_RAFAGA', 20),
+        por_segundo=getattr(settings, 'CONSULTA_PUBLICA_POR_MINUTO', 30) / 60,
+    )
+    if not permitido:
+        logger.warning(f"[LIMITE] Consulta pública limitada para {ip}")
+    return permitido
@@ -0,0 +1,46 @@
+"""
+Archiva los meses viejos del registro de auditoría: cada mes completo
+anterior a la retención se exporta a un JSONL comprimido en el storage
+(auditoria/auditoria-AAAA-MM.jsonl.gz) y se borra de la tabla.
+
+Pensado para correr por cron una vez por mes.
+
+Uso:
+    python manage.py archivar_auditoria
+    python manage.py archivar_auditoria --meses 6
+    python manage.py archivar_auditoria --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+from portal.auditoria_services import archivar_mes, limite_retencion, meses_a_archivar
+from portal.models import RegistroAuditoria
+
+
+class Command(BaseCommand):
+    help = 'Exporta a gzip JSONL y borra los meses de auditoría fuera de la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=None,
+                            help='Meses a conservar (default: AUDITORIA_RETENCION_MESES)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo muestra qué meses se archivarían')
+
+    def handle(self, *args, **options):
+        limite = limite_retencion(options['meses'])
+        meses = meses_a_archivar(limite)
+        if not meses:
+            self.stdout.write(f"Nada para archivar antes de {limite:%Y-%m}")
+            return
+
+        total = 0
+        for inicio, fin in meses:
+            if options['dry_run']:
+                cantidad = RegistroAuditoria.objects.filter(timestamp__gte=inicio, timestamp__lt=fin).count()
+                self.stdout.write(f"{inicio:%Y-%m}: {cantidad} registros")
+                continue
+            nombre, cantidad = archivar_mes(inicio, fin)
+            total += cantidad
+            self.stdout.write(f"{inicio:%Y-%m}: {cantidad} registros -> {nombre}")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Registros archivados: {total} ({len(meses)} meses)"))
@@ -0,0 +1,86 @@
+"""
+Mide el rendimiento del envío masivo contra un backend simulado (sin Resend).
+Sirve para ajustar batch_size, delay y los reintentos ante rate limit.
+
+Uso:
+    python manage.py benchmark_emails
+    python manage.py benchmark_emails --cantidad 700 --latencia-ms 200 --tasa-429 0.05 --delay 2
+"""
+import logging
+import math
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from portal.email_backends import BenchmarkEmailBackend
+from portal.email_services import enviar_emails_masivos
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return 0
+    idx = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[idx]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark offline de enviar_emails_masivos con latencia y rate limit simulados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=200, help='Emails a enviar (default: 200)')
+        parser.add_argument('--latencia-ms', type=int, default=120, help='Latencia media de la API (default: 120)')
+        parser.add_argument('--jitter-ms', type=int, default=40, help='Variación ± de la latencia (default: 40)')
+        parser.add_argument('--tasa-429', type=float, default=0.0, help='Probabilidad de 429 por envío, 0-1 (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails por tanda (default: 50)')
+        parser.add_argument('--delay', type=float, default=10, help='Segundos entre tandas (default: 10)')
+        parser.add_argument('--reintentos', type=int, default=3, help='Reintentos ante 429 (default: 3)')
+        parser.add_argument('--espera-reintento', type=float, default=2, help='Espera inicial antes de reintentar (default: 2)')
+        parser.add_argument('--semilla', type=int, default=None, help='Semilla aleatoria para resultados reproducibles')
+
+    def handle(self, *args, **options):
+        # Los warnings de cada reintento ensucian la salida; verlos con -v 2
+        if options['verbosity'] < 2:
+            logging.getLogger('portal.email_services').setLevel(logging.CRITICAL)
+
+        destinatarios = [f'benchmark{i}@example.com' for i in range(options['cantidad'])]
+        config = {
+            'LATENCIA_MS': options['latencia_ms'],
+            'JITTER_MS': options['jitter_ms'],
+            'TASA_429': options['tasa_429'],
+        }
+
+        self.stdout.write(
+            f"Enviando {len(destinatarios)} emails (latencia {config['LATENCIA_MS']}±{config['JITTER_MS']} ms, "
+            f"429: {config['TASA_429']:.0%}, tandas de {options['batch_size']}, delay {options['delay']}s)..."
+        )
+
+        BenchmarkEmailBackend.reiniciar(options['semilla'])
+        with override_settings(
+            EMAIL_BACKEND='portal.email_backends.BenchmarkEmailBackend',
+            EMAIL_BENCHMARK=config,
+        ):
+            inicio = time.perf_counter()
+            resultado = enviar_emails_masivos(
+                destinatarios=destinatarios,
+                asunto='[BENCHMARK] Envío simulado',
+                mensaje_texto='Mensaje de prueba de rendimiento.',
+                batch_size=options['batch_size'],
+                delay=options['delay'],
+                reintentos=options['reintentos'],
+                espera_reintento=options['espera_reintento'],
+            )
+            duracion = time.perf_counter() - inicio
+
+        latencias = sorted(seg * 1000 for seg, _ in BenchmarkEmailBackend.mediciones)
+
+        self.stdout.write('')
+        self.stdout.write(f"  Enviados:          {resultado['enviados']}/{resultado['total']}")
+        self.stdout.write(f"  Fallidos:          {len(resultado['fallidos'])}")
+        self.stdout.write(f"  Reintentos (429):  {resultado['reintentos']}")
+        self.stdout.write(f"  Intentos a la API: {len(latencias)}")
+        self.stdout.write(f"  Duración total:    {duracion:.2f} s")
+        self.stdout.write(f"  Throughput:        {resultado['enviados'] / duracion if duracion else 0:.2f} msj/s")
+        self.stdout.write(f"  Latencia p50:      {percentil(latencias, 50):.1f} ms")
+        self.stdout.write(f"  Latencia p99:      {percentil(latencias, 99):.1f} ms")
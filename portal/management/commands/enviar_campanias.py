@@ -0,0 +1,180 @@
+"""
+Ejecuta las campañas de avisos de deuda programadas.
+Pensado para correr desde cron (por ejemplo cada hora); es idempotente por
+período: cada campaña se envía como máximo una vez por mes.
+
+Cada tanda enviada queda registrada (EnvioCampania): una ejecución abortada,
+o una en curso sin avances hace más de CAMPANIAS_MINUTOS_SIN_PROGRESO (el
+proceso murió), se retoma en la próxima corrida sin reenviar a quien ya
+recibió el aviso.
+
+Uso:
+    python manage.py enviar_campanias
+    python manage.py enviar_campanias --dry-run
+    python manage.py enviar_campanias --campania 3 --forzar
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from portal.email_services import (
+    emails_por_alumno, enviar_emails_masivos, mensaje_a_html, preparar_destinatarios,
+)
+from portal.models import (
+    Alumno, CampaniaAviso, EjecucionCampania, EnvioCampania, RegistroAuditoria, RegistroDeuda,
+)
+from portal.saldos_services import FILTRO_CON_SALDO
+
+
+class Command(BaseCommand):
+    help = 'Envía las campañas de avisos programadas que correspondan al período actual'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--campania',
+            type=int,
+            help='Ejecutar solo la campaña con este ID'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Ignora el día del mes y la franja horaria (sigue siendo una vez por período)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo muestra cuántos destinatarios se resolverían, sin enviar'
+        )
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails por tanda (default: 50)')
+        parser.add_argument('--delay', type=int, default=10, help='Segundos entre tandas (default: 10)')
+
+    def handle(self, *args, **options):
+        ahora = timezone.localtime()
+        periodo = ahora.strftime('%Y-%m')
+        forzar = options['forzar']
+
+        if not forzar and not self.en_franja_horaria(ahora.hour):
+            self.stdout.write(
+                f'Fuera de la franja de envío ({settings.CAMPANIAS_HORA_INICIO}h a '
+                f'{settings.CAMPANIAS_HORA_FIN}h). Nada que hacer.'
+            )
+            return
+
+        campanias = CampaniaAviso.objects.filter(activa=True)
+        if options['campania']:
+            campanias = campanias.filter(pk=options['campania'])
+
+        for campania in campanias:
+            if not forzar and ahora.day < campania.dia_del_mes:
+                continue
+
+            if EjecucionCampania.objects.filter(
+                campania=campania, periodo=periodo
+            ).exclude(self.filtro_retomables()).exists():
+                self.stdout.write(f'  - {campania.nombre}: ya ejecutada en {periodo}, se omite')
+                continue
+
+            destinatarios = self.resolver_destinatarios(campania, ahora.date())
+            self.stdout.write(f'  - {campania.nombre}: {len(destinatarios)} destinatarios')
+
+            if options['dry_run'] or not destinatarios:
+                continue
+
+            ejecucion = self.reservar_ejecucion(campania, periodo, len(destinatarios))
+            if ejecucion is None:
+                self.stdout.write(f'  - {campania.nombre}: tomada por otro proceso, se omite')
+                continue
+
+            # Al retomar, quien ya recibió el aviso en este período no se repite
+            ya_enviados = set(ejecucion.envios.values_list('email', flat=True))
+            pendientes = [email for email in destinatarios if email not in ya_enviados]
+            if ya_enviados:
+                self.stdout.write(
+                    f'  - {campania.nombre}: se retoma, {len(destinatarios) - len(pendientes)} ya enviados'
+                )
+
+            resultado = enviar_emails_masivos(
+                destinatarios=pendientes,
+                asunto=campania.asunto,
+                mensaje_texto=campania.mensaje,
+                mensaje_html=mensaje_a_html(campania.mensaje),
+                batch_size=options['batch_size'],
+                delay=options['delay'],
+                al_terminar_tanda=partial(self.registrar_tanda, ejecucion),
+            )
+
+            ejecucion.estado = 'abortada' if resultado.get('abortado') else 'finalizada'
+            ejecucion.enviados = ejecucion.envios.count()
+            ejecucion.fallidos = len(resultado['fallidos'])
+            ejecucion.fecha_fin = timezone.now()
+            ejecucion.save(update_fields=['estado', 'enviados', 'fallidos', 'fecha_fin'])
+
+            RegistroAuditoria.log(
+                None, 'EMAIL_SENT',
+                f'Campaña programada "{campania.nombre}" ({periodo}): '
+                f'{resultado["enviados"]}/{len(pendientes)} enviados'
+                + (f' (retomada, {len(ya_enviados)} ya enviados)' if ya_enviados else '')
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'  - {campania.nombre}: {resultado["enviados"]} enviados, '
+                f'{len(resultado["fallidos"])} fallidos'
+            ))
+
+    def en_franja_horaria(self, hora):
+        """True si la hora cae en la franja de bajo tráfico (admite cruzar medianoche)."""
+        inicio = settings.CAMPANIAS_HORA_INICIO
+        fin = settings.CAMPANIAS_HORA_FIN
+        if inicio <= fin:
+            return inicio <= hora < fin
+        return hora >= inicio or hora < fin
+
+    def resolver_destinatarios(self, campania, hoy):
+        """Emails (normalizados y sin suprimidos) de los responsables de alumnos con deuda."""
+        if campania.solo_vencidas:
+            deudas = RegistroDeuda.objects.filter(FILTRO_CON_SALDO, fecha_vencimiento__lt=hoy)
+            alumnos = Alumno.objects.filter(documento__in=deudas.values('alumno_id'))
+        else:
+            alumnos = Alumno.objects.filter(saldo_moroso__gt=0)
+        emails = [e for e in emails_por_alumno(alumnos).values() if e]
+        return preparar_destinatarios(emails)['validos']
+
+    def filtro_retomables(self):
+        """Ejecuciones abortadas o en curso sin avances recientes (el proceso murió)."""
+        minutos = getattr(settings, 'CAMPANIAS_MINUTOS_SIN_PROGRESO', 60)
+        limite = timezone.now() - timedelta(minutes=minutos)
+        return Q(estado='abortada') | Q(estado='en_curso', fecha_progreso__lt=limite)
+
+    def reservar_ejecucion(self, campania, periodo, total):
+        """
+        Registra la ejecución del período. La restricción única (campaña, período)
+        evita envíos duplicados si dos crons corren a la vez; una ejecución
+        retomable se toma con un UPDATE condicional, así que solo la toma uno.
+        """
+        try:
+            with transaction.atomic():
+                return EjecucionCampania.objects.create(
+                    campania=campania, periodo=periodo, destinatarios=total
+                )
+        except IntegrityError:
+            retomadas = EjecucionCampania.objects.filter(
+                self.filtro_retomables(), campania=campania, periodo=periodo,
+            ).update(estado='en_curso', destinatarios=total, fecha_progreso=timezone.now(), fecha_fin=None)
+            if retomadas:
+                return EjecucionCampania.objects.get(campania=campania, periodo=periodo)
+            return None
+
+    def registrar_tanda(self, ejecucion, enviados):
+        """Guarda los emails enviados de una tanda y marca el avance de la ejecución."""
+        with transaction.atomic():
+            EnvioCampania.objects.bulk_create(
+                [EnvioCampania(ejecucion=ejecucion, email=email) for email in enviados],
+                ignore_conflicts=True,
+            )
+            EjecucionCampania.objects.filter(pk=ejecucion.pk).update(
+                enviados=F('enviados') + len(enviados), fecha_progreso=timezone.now(),
+            )
@@ -0,0 +1,45 @@
+"""
+Calcula las huellas (SHA-256 y hash perceptual) de los comprobantes que no
+las tienen (subidos antes de que se calcularan al enviar el pago), para que
+entren en la detección de duplicados.
+
+Uso:
+    python manage.py generar_huellas
+    python manage.py generar_huellas --limite 200
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from portal.duplicados_services import calcular_huellas, guardar_bandas
+from portal.models import Pago
+
+
+class Command(BaseCommand):
+    help = 'Calcula las huellas faltantes de los comprobantes de pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Cantidad máxima de comprobantes a procesar')
+
+    def handle(self, *args, **options):
+        pagos = Pago.objects.exclude(Q(comprobante='') | Q(comprobante__isnull=True)).filter(
+            comprobante_sha256=''
+        ).order_by('-id')
+        if options['limite']:
+            pagos = pagos[:options['limite']]
+
+        calculadas = fallidas = 0
+        for pago in pagos.iterator():
+            try:
+                with pago.comprobante.open('rb') as archivo:
+                    pago.comprobante_sha256, pago.comprobante_phash = calcular_huellas(archivo)
+            except OSError as e:
+                self.stderr.write(f"Pago {pago.id}: {e}")
+                fallidas += 1
+                continue
+            pago.save(update_fields=['comprobante_sha256', 'comprobante_phash'])
+            pago.huellas.all().delete()
+            guardar_bandas([pago])
+            calculadas += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Huellas calculadas: {calculadas} (sin calcular: {fallidas})"))
@@ -0,0 +1,59 @@
+"""
+Genera las miniaturas de los comprobantes que no la tienen (subidos antes de
+que se generaran al enviar el pago).
+
+En Cloudinary las imágenes se transforman por URL y no necesitan derivado:
+solo se procesan los PDFs. En disco se procesan imágenes y PDFs.
+
+Uso:
+    python manage.py generar_miniaturas
+    python manage.py generar_miniaturas --limite 200
+"""
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from portal.comprobantes_services import miniatura_imagen, miniatura_pdf, usa_cloudinary
+from portal.models import Pago
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas faltantes de los comprobantes de pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Cantidad máxima de comprobantes a procesar')
+
+    def handle(self, *args, **options):
+        from PIL import Image, UnidentifiedImageError
+
+        pagos = Pago.objects.exclude(Q(comprobante='') | Q(comprobante__isnull=True)).filter(
+            Q(miniatura='') | Q(miniatura__isnull=True)
+        ).order_by('-id')
+        if usa_cloudinary():
+            pagos = pagos.filter(comprobante__iendswith='.pdf')
+        if options['limite']:
+            pagos = pagos[:options['limite']]
+
+        generadas = fallidas = 0
+        for pago in pagos.iterator():
+            nombre = os.path.splitext(os.path.basename(pago.comprobante.name))[0]
+            try:
+                with pago.comprobante.open('rb') as archivo:
+                    if pago.es_pdf:
+                        miniatura = miniatura_pdf(archivo, nombre)
+                    else:
+                        miniatura = miniatura_imagen(Image.open(archivo), nombre)
+            except (OSError, UnidentifiedImageError) as e:
+                self.stderr.write(f"Pago {pago.id}: {e}")
+                miniatura = None
+            if miniatura is None:
+                fallidas += 1
+                continue
+            pago.miniatura.save(miniatura.name, miniatura, save=False)
+            miniatura.close()
+            pago.save(update_fields=['miniatura'])
+            generadas += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas generadas: {generadas} (sin generar: {fallidas})"))
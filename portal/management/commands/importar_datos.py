@@ -8,6 +8,8 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 import pandas as pd
 from portal.models import Alumno, ConceptoDeuda, RegistroDeuda
+from portal.estadisticas_services import recalcular_estadisticas
+from portal.saldos_services import saldos_diferidos
 
 
 class Command(BaseCommand):
@@ -52,6 +54,7 @@ class Command(BaseCommand):
             help='Elimina todos los datos existentes antes de importar'
         )
 
+    @saldos_diferidos()
     def handle(self, *args, **options):
         base_dir = settings.BASE_DIR
         alumnos_path = os.path.join(base_dir, options['alumnos'])
@@ -75,6 +78,9 @@ class Command(BaseCommand):
         self.stdout.write(f'Importando deudas desde {deudas_path}...')
         self.importar_deudas(deudas_path)
 
+        # 4. Contadores del panel administrativo
+        recalcular_estadisticas()
+
         self.stdout.write(self.style.SUCCESS('¡Importación completada exitosamente!'))
 
     def crear_conceptos(self):
@@ -172,7 +178,6 @@ class Command(BaseCommand):
                         'nivel': str(row.get('Niv', '')).strip() if pd.notna(row.get('Niv')) else '',
                         'curso': str(row.get('Cur', '')).strip() if pd.notna(row.get('Cur')) else '',
                         'division': str(row.get('Div', '')).strip() if pd.notna(row.get('Div')) else '',
-                        'saldo_moroso': Decimal(str(row.get('Saldo_Moroso', 0))) if pd.notna(row.get('Saldo_Moroso')) else Decimal('0'),
                     }
                 )
                 alumnos_actualizados += 1
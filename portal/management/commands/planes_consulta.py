@@ -0,0 +1,90 @@
+"""
+Imprime el plan de ejecución (EXPLAIN) de las consultas más frecuentes antes
+y después de los índices de la migración 0008.
+
+Trabaja sobre una base de prueba descartable: la crea, la siembra con
+datos_prueba.sembrar_datos() y la destruye al terminar. Nunca toca la base real.
+
+Uso:
+    python manage.py planes_consulta
+    python manage.py planes_consulta --alumnos 2000 --pagos 10000 --analizar
+"""
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from portal.datos_prueba import sembrar_datos
+from portal.models import Pago, RegistroAuditoria, RegistroDeuda
+
+MIGRACION_ANTES = '0007_estadisticaspanel'
+MIGRACION_DESPUES = '0008_indices_consultas_frecuentes'
+
+
+def consultas_frecuentes():
+    """Las consultas calientes del panel, como las arman las vistas."""
+    deuda = RegistroDeuda.objects.order_by('id').first()
+    usuario_id = RegistroAuditoria.objects.exclude(usuario=None).values_list('usuario_id', flat=True).first()
+    return [
+        ('admin_deudas (saldo > 0, paginado por -id)',
+         RegistroDeuda.objects.filter(monto__gt=0)
+         .exclude(estado__in=['no_corresponde', 'pagado']).order_by('-id')[:50]),
+        ('import: dedupe alumno + concepto + período',
+         RegistroDeuda.objects.filter(alumno_id=deuda.alumno_id, concepto_id=deuda.concepto_id, periodo='')),
+        ('admin_pagos / dashboard: pendientes por fecha',
+         Pago.objects.filter(estado='pendiente').order_by('-fecha_envio', '-id')[:50]),
+        ('admin_pagos: todos por fecha',
+         Pago.objects.order_by('-fecha_envio', '-id')[:50]),
+        ('auditoría: últimos registros',
+         RegistroAuditoria.objects.order_by('-timestamp')[:200]),
+        ('auditoría: rango de fechas',
+         RegistroAuditoria.objects.filter(
+             timestamp__gte=timezone.now() - timedelta(days=7), timestamp__lt=timezone.now(),
+         ).order_by('-timestamp')[:200]),
+        ('auditoría: por usuario',
+         RegistroAuditoria.objects.filter(usuario_id=usuario_id).order_by('-timestamp')[:200]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Muestra los planes de consulta antes/después de los índices sobre una base sembrada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alumnos', type=int, default=1000, help='Alumnos a sembrar (default: 1000)')
+        parser.add_argument('--conceptos', type=int, default=20, help='Conceptos de deuda (default: 20)')
+        parser.add_argument('--pagos', type=int, default=5000, help='Pagos a sembrar (default: 5000)')
+        parser.add_argument('--auditoria', type=int, default=10000, help='Registros de auditoría (default: 10000)')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla aleatoria (default: 0)')
+        parser.add_argument('--analizar', action='store_true',
+                            help='EXPLAIN ANALYZE (solo PostgreSQL): ejecuta las consultas y muestra tiempos reales')
+
+    def handle(self, *args, **options):
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Se siembra con el esquema completo y después se vuelve a la migración previa
+            filas = sembrar_datos(
+                alumnos=options['alumnos'], conceptos=options['conceptos'],
+                pagos=options['pagos'], auditoria=options['auditoria'],
+                semilla=options['semilla'],
+            )
+            self.stdout.write(f"Base sembrada: {filas}")
+            call_command('migrate', 'portal', MIGRACION_ANTES, verbosity=0)
+
+            self._imprimir_planes('ANTES', MIGRACION_ANTES, options['analizar'])
+            call_command('migrate', 'portal', MIGRACION_DESPUES, verbosity=0)
+            self._imprimir_planes('DESPUÉS', MIGRACION_DESPUES, options['analizar'])
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    def _imprimir_planes(self, titulo, migracion, analizar):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')  # estadísticas frescas para el planner
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n===== {titulo} ({migracion}) ====='))
+        opciones = {'analyze': True} if analizar and connection.vendor == 'postgresql' else {}
+        for nombre, queryset in consultas_frecuentes():
+            self.stdout.write(self.style.SUCCESS(f'\n-- {nombre}'))
+            self.stdout.write(queryset.explain(**opciones))
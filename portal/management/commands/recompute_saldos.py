@@ -0,0 +1,28 @@
+"""
+Reconstruye en bloque Alumno.saldo_moroso, Alumno.deudas_pendientes y la
+tabla SaldoFamilia a partir de las deudas con saldo.
+
+Los saldos se mantienen solos al cambiar deudas y pagos; este comando es la
+red de seguridad ante cambios hechos por fuera (SQL, cargas con bulk_create).
+
+Uso:
+    python manage.py recompute_saldos
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.saldos_services import recalcular_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en bloque los saldos por alumno y por familia'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        resultado = recalcular_saldos()
+        self.stdout.write(self.style.SUCCESS(
+            f"Saldos recalculados en {time.perf_counter() - inicio:.2f}s: "
+            f"{resultado['actualizados']} de {resultado['alumnos']} alumnos actualizados, "
+            f"{resultado['familias']} familias"
+        ))
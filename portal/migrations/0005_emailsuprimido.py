@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_alter_registroauditoria_accion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailSuprimido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('motivo', models.CharField(choices=[('invalido', 'Dirección Inválida'), ('rebote', 'Rebote Permanente'), ('rechazado', 'Rechazado por el Proveedor'), ('queja', 'Marcado como Spam')], default='invalido', max_length=20)),
+                ('detalle', models.TextField(blank=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Email Suprimido',
+                'verbose_name_plural': 'Emails Suprimidos',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:55
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0005_emailsuprimido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaniaAviso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('asunto', models.CharField(max_length=200)),
+                ('mensaje', models.TextField(help_text='Texto plano; las URLs se convierten en links')),
+                ('dia_del_mes', models.PositiveSmallIntegerField(default=10, help_text='Día del mes a partir del cual se envía (1-28)', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(28)])),
+                ('solo_vencidas', models.BooleanField(default=True, help_text='Solo deudas con fecha de vencimiento pasada')),
+                ('activa', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Campaña de Avisos',
+                'verbose_name_plural': 'Campañas de Avisos',
+                'ordering': ['dia_del_mes', 'nombre'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('dia_del_mes__gte', 1), ('dia_del_mes__lte', 28)), name='campania_dia_del_mes_valido')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EjecucionCampania',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(help_text='Ej: 2026-03', max_length=7)),
+                ('estado', models.CharField(choices=[('en_curso', 'En Curso'), ('finalizada', 'Finalizada'), ('abortada', 'Abortada')], default='en_curso', max_length=20)),
+                ('destinatarios', models.IntegerField(default=0)),
+                ('enviados', models.IntegerField(default=0)),
+                ('fallidos', models.IntegerField(default=0)),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('campania', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ejecuciones', to='portal.campaniaaviso')),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Campaña',
+                'verbose_name_plural': 'Ejecuciones de Campañas',
+                'ordering': ['-fecha_inicio'],
+                'constraints': [models.UniqueConstraint(fields=('campania', 'periodo'), name='unique_campania_periodo')],
+            },
+        ),
+    ]
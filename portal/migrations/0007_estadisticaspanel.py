@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_campaniaaviso_ejecucioncampania'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasPanel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deudas_count', models.IntegerField(default=0)),
+                ('total_deuda', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pagos_pendientes', models.IntegerField(default=0)),
+                ('pagos_verificados', models.IntegerField(default=0)),
+                ('total_recaudado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('alumnos_count', models.IntegerField(default=0)),
+                ('fecha_recalculo', models.DateTimeField(blank=True, help_text='Último recálculo completo', null=True)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas del Panel',
+                'verbose_name_plural': 'Estadísticas del Panel',
+            },
+        ),
+    ]
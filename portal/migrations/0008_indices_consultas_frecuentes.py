@@ -0,0 +1,83 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Columnas que tienen que coincidir para que una deuda repetida sea una copia
+# exacta (ej: el mismo Excel importado dos veces) y se pueda borrar
+CAMPOS_COPIA = ('monto', 'estado', 'fecha_vencimiento', 'fecha_pago', 'observaciones')
+
+
+def desambiguar_deudas_duplicadas(apps, schema_editor):
+    """
+    Antes de crear la restricción única resuelve las deudas repetidas (mismo
+    alumno, concepto y período). Se conserva la de menor id; las copias
+    exactas sin pagos se borran y el resto queda con el id agregado al
+    período, guardando el período original en observaciones. Cada deuda
+    afectada se informa por consola.
+    """
+    RegistroDeuda = apps.get_model('portal', 'RegistroDeuda')
+    grupos = (
+        RegistroDeuda.objects.values('alumno_id', 'concepto_id', 'periodo')
+        .annotate(cantidad=Count('id'), primero=Min('id'))
+        .filter(cantidad__gt=1)
+    )
+    for grupo in grupos:
+        original = RegistroDeuda.objects.get(id=grupo['primero'])
+        repetidas = RegistroDeuda.objects.filter(
+            alumno_id=grupo['alumno_id'],
+            concepto_id=grupo['concepto_id'],
+            periodo=grupo['periodo'],
+        ).exclude(id=original.id).annotate(cantidad_pagos=Count('pagos'))
+        for deuda in repetidas:
+            copia = all(getattr(deuda, campo) == getattr(original, campo) for campo in CAMPOS_COPIA)
+            if copia and not deuda.cantidad_pagos:
+                print(f"[DEUDAS] Deuda {deuda.id} (período '{deuda.periodo}') borrada: "
+                      f"copia exacta de la deuda {original.id}")
+                deuda.delete()
+                continue
+            sufijo = f"#{deuda.id}"
+            nota = f"Período original: '{deuda.periodo}' (repetida de la deuda {original.id})"
+            deuda.observaciones = f"{deuda.observaciones}\n{nota}" if deuda.observaciones else nota
+            deuda.periodo = deuda.periodo[:20 - len(sufijo)] + sufijo
+            deuda.save(update_fields=['periodo', 'observaciones'])
+            print(f"[DEUDAS] Deuda {deuda.id} (período '{grupo['periodo']}') renombrada a "
+                  f"'{deuda.periodo}': repetida de la deuda {original.id}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_estadisticaspanel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['estado', '-fecha_envio', '-id'], name='pago_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['-fecha_envio', '-id'], name='pago_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroauditoria',
+            index=models.Index(fields=['-timestamp'], name='auditoria_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroauditoria',
+            index=models.Index(fields=['usuario', '-timestamp'], name='auditoria_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrodeuda',
+            index=models.Index(condition=models.Q(('monto__gt', 0), models.Q(('estado__in', ['no_corresponde', 'pagado']), _negated=True)), fields=['-id'], name='deuda_con_saldo_idx'),
+        ),
+        migrations.RunPython(desambiguar_deudas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='registrodeuda',
+            constraint=models.UniqueConstraint(fields=('alumno', 'concepto', 'periodo'), name='unique_deuda_alumno_concepto'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:06
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia congelada de busqueda_services.terminos_alumno() al momento de esta
+# migración: el servicio puede cambiar, el backfill histórico no.
+CAMPOS_INDEXADOS = {
+    'alumno': ('documento', 'apellido', 'nombres'),
+    'padre': ('padre_dni', 'padre_nombre'),
+    'madre': ('madre_dni', 'madre_nombre'),
+    'tutor': ('tutor_dni', 'tutor_nombre'),
+}
+
+
+def _normalizar(texto):
+    if texto is None:
+        return []
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r'[a-z0-9]+', texto.lower())
+
+
+def terminos_alumno(alumno):
+    return {
+        (palabra[:50], origen)
+        for origen, campos in CAMPOS_INDEXADOS.items()
+        for campo in campos
+        for palabra in _normalizar(getattr(alumno, campo))
+    }
+
+
+def indexar_alumnos_existentes(apps, schema_editor):
+    Alumno = apps.get_model('portal', 'Alumno')
+    TerminoBusqueda = apps.get_model('portal', 'TerminoBusqueda')
+    TerminoBusqueda.objects.bulk_create([
+        TerminoBusqueda(alumno_id=alumno.documento, termino=termino, origen=origen)
+        for alumno in Alumno.objects.iterator()
+        for termino, origen in terminos_alumno(alumno)
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(db_index=True, max_length=50)),
+                ('origen', models.CharField(choices=[('alumno', 'Alumno'), ('padre', 'Padre'), ('madre', 'Madre'), ('tutor', 'Tutor')], max_length=10)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='portal.alumno')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'constraints': [models.UniqueConstraint(fields=('alumno', 'termino', 'origen'), name='unique_termino_alumno')],
+            },
+        ),
+        migrations.RunPython(indexar_alumnos_existentes, migrations.RunPython.noop),
+    ]
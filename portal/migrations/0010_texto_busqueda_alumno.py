@@ -0,0 +1,68 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:08
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia congelada de busqueda_services.texto_busqueda_alumno() al momento de
+# esta migración: el servicio puede cambiar, el backfill histórico no.
+CAMPOS_TEXTO_BUSQUEDA = (
+    'apellido', 'nombres', 'documento',
+    'padre_nombre', 'padre_dni',
+    'madre_nombre', 'madre_dni',
+    'tutor_nombre', 'tutor_dni',
+    'nivel', 'curso', 'division', 'barrio',
+)
+
+
+def _normalizar(texto):
+    if texto is None:
+        return []
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r'[a-z0-9]+', texto.lower())
+
+
+def llenar_texto_busqueda(apps, schema_editor):
+    Alumno = apps.get_model('portal', 'Alumno')
+    alumnos = list(Alumno.objects.only('documento', *CAMPOS_TEXTO_BUSQUEDA))
+    for alumno in alumnos:
+        alumno.texto_busqueda = ' '.join(
+            palabra for campo in CAMPOS_TEXTO_BUSQUEDA for palabra in _normalizar(getattr(alumno, campo))
+        )
+    Alumno.objects.bulk_update(alumnos, ['texto_busqueda'], batch_size=1000)
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    # pg_trgm e índice GIN solo en PostgreSQL; el resto usa el índice en memoria
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS alumno_texto_trgm_idx '
+        'ON portal_alumno USING gin (texto_busqueda gin_trgm_ops)'
+    )
+
+
+def borrar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS alumno_texto_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_termino_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alumno',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(llenar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigramas, borrar_indice_trigramas),
+    ]
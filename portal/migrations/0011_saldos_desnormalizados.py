@@ -0,0 +1,70 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:11
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def calcular_saldos_iniciales(apps, schema_editor):
+    """Misma regla que saldos_services.recalcular_saldos(), con los modelos históricos."""
+    Alumno = apps.get_model('portal', 'Alumno')
+    RegistroDeuda = apps.get_model('portal', 'RegistroDeuda')
+    SaldoFamilia = apps.get_model('portal', 'SaldoFamilia')
+
+    totales = (
+        RegistroDeuda.objects.filter(estado__in=['pendiente', 'parcial'], monto__gt=0)
+        .values('alumno_id').annotate(saldo=Sum('monto'), cantidad=Count('id')).order_by()
+    )
+    alumnos = {a.documento: a for a in Alumno.objects.all()}
+    for alumno in alumnos.values():
+        alumno.saldo_moroso = 0
+        alumno.deudas_pendientes = 0
+    for fila in totales:
+        alumno = alumnos[fila['alumno_id']]
+        alumno.saldo_moroso = fila['saldo']
+        alumno.deudas_pendientes = fila['cantidad']
+    Alumno.objects.bulk_update(alumnos.values(), ['saldo_moroso', 'deudas_pendientes'], batch_size=500)
+
+    SaldoFamilia.objects.bulk_create([
+        SaldoFamilia(familia=fila['familia'], saldo=fila['saldo'] or 0,
+                     deudas_pendientes=fila['pendientes'] or 0, alumnos=fila['alumnos'])
+        for fila in Alumno.objects.exclude(familia=0).values('familia').annotate(
+            saldo=Sum('saldo_moroso'), pendientes=Sum('deudas_pendientes'), alumnos=Count('documento'),
+        ).order_by('familia')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_texto_busqueda_alumno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoFamilia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('familia', models.IntegerField(unique=True)),
+                ('saldo', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=14)),
+                ('deudas_pendientes', models.PositiveIntegerField(default=0)),
+                ('alumnos', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo de Familia',
+                'verbose_name_plural': 'Saldos de Familias',
+                'ordering': ['familia'],
+            },
+        ),
+        migrations.AddField(
+            model_name='alumno',
+            name='deudas_pendientes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Deudas Pendientes'),
+        ),
+        migrations.AlterField(
+            model_name='alumno',
+            name='saldo_moroso',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12, verbose_name='Saldo Total Adeudado'),
+        ),
+        migrations.RunPython(calcular_saldos_iniciales, migrations.RunPython.noop),
+    ]
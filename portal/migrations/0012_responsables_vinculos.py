@@ -0,0 +1,88 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia congelada de responsables_services.CAMPOS_ROL / responsables_alumno()
+# al momento de esta migración: rol -> columnas de Alumno (dni, nombre, email, teléfono)
+CAMPOS_ROL = {
+    'alumno': ('documento', None, 'email', 'telefono1'),
+    'padre': ('padre_dni', 'padre_nombre', 'padre_email', 'padre_telefono1'),
+    'madre': ('madre_dni', 'madre_nombre', 'madre_email', 'madre_telefono1'),
+    'tutor': ('tutor_dni', 'tutor_nombre', 'tutor_email', 'tutor_telefono1'),
+}
+
+
+def responsables_alumno(alumno):
+    """Tuplas (rol, dni, nombre, email, telefono) de las columnas del alumno."""
+    resultado = []
+    for rol, (campo_dni, campo_nombre, campo_email, campo_telefono) in CAMPOS_ROL.items():
+        dni = getattr(alumno, campo_dni)
+        if not dni:
+            continue
+        nombre = getattr(alumno, campo_nombre) if campo_nombre else f"{alumno.apellido}, {alumno.nombres}"
+        resultado.append((
+            rol, dni, (nombre or '')[:150],
+            (getattr(alumno, campo_email) or '').strip(),
+            (getattr(alumno, campo_telefono) or '')[:50],
+        ))
+    return resultado
+
+
+def crear_vinculos_existentes(apps, schema_editor):
+    Alumno = apps.get_model('portal', 'Alumno')
+    Responsable = apps.get_model('portal', 'Responsable')
+    Vinculo = apps.get_model('portal', 'Vinculo')
+
+    datos = {}
+    vinculos = []
+    for alumno in Alumno.objects.order_by().iterator():
+        for rol, dni, nombre, email, telefono in responsables_alumno(alumno):
+            anterior = datos.get(dni, ('', '', ''))
+            datos[dni] = (nombre or anterior[0], email or anterior[1], telefono or anterior[2])
+            vinculos.append(Vinculo(responsable_id=dni, alumno_id=alumno.documento, rol=rol))
+
+    Responsable.objects.bulk_create([
+        Responsable(dni=dni, nombre=nombre, email=email, telefono=telefono)
+        for dni, (nombre, email, telefono) in datos.items()
+    ], batch_size=1000)
+    Vinculo.objects.bulk_create(vinculos, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_saldos_desnormalizados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Responsable',
+            fields=[
+                ('dni', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='DNI')),
+                ('nombre', models.CharField(blank=True, max_length=150)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('telefono', models.CharField(blank=True, max_length=50)),
+            ],
+            options={
+                'verbose_name': 'Responsable',
+                'verbose_name_plural': 'Responsables',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Vinculo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rol', models.CharField(choices=[('alumno', 'Alumno'), ('padre', 'Padre'), ('madre', 'Madre'), ('tutor', 'Tutor'), ('otro', 'Otro Responsable')], max_length=10)),
+                ('alumno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos', to='portal.alumno')),
+                ('responsable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos', to='portal.responsable')),
+            ],
+            options={
+                'verbose_name': 'Vínculo',
+                'verbose_name_plural': 'Vínculos',
+                'constraints': [models.UniqueConstraint(fields=('responsable', 'alumno', 'rol'), name='unique_vinculo')],
+            },
+        ),
+        migrations.RunPython(crear_vinculos_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_responsables_vinculos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='miniatura',
+            field=models.ImageField(blank=True, null=True, upload_to='comprobantes/miniaturas/'),
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='comprobante',
+            field=models.FileField(blank=True, null=True, upload_to='comprobantes/'),
+        ),
+    ]
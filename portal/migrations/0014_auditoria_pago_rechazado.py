@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0013_comprobante_pdf_miniatura'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroauditoria',
+            name='accion',
+            field=models.CharField(choices=[('LOGIN', 'Inicio de Sesión'), ('LOGOUT', 'Cierre de Sesión'), ('PASSWORD_CHANGED', 'Cambio de Contraseña'), ('PAYMENT_SUBMITTED', 'Pago Enviado'), ('PAYMENT_VERIFIED', 'Pago Verificado'), ('PAYMENT_REJECTED', 'Pago Rechazado'), ('IMPORT', 'Importación de Datos'), ('EXPORT', 'Exportación de Datos'), ('CONFIG_UPDATE', 'Actualización de Configuración'), ('USER_CREATED', 'Usuario Creado'), ('PASSWORD_RESET', 'Contraseña Reseteada'), ('EMAIL_SENT', 'Email Enviado')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0014_auditoria_pago_rechazado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='comprobante_phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='comprobante_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='HuellaComprobante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('banda', models.CharField(db_index=True, help_text='Nº de banda + 4 dígitos hex del phash', max_length=5)),
+                ('pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='huellas', to='portal.pago')),
+            ],
+            options={
+                'verbose_name': 'Huella de Comprobante',
+                'verbose_name_plural': 'Huellas de Comprobantes',
+            },
+        ),
+    ]
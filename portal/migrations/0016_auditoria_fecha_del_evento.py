@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_huellas_comprobantes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroauditoria',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
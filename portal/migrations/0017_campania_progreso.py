@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0016_auditoria_fecha_del_evento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ejecucioncampania',
+            name='fecha_progreso',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Último avance registrado'),
+        ),
+        migrations.CreateModel(
+            name='EnvioCampania',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('ejecucion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='portal.ejecucioncampania')),
+            ],
+            options={
+                'verbose_name': 'Envío de Campaña',
+                'verbose_name_plural': 'Envíos de Campañas',
+                'constraints': [models.UniqueConstraint(fields=('ejecucion', 'email'), name='unique_envio_ejecucion_email')],
+            },
+        ),
+    ]
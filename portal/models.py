@@ -1,3 +1,4 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -71,14 +72,26 @@ class Alumno(models.Model):
     # Otros
     familia = models.IntegerField(default=0, help_text="ID de grupo familiar")
     recargo = models.BooleanField(default=False)
-    saldo_moroso = models.DecimalField(max_digits=12, decimal_places=2, default=0, 
+    saldo_moroso = models.DecimalField(max_digits=12, decimal_places=2, default=0, db_index=True,
                                         verbose_name="Saldo Total Adeudado")
+    deudas_pendientes = models.PositiveIntegerField(default=0, verbose_name="Deudas Pendientes")
+    
+    # Documento de búsqueda desnormalizado (ver busqueda_services.texto_busqueda_alumno)
+    texto_busqueda = models.TextField(blank=True, editable=False)
 
     class Meta:
         ordering = ['apellido', 'nombres']
         verbose_name = "Alumno"
         verbose_name_plural = "Alumnos"
 
+    def save(self, *args, **kwargs):
+        from .busqueda_services import texto_busqueda_alumno
+        
+        self.texto_busqueda = texto_busqueda_alumno(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'texto_busqueda'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.apellido}, {self.nombres} (DNI: {self.documento})"
     
@@ -123,6 +136,17 @@ class RegistroDeuda(models.Model):
         ordering = ['concepto__orden', 'concepto__codigo']
         verbose_name = "Registro de Deuda"
         verbose_name_plural = "Registros de Deuda"
+        indexes = [
+            # Listado de admin_deudas: solo deudas con saldo, paginado por -id
+            models.Index(
+                fields=['-id'], name='deuda_con_saldo_idx',
+                condition=models.Q(monto__gt=0) & ~models.Q(estado__in=['no_corresponde', 'pagado']),
+            ),
+        ]
+        constraints = [
+            # Una deuda por alumno, concepto y período (también sirve al dedupe del import)
+            models.UniqueConstraint(fields=['alumno', 'concepto', 'periodo'], name='unique_deuda_alumno_concepto'),
+        ]
 
     def __str__(self):
         return f"{self.alumno.apellido} - {self.concepto.nombre}: ${self.monto}"
@@ -177,7 +201,12 @@ class Pago(models.Model):
     numero_operacion = models.CharField(max_length=50, unique=True, editable=False)
     deuda = models.ForeignKey(RegistroDeuda, on_delete=models.CASCADE, related_name='pagos')
     monto_pagado = models.DecimalField(max_digits=12, decimal_places=2)
-    comprobante = models.ImageField(upload_to='comprobantes/', blank=True, null=True)
+    # Imagen normalizada o PDF (ver comprobantes_services.normalizar_comprobante)
+    comprobante = models.FileField(upload_to='comprobantes/', blank=True, null=True)
+    miniatura = models.ImageField(upload_to='comprobantes/miniaturas/', blank=True, null=True)
+    # Huellas para detectar comprobantes repetidos (ver duplicados_services)
+    comprobante_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    comprobante_phash = models.CharField(max_length=16, blank=True, db_index=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     
     # Fechas
@@ -194,6 +223,10 @@ class Pago(models.Model):
         ordering = ['-fecha_envio']
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
+        indexes = [
+            models.Index(fields=['estado', '-fecha_envio', '-id'], name='pago_estado_fecha_idx'),
+            models.Index(fields=['-fecha_envio', '-id'], name='pago_fecha_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.numero_operacion:
@@ -204,30 +237,59 @@ class Pago(models.Model):
     def __str__(self):
         return f"{self.numero_operacion} - ${self.monto_pagado}"
     
+    @property
+    def es_pdf(self):
+        return bool(self.comprobante) and self.comprobante.name.lower().endswith('.pdf')
+    
+    @property
+    def url_miniatura(self):
+        from .comprobantes_services import url_miniatura
+        return url_miniatura(self)
+    
+    @property
+    def url_vista_previa(self):
+        from .comprobantes_services import url_vista_previa
+        return url_vista_previa(self)
+    
     def verificar(self, usuario):
-        """Marca el pago como verificado y actualiza la deuda asociada."""
-        # ESCUDO ANTI-DOBLE EJECUCIÓN: Si el pago ya fue verificado, cortamos la función acá.
-        if self.estado == 'verificado':
-            return
-            
-        self.estado = 'verificado'
-        self.fecha_verificacion = timezone.now()
-        self.usuario_verificador = usuario
-        self.save()
+        """
+        Marca el pago como verificado y actualiza la deuda asociada.
+        
+        Es atómico: el pago y la deuda se bloquean (select_for_update) y el
+        estado y el monto se leen de las filas bloqueadas, así dos
+        verificaciones simultáneas de pagos parciales de la misma deuda no
+        pierden un descuento y un pago nunca se descuenta dos veces.
+        
+        Returns:
+            True si el pago se verificó, False si ya estaba verificado
+        """
+        from .pagos_services import procesar_pagos
         
-        # --- LÓGICA DE PAGO PARCIAL ---
-        # Si la plata enviada cubre (o supera) el saldo total de la deuda
-        if self.monto_pagado >= self.deuda.monto:
-            self.deuda.estado = 'pago_verificado'
-            self.deuda.monto = 0
-        else:
-            # Si es un pago parcial, le descontamos la plata y cambiamos el estado
-            self.deuda.monto -= self.monto_pagado
-            self.deuda.estado = 'parcial'
-            
-        # Registramos la fecha de este último movimiento
-        self.deuda.fecha_pago = timezone.now().date()
-        self.deuda.save()
+        procesados = procesar_pagos([self.id], 'verificar', usuario, auditar=False)['procesados']
+        if not procesados:
+            return False
+        pago = procesados[0]
+        self.estado = pago.estado
+        self.fecha_verificacion = pago.fecha_verificacion
+        self.usuario_verificador = usuario
+        self.deuda = pago.deuda
+        return True
+
+
+class HuellaComprobante(models.Model):
+    """
+    Banda del hash perceptual de un comprobante: una fila indexada por banda
+    para buscar comprobantes parecidos sin comparar contra todos.
+    """
+    pago = models.ForeignKey(Pago, on_delete=models.CASCADE, related_name='huellas')
+    banda = models.CharField(max_length=5, db_index=True, help_text="Nº de banda + 4 dígitos hex del phash")
+    
+    class Meta:
+        verbose_name = "Huella de Comprobante"
+        verbose_name_plural = "Huellas de Comprobantes"
+    
+    def __str__(self):
+        return f"{self.pago_id} - {self.banda}"
 
 
 class ConfiguracionSistema(models.Model):
@@ -256,6 +318,55 @@ class ConfiguracionSistema(models.Model):
         return "Configuración del Sistema"
 
 
+class EstadisticasPanel(models.Model):
+    """
+    Contadores del panel administrativo (singleton).
+    Se actualizan de forma incremental cuando cambia el estado de una deuda o
+    un pago, para que cada página del panel los lea con una sola consulta.
+    Ver estadisticas_services.py.
+    """
+    deudas_count = models.IntegerField(default=0)
+    total_deuda = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pagos_pendientes = models.IntegerField(default=0)
+    pagos_verificados = models.IntegerField(default=0)
+    total_recaudado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    alumnos_count = models.IntegerField(default=0)
+    fecha_recalculo = models.DateTimeField(null=True, blank=True,
+                                           help_text="Último recálculo completo")
+    
+    class Meta:
+        verbose_name = "Estadísticas del Panel"
+        verbose_name_plural = "Estadísticas del Panel"
+    
+    def save(self, *args, **kwargs):
+        # Singleton pattern - solo puede haber un registro
+        self.pk = 1
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return "Estadísticas del Panel"
+
+
+class SaldoFamilia(models.Model):
+    """
+    Saldo adeudado por grupo familiar (Alumno.familia), suma de los saldos de
+    los hermanos. Lo mantiene saldos_services junto con Alumno.saldo_moroso.
+    """
+    familia = models.IntegerField(unique=True)
+    saldo = models.DecimalField(max_digits=14, decimal_places=2, default=0, db_index=True)
+    deudas_pendientes = models.PositiveIntegerField(default=0)
+    alumnos = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['familia']
+        verbose_name = "Saldo de Familia"
+        verbose_name_plural = "Saldos de Familias"
+    
+    def __str__(self):
+        return f"Familia {self.familia}: ${self.saldo}"
+
+
 class RegistroAuditoria(models.Model):
     """
     Log de auditoría para rastrear acciones importantes.
@@ -266,6 +377,7 @@ class RegistroAuditoria(models.Model):
         ('PASSWORD_CHANGED', 'Cambio de Contraseña'),
         ('PAYMENT_SUBMITTED', 'Pago Enviado'),
         ('PAYMENT_VERIFIED', 'Pago Verificado'),
+        ('PAYMENT_REJECTED', 'Pago Rechazado'),
         ('IMPORT', 'Importación de Datos'),
         ('EXPORT', 'Exportación de Datos'),
         ('CONFIG_UPDATE', 'Actualización de Configuración'),
@@ -278,29 +390,227 @@ class RegistroAuditoria(models.Model):
     accion = models.CharField(max_length=50, choices=ACCION_CHOICES)
     detalles = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Fecha del evento: se asigna al crear el objeto, aunque el insert sea diferido
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-timestamp']
         verbose_name = "Registro de Auditoría"
         verbose_name_plural = "Registros de Auditoría"
+        indexes = [
+            models.Index(fields=['-timestamp'], name='auditoria_fecha_idx'),
+            models.Index(fields=['usuario', '-timestamp'], name='auditoria_usuario_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.timestamp} - {self.get_accion_display()} - {self.usuario}"
     
+    @staticmethod
+    def ip_de(request):
+        if not request:
+            return None
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            return x_forwarded_for.split(',')[0]
+        return request.META.get('REMOTE_ADDR')
+    
     @classmethod
     def log(cls, usuario, accion, detalles='', request=None):
-        ip = None
-        if request:
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[0]
-            else:
-                ip = request.META.get('REMOTE_ADDR')
+        """
+        Registra una acción. Con AUDITORIA_ASINCRONA el registro se encola para
+        insertarse en lote (ver auditoria_services): la instancia devuelta puede
+        no estar guardada todavía (pk None), solo sirve para leer sus datos.
+        """
+        from .auditoria_services import registrar
         
-        return cls.objects.create(
+        return registrar(cls(
             usuario=usuario,
             accion=accion,
             detalles=detalles,
-            ip_address=ip
-        )
+            ip_address=cls.ip_de(request)
+        ))
+
+
+class EmailSuprimido(models.Model):
+    """
+    Lista de supresión de emails.
+    Direcciones que rebotaron o fueron rechazadas: los envíos masivos no las vuelven a intentar.
+    """
+    MOTIVO_CHOICES = [
+        ('invalido', 'Dirección Inválida'),
+        ('rebote', 'Rebote Permanente'),
+        ('rechazado', 'Rechazado por el Proveedor'),
+        ('queja', 'Marcado como Spam'),
+    ]
+    
+    email = models.EmailField(unique=True)
+    motivo = models.CharField(max_length=20, choices=MOTIVO_CHOICES, default='invalido')
+    detalle = models.TextField(blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = "Email Suprimido"
+        verbose_name_plural = "Emails Suprimidos"
+    
+    def __str__(self):
+        return f"{self.email} ({self.get_motivo_display()})"
+
+
+class CampaniaAviso(models.Model):
+    """
+    Campaña programada de avisos de deuda.
+    El comando `enviar_campanias` (cron) la ejecuta una vez por período a partir
+    del día del mes indicado, dentro de la ventana horaria de bajo tráfico.
+    """
+    nombre = models.CharField(max_length=100)
+    asunto = models.CharField(max_length=200)
+    mensaje = models.TextField(help_text="Texto plano; las URLs se convierten en links")
+    dia_del_mes = models.PositiveSmallIntegerField(
+        default=10, validators=[MinValueValidator(1), MaxValueValidator(28)],
+        help_text="Día del mes a partir del cual se envía (1-28)",
+    )
+    solo_vencidas = models.BooleanField(default=True, help_text="Solo deudas con fecha de vencimiento pasada")
+    activa = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['dia_del_mes', 'nombre']
+        verbose_name = "Campaña de Avisos"
+        verbose_name_plural = "Campañas de Avisos"
+        constraints = [
+            # Hasta el 28 para que la campaña salga también en febrero
+            models.CheckConstraint(
+                condition=models.Q(dia_del_mes__gte=1, dia_del_mes__lte=28), name='campania_dia_del_mes_valido',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre} (día {self.dia_del_mes})"
+
+
+class EjecucionCampania(models.Model):
+    """
+    Registro de una ejecución de campaña. La unicidad (campaña, período)
+    garantiza que cada campaña se envíe una sola vez por mes.
+    Los emails ya enviados quedan en EnvioCampania: al retomar una ejecución
+    abortada (o una en curso que dejó de avanzar) no se reenvían.
+    """
+    ESTADO_CHOICES = [
+        ('en_curso', 'En Curso'),
+        ('finalizada', 'Finalizada'),
+        ('abortada', 'Abortada'),
+    ]
+    
+    campania = models.ForeignKey(CampaniaAviso, on_delete=models.CASCADE, related_name='ejecuciones')
+    periodo = models.CharField(max_length=7, help_text="Ej: 2026-03")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_curso')
+    destinatarios = models.IntegerField(default=0)
+    enviados = models.IntegerField(default=0)
+    fallidos = models.IntegerField(default=0)
+    fecha_inicio = models.DateTimeField(auto_now_add=True)
+    fecha_progreso = models.DateTimeField(default=timezone.now, help_text="Último avance registrado")
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-fecha_inicio']
+        verbose_name = "Ejecución de Campaña"
+        verbose_name_plural = "Ejecuciones de Campañas"
+        constraints = [
+            models.UniqueConstraint(fields=['campania', 'periodo'], name='unique_campania_periodo'),
+        ]
+    
+    def __str__(self):
+        return f"{self.campania.nombre} - {self.periodo} ({self.get_estado_display()})"
+
+
+class EnvioCampania(models.Model):
+    """Email enviado en una ejecución de campaña (progreso por destinatario)."""
+    ejecucion = models.ForeignKey(EjecucionCampania, on_delete=models.CASCADE, related_name='envios')
+    email = models.EmailField()
+    
+    class Meta:
+        verbose_name = "Envío de Campaña"
+        verbose_name_plural = "Envíos de Campañas"
+        constraints = [
+            models.UniqueConstraint(fields=['ejecucion', 'email'], name='unique_envio_ejecucion_email'),
+        ]
+    
+    def __str__(self):
+        return f"{self.email} ({self.ejecucion_id})"
+
+
+class TerminoBusqueda(models.Model):
+    """
+    Índice de búsqueda por prefijo: una fila por palabra normalizada
+    (apellidos, nombres y DNIs del alumno y sus responsables).
+    Se mantiene desde busqueda_services.indexar_alumno().
+    """
+    ORIGEN_CHOICES = [
+        ('alumno', 'Alumno'),
+        ('padre', 'Padre'),
+        ('madre', 'Madre'),
+        ('tutor', 'Tutor'),
+    ]
+    
+    alumno = models.ForeignKey(Alumno, on_delete=models.CASCADE, related_name='terminos_busqueda')
+    termino = models.CharField(max_length=50, db_index=True)
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES)
+    
+    class Meta:
+        verbose_name = "Término de Búsqueda"
+        verbose_name_plural = "Términos de Búsqueda"
+        constraints = [
+            models.UniqueConstraint(fields=['alumno', 'termino', 'origen'], name='unique_termino_alumno'),
+        ]
+    
+    def __str__(self):
+        return f"{self.termino} ({self.origen}) -> {self.alumno_id}"
+
+
+class Responsable(models.Model):
+    """
+    Persona que puede consultar las deudas de uno o más alumnos: padre,
+    madre, tutor, otro responsable o el propio alumno (alumnos mayores).
+    Se mantiene desde responsables_services.sincronizar_vinculos().
+    """
+    dni = models.BigIntegerField(primary_key=True, verbose_name="DNI")
+    nombre = models.CharField(max_length=150, blank=True)
+    email = models.EmailField(blank=True)
+    telefono = models.CharField(max_length=50, blank=True)
+    
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Responsable"
+        verbose_name_plural = "Responsables"
+    
+    def __str__(self):
+        return f"{self.nombre} (DNI: {self.dni})"
+
+
+class Vinculo(models.Model):
+    """
+    Relación responsable -> alumno. Los roles padre, madre, tutor y alumno
+    se derivan de las columnas de Alumno; 'otro' se carga a mano y permite
+    más de tres responsables por alumno.
+    """
+    ROL_CHOICES = [
+        ('alumno', 'Alumno'),
+        ('padre', 'Padre'),
+        ('madre', 'Madre'),
+        ('tutor', 'Tutor'),
+        ('otro', 'Otro Responsable'),
+    ]
+    
+    responsable = models.ForeignKey(Responsable, on_delete=models.CASCADE, related_name='vinculos')
+    alumno = models.ForeignKey(Alumno, on_delete=models.CASCADE, related_name='vinculos')
+    rol = models.CharField(max_length=10, choices=ROL_CHOICES)
+    
+    class Meta:
+        verbose_name = "Vínculo"
+        verbose_name_plural = "Vínculos"
+        constraints = [
+            models.UniqueConstraint(fields=['responsable', 'alumno', 'rol'], name='unique_vinculo'),
+        ]
+    
+    def __str__(self):
+        return f"{self.responsable_id} ({self.rol}) -> {self.alumno_id}"
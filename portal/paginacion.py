@@ -0,0 +1,174 @@
+"""
+paginacion.py — Paginación por cursor (keyset) para los listados del panel.
+
+El Paginator de Django usa OFFSET y un COUNT(*) completo por página: la página
+N cuesta N veces lo que la primera. Acá cada página filtra a partir de la clave
+de la última fila vista, ej. (fecha_envio, id) < (f, i), que la base resuelve
+con el índice del ORDER BY sin recorrer las filas anteriores.
+
+El total se calcula aparte y se guarda en la caché por unos segundos, así que
+es aproximado mientras entran datos nuevos.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+
+def _serializar_valor(valor):
+    # isoformat() completo: DjangoJSONEncoder recorta los microsegundos y el
+    # cursor dejaría de coincidir con fecha_envio
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _codificar_cursor(valores):
+    crudo = json.dumps(valores, default=_serializar_valor).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor, modelo, orden):
+    """
+    Devuelve la lista de valores del cursor, convertidos al tipo de cada
+    campo del orden, o None si es inválido (base64 o JSON roto, cantidad de
+    valores distinta, nulos, listas u objetos, o valores que el campo no
+    acepta). Un cursor adulterado se trata como si no hubiera cursor.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(orden):
+        return None
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        if not isinstance(valor, (str, int, float)) or isinstance(valor, bool):
+            return None
+        try:
+            convertido = modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+        except (ValidationError, ValueError, TypeError, OverflowError):
+            return None
+        if convertido is None:
+            return None
+        # Los cursores propios llevan la zona horaria (isoformat de un datetime aware)
+        if isinstance(convertido, datetime) and settings.USE_TZ and timezone.is_naive(convertido):
+            return None
+        convertidos.append(convertido)
+    return convertidos
+
+
+def _filtro_siguientes(orden, valores):
+    """
+    Condición "viene después de `valores`" según el orden, campo a campo:
+    (a < va) OR (a = va AND b < vb) OR ... (con > en los campos ascendentes).
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+class PaginaCursor:
+    """Página de resultados; se itera como una lista."""
+
+    def __init__(self, object_list, cursor_siguiente, cursor_anterior, total=None):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def paginar_por_cursor(queryset, orden, por_pagina, despues=None, antes=None):
+    """
+    Devuelve una página de `queryset` ordenada por `orden`.
+
+    Args:
+        queryset: QuerySet ya filtrado.
+        orden: Lista de campos del ORDER BY; el último debe ser único (ej: '-id').
+        por_pagina: Filas por página.
+        despues: Cursor de la última fila de la página anterior (avanzar).
+        antes: Cursor de la primera fila de la página siguiente (retroceder).
+
+    Returns:
+        PaginaCursor.
+    """
+    campos = [campo.lstrip('-') for campo in orden]
+
+    modelo = queryset.model
+    valores_antes = _decodificar_cursor(antes, modelo, orden) if antes else None
+    valores_despues = _decodificar_cursor(despues, modelo, orden) if despues and not valores_antes else None
+
+    if valores_antes:
+        # Retroceder: recorrer en orden inverso desde el cursor y dar vuelta el resultado
+        filas = list(
+            queryset.filter(_filtro_siguientes(_invertir(orden), valores_antes))
+            .order_by(*_invertir(orden))[:por_pagina + 1]
+        )
+        hay_mas_atras = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        hay_mas_adelante = True
+    else:
+        if valores_despues:
+            queryset = queryset.filter(_filtro_siguientes(orden, valores_despues))
+        filas = list(queryset.order_by(*orden)[:por_pagina + 1])
+        hay_mas_adelante = len(filas) > por_pagina
+        filas = filas[:por_pagina]
+        hay_mas_atras = valores_despues is not None
+
+    def clave(fila):
+        return _codificar_cursor([getattr(fila, campo) for campo in campos])
+
+    return PaginaCursor(
+        filas,
+        cursor_siguiente=clave(filas[-1]) if filas and hay_mas_adelante else None,
+        cursor_anterior=clave(filas[0]) if filas and hay_mas_atras else None,
+    )
+
+
+def contar_con_cache(queryset, nombre, filtros, segundos=60):
+    """
+    COUNT(*) del listado guardado en la caché por `segundos`, por combinación
+    de filtros. Evita recontar todo el historial en cada cambio de página.
+    """
+    huella = hashlib.sha1(repr(sorted(filtros.items())).encode()).hexdigest()
+    clave = f'portal:total:{nombre}:{huella}'
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, segundos)
+    return total
@@ -0,0 +1,125 @@
+"""
+pagos_services.py — Verificación y rechazo de pagos en lote.
+
+A fin de mes la caja revisa cientos de comprobantes. En lugar de un POST por
+pago (dos saves, un insert de auditoría y la recarga del listado con sus
+KPIs cada vez), procesar_pagos() aplica la acción a una lista de pagos en
+una sola transacción (Pago.verificar y la revisión de un pago usan el mismo
+camino con una lista de uno):
+- bloquea los pagos y sus deudas (select_for_update, en orden de id para
+  que dos lotes concurrentes no se traben entre sí),
+- calcula los estados nuevos en memoria con la misma lógica de pago parcial
+  que Pago.verificar (varios pagos de una misma deuda se aplican en orden),
+- guarda con un bulk_update por tabla y una sola inserción de auditoría.
+
+bulk_update no dispara señales: los saldos de los alumnos, los contadores
+del panel y la caché del portal de padres se actualizan al final, una vez
+por lote.
+"""
+
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ACCIONES = ('verificar', 'rechazar')
+
+# Estados desde los que se puede aplicar cada acción
+ESTADOS_ORIGEN = {
+    'verificar': ('pendiente', 'rechazado'),
+    'rechazar': ('pendiente',),
+}
+
+
+def _aplicar(pago, deuda, accion, usuario, ahora):
+    """Cambia en memoria el estado del pago y de su deuda."""
+    if accion == 'verificar':
+        pago.estado = 'verificado'
+        pago.fecha_verificacion = ahora
+        pago.usuario_verificador = usuario
+        # --- LÓGICA DE PAGO PARCIAL (igual que Pago.verificar) ---
+        if pago.monto_pagado >= deuda.monto:
+            deuda.estado = 'pago_verificado'
+            deuda.monto = 0
+        else:
+            deuda.monto -= pago.monto_pagado
+            deuda.estado = 'parcial'
+        deuda.fecha_pago = ahora.date()
+    else:
+        pago.estado = 'rechazado'
+        deuda.estado = 'pendiente'
+
+
+def procesar_pagos(pago_ids, accion, usuario, request=None, auditar=True):
+    """
+    Verifica o rechaza varios pagos en una transacción.
+
+    Los pagos que no existen o ya no están en un estado válido para la acción
+    (por ejemplo, verificados por otro usuario mientras tanto) se omiten: el
+    estado se controla sobre la fila bloqueada, no sobre la copia en memoria.
+
+    Returns:
+        dict con claves: procesados (list de Pago), omitidos (int)
+    """
+    from .estadisticas_services import registrar_cambios
+    from .models import Alumno, Pago, RegistroAuditoria, RegistroDeuda
+    from .saldos_services import recalcular_saldos_alumnos
+    from .vista_familia_services import invalidar_familias_de
+
+    if accion not in ACCIONES:
+        raise ValueError(f"Acción inválida: {accion}")
+    pago_ids = {int(pago_id) for pago_id in pago_ids}
+    if not pago_ids:
+        return {'procesados': [], 'omitidos': 0}
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        pagos = list(
+            Pago.objects.select_for_update()
+            .filter(id__in=pago_ids, estado__in=ESTADOS_ORIGEN[accion]).order_by('id')
+        )
+        deudas = RegistroDeuda.objects.select_for_update().order_by('id').in_bulk(
+            sorted({pago.deuda_id for pago in pagos})
+        )
+
+        cambios_pagos = []
+        cambios_deudas = {}
+        for pago in pagos:
+            deuda = deudas[pago.deuda_id]
+            pago.deuda = deuda
+            antes_pago = (pago.estado, pago.monto_pagado)
+            # Para la deuda cuenta el estado previo al primer pago del lote
+            cambios_deudas.setdefault(deuda.id, (deuda.monto, deuda.estado))
+            _aplicar(pago, deuda, accion, usuario, ahora)
+            cambios_pagos.append((antes_pago, (pago.estado, pago.monto_pagado)))
+
+        Pago.objects.bulk_update(pagos, ['estado', 'fecha_verificacion', 'usuario_verificador'])
+        RegistroDeuda.objects.bulk_update(deudas.values(), ['monto', 'estado', 'fecha_pago'])
+
+        accion_auditoria = 'PAYMENT_VERIFIED' if accion == 'verificar' else 'PAYMENT_REJECTED'
+        verbo = 'verificado' if accion == 'verificar' else 'rechazado'
+        if auditar:
+            ip = RegistroAuditoria.ip_de(request)
+            RegistroAuditoria.objects.bulk_create([
+                RegistroAuditoria(
+                    usuario=usuario, accion=accion_auditoria, ip_address=ip,
+                    detalles=f'Pago {verbo}: {pago.numero_operacion} - ${pago.monto_pagado}',
+                )
+                for pago in pagos
+            ])
+
+        registrar_cambios(
+            deudas=[(antes, (deudas[deuda_id].monto, deudas[deuda_id].estado))
+                    for deuda_id, antes in cambios_deudas.items()],
+            pagos=cambios_pagos,
+        )
+        documentos = {deuda.alumno_id for deuda in deudas.values()}
+        recalcular_saldos_alumnos(documentos)
+
+    invalidar_familias_de(Alumno.objects.filter(documento__in=documentos))
+
+    omitidos = len(pago_ids) - len(pagos)
+    logger.info(f"[PAGOS] Lote {accion}: {len(pagos)} procesados, {omitidos} omitidos")
+    return {'procesados': pagos, 'omitidos': omitidos}
@@ -0,0 +1,170 @@
+"""
+responsables_services.py — Responsables de cada alumno y resolución de
+familias por DNI.
+
+Las columnas padre_*/madre_*/tutor_* de Alumno siguen siendo las que cargan
+la importación y el admin; cada guardado del alumno las vuelca a
+Responsable (una fila por DNI, con nombre, email y teléfono) y Vinculo
+(responsable -> alumno, con rol). El propio alumno es también su
+responsable (rol 'alumno'), para los alumnos mayores que ingresan con su DNI.
+
+Así "los alumnos de un DNI" es una sola búsqueda indexada sobre Vinculo en
+lugar de un OR sobre cuatro columnas, y los vínculos con rol 'otro' (cargados
+a mano) permiten más de tres responsables por alumno.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rol -> columnas de Alumno (dni, nombre, email, teléfono)
+CAMPOS_ROL = {
+    'alumno': ('documento', None, 'email', 'telefono1'),
+    'padre': ('padre_dni', 'padre_nombre', 'padre_email', 'padre_telefono1'),
+    'madre': ('madre_dni', 'madre_nombre', 'madre_email', 'madre_telefono1'),
+    'tutor': ('tutor_dni', 'tutor_nombre', 'tutor_email', 'tutor_telefono1'),
+}
+
+# Orden en que se toma el email de contacto de un alumno para los avisos de deuda
+PRIORIDAD_EMAIL = ('padre', 'madre', 'tutor', 'alumno')
+# El listado de usuarios muestra primero el del tutor (como siempre lo hizo)
+PRIORIDAD_EMAIL_USUARIOS = ('tutor', 'padre', 'madre', 'alumno')
+
+
+def responsables_alumno(alumno):
+    """
+    Responsables que surgen de las columnas del alumno.
+
+    Returns:
+        list de tuplas (rol, dni, nombre, email, telefono)
+    """
+    resultado = []
+    for rol, (campo_dni, campo_nombre, campo_email, campo_telefono) in CAMPOS_ROL.items():
+        dni = getattr(alumno, campo_dni)
+        if not dni:
+            continue
+        nombre = getattr(alumno, campo_nombre) if campo_nombre else f"{alumno.apellido}, {alumno.nombres}"
+        resultado.append((
+            rol, dni, (nombre or '')[:150],
+            (getattr(alumno, campo_email) or '').strip(),
+            (getattr(alumno, campo_telefono) or '')[:50],
+        ))
+    return resultado
+
+
+def email_contacto(alumno, prioridad=PRIORIDAD_EMAIL):
+    """
+    Primer email válido de las columnas del alumno, en el orden de roles de
+    `prioridad` (por defecto PRIORIDAD_EMAIL), ya normalizado. Uno mal cargado (ej: 'juan@' en padre_email) no tapa el
+    de la madre o el tutor.
+    """
+    from .email_services import normalizar_email
+
+    for rol in prioridad:
+        email = normalizar_email(getattr(alumno, CAMPOS_ROL[rol][2]))
+        if email:
+            return email
+    return ''
+
+
+def sincronizar_vinculos(alumnos, batch_size=1000):
+    """
+    Vuelca a Responsable/Vinculo las columnas de los alumnos dados (iterable
+    de Alumno). Los vínculos derivados se regeneran; los de rol 'otro' no se
+    tocan. Un dato vacío no pisa uno ya cargado por otro alumno.
+
+    Returns:
+        int con la cantidad de vínculos creados
+    """
+    from .models import Responsable, Vinculo
+
+    alumnos = list(alumnos)
+    if not alumnos:
+        return 0
+
+    datos = {}
+    vinculos = []
+    for alumno in alumnos:
+        for rol, dni, nombre, email, telefono in responsables_alumno(alumno):
+            anterior = datos.get(dni, ('', '', ''))
+            datos[dni] = (nombre or anterior[0], email or anterior[1], telefono or anterior[2])
+            vinculos.append(Vinculo(responsable_id=dni, alumno_id=alumno.documento, rol=rol))
+
+    existentes = Responsable.objects.in_bulk(list(datos))
+    nuevos, cambiados = [], []
+    for dni, (nombre, email, telefono) in datos.items():
+        responsable = existentes.get(dni)
+        if responsable is None:
+            nuevos.append(Responsable(dni=dni, nombre=nombre, email=email, telefono=telefono))
+            continue
+        valores = {'nombre': nombre, 'email': email, 'telefono': telefono}
+        valores = {campo: valor for campo, valor in valores.items() if valor and getattr(responsable, campo) != valor}
+        if valores:
+            for campo, valor in valores.items():
+                setattr(responsable, campo, valor)
+            cambiados.append(responsable)
+
+    Responsable.objects.bulk_create(nuevos, batch_size=batch_size)
+    Responsable.objects.bulk_update(cambiados, ['nombre', 'email', 'telefono'], batch_size=batch_size)
+    Vinculo.objects.filter(
+        alumno_id__in=[alumno.documento for alumno in alumnos], rol__in=list(CAMPOS_ROL),
+    ).delete()
+    Vinculo.objects.bulk_create(vinculos, batch_size=batch_size, ignore_conflicts=True)
+    return len(vinculos)
+
+
+def reconstruir_vinculos(batch_size=1000):
+    """
+    Regenera los vínculos derivados de todos los alumnos. Necesario después
+    de cargas con bulk_create, que no disparan señales.
+    """
+    from .models import Alumno
+
+    total = 0
+    lote = []
+    for alumno in Alumno.objects.order_by().iterator(chunk_size=batch_size):
+        lote.append(alumno)
+        if len(lote) >= batch_size:
+            total += sincronizar_vinculos(lote, batch_size)
+            lote = []
+    total += sincronizar_vinculos(lote, batch_size)
+    logger.info(f"[RESPONSABLES] Vínculos reconstruidos: {total}")
+    return total
+
+
+def propagar_email(dni, email):
+    """
+    Copia el email de un responsable a todos los alumnos donde figura su DNI
+    (como padre, madre o tutor, y al propio alumno si el DNI es el suyo) y a
+    su fila de Responsable. Son UPDATE puntuales en una sola transacción, sin
+    cargar ni re-guardar los alumnos.
+
+    Returns:
+        int con la cantidad de filas de Alumno actualizadas
+    """
+    from django.db import transaction
+    from .models import Alumno, Responsable
+
+    actualizados = 0
+    with transaction.atomic():
+        for campo_dni, _, campo_email, _ in CAMPOS_ROL.values():
+            actualizados += Alumno.objects.filter(**{campo_dni: dni}).exclude(
+                **{campo_email: email}
+            ).update(**{campo_email: email})
+        Responsable.objects.filter(dni=dni).update(email=email)
+    logger.info(f"[RESPONSABLES] Email de {dni} propagado a {actualizados} alumnos")
+    return actualizados
+
+
+def alumnos_de_responsable(dni):
+    """QuerySet de los alumnos vinculados a un DNI (semijoin indexado sobre Vinculo)."""
+    from .models import Alumno, Vinculo
+
+    return Alumno.objects.filter(documento__in=Vinculo.objects.filter(responsable_id=dni).values('alumno_id'))
+
+
+def dnis_vinculados(alumnos):
+    """DNIs de los responsables de los alumnos (queryset de Alumno)."""
+    from .models import Vinculo
+
+    return set(Vinculo.objects.filter(alumno__in=alumnos).values_list('responsable_id', flat=True))
@@ -0,0 +1,214 @@
+"""
+saldos_services.py — Saldos desnormalizados por alumno y por familia.
+
+Alumno.saldo_moroso y Alumno.deudas_pendientes resumen las deudas con saldo
+(pendientes o parciales, monto > 0); SaldoFamilia suma los de cada grupo
+familiar. Así los listados de morosos son un rango sobre un índice
+(saldo_moroso > 0) y los portales no re-agregan RegistroDeuda.
+
+Cada alta, cambio o baja de una deuda (incluida la verificación de un pago,
+que modifica su deuda) recalcula el saldo de ese alumno y de su familia en la
+misma transacción, con la fila del alumno bloqueada para que dos cambios
+concurrentes no se pisen. El alta o la baja de un alumno y su cambio de
+grupo familiar recalculan la familia anterior y la nueva.
+
+Las operaciones masivas (importación, reset) usan saldos_diferidos(): los
+cambios no se recalculan uno por uno sino todos juntos al final, con
+recalcular_saldos(), que es también lo que ejecuta `manage.py recompute_saldos`.
+Al salir del bloque también se descarta la caché del portal de padres, que
+dentro del bloque no se invalida cambio por cambio, y se renueva una sola vez
+el índice de búsqueda en memoria (indice_diferido()).
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .busqueda_services import indice_diferido
+from .vista_familia_services import invalidar_todas_las_familias
+
+logger = logging.getLogger(__name__)
+
+# Estados de deuda que suman al saldo adeudado
+ESTADOS_CON_SALDO = ['pendiente', 'parcial']
+
+FILTRO_CON_SALDO = Q(estado__in=ESTADOS_CON_SALDO, monto__gt=0)
+
+_estado = threading.local()
+
+
+def recalcular_saldo_familia(familia):
+    """Recalcula la fila SaldoFamilia de un grupo familiar (0 = sin grupo)."""
+    from .models import Alumno, SaldoFamilia
+
+    if not familia:
+        return
+    totales = Alumno.objects.filter(familia=familia).aggregate(
+        saldo=Sum('saldo_moroso'),
+        pendientes=Sum('deudas_pendientes'),
+        alumnos=Count('documento'),
+    )
+    if not totales['alumnos']:
+        SaldoFamilia.objects.filter(familia=familia).delete()
+        return
+    SaldoFamilia.objects.update_or_create(familia=familia, defaults={
+        'saldo': totales['saldo'] or 0,
+        'deudas_pendientes': totales['pendientes'] or 0,
+        'alumnos': totales['alumnos'],
+    })
+
+
+def recalcular_saldo_alumno(documento):
+    """
+    Recalcula saldo_moroso y deudas_pendientes de un alumno y el saldo de su
+    familia. Bloquea la fila del alumno para serializar cambios concurrentes.
+    """
+    from .models import Alumno, RegistroDeuda
+
+    with transaction.atomic():
+        alumno = Alumno.objects.select_for_update().filter(documento=documento).only('familia').first()
+        if alumno is None:
+            return
+        totales = RegistroDeuda.objects.filter(FILTRO_CON_SALDO, alumno_id=documento).aggregate(
+            saldo=Sum('monto'), cantidad=Count('id'),
+        )
+        Alumno.objects.filter(documento=documento).update(
+            saldo_moroso=totales['saldo'] or 0,
+            deudas_pendientes=totales['cantidad'],
+        )
+        recalcular_saldo_familia(alumno.familia)
+
+
+def recalcular_saldos_alumnos(documentos, batch_size=500):
+    """
+    Recalcula los saldos de varios alumnos y de sus familias en bloque (para
+    cambios hechos con bulk_update, que no disparan señales): una consulta
+    agrupada, un bulk_update y una pasada por familia.
+    """
+    from .models import Alumno, RegistroDeuda
+
+    documentos = set(documentos)
+    if not documentos:
+        return
+    with transaction.atomic():
+        alumnos = list(
+            Alumno.objects.select_for_update().filter(documento__in=documentos)
+            .only('documento', 'familia', 'saldo_moroso', 'deudas_pendientes').order_by('documento')
+        )
+        totales = {
+            fila['alumno_id']: fila
+            for fila in RegistroDeuda.objects.filter(FILTRO_CON_SALDO, alumno_id__in=documentos)
+            .values('alumno_id').annotate(saldo=Sum('monto'), cantidad=Count('id')).order_by()
+        }
+        cambiados = []
+        for alumno in alumnos:
+            fila = totales.get(alumno.documento)
+            saldo = fila['saldo'] if fila else Decimal('0')
+            cantidad = fila['cantidad'] if fila else 0
+            if alumno.saldo_moroso != saldo or alumno.deudas_pendientes != cantidad:
+                alumno.saldo_moroso = saldo
+                alumno.deudas_pendientes = cantidad
+                cambiados.append(alumno)
+        Alumno.objects.bulk_update(cambiados, ['saldo_moroso', 'deudas_pendientes'], batch_size=batch_size)
+        for familia in sorted({alumno.familia for alumno in cambiados if alumno.familia}):
+            recalcular_saldo_familia(familia)
+
+
+def en_lote():
+    """True dentro de un bloque saldos_diferidos()."""
+    return getattr(_estado, 'pendientes', None) is not None
+
+
+def registrar_cambio_saldo(documento):
+    """Punto de entrada de las señales de RegistroDeuda."""
+    pendientes = getattr(_estado, 'pendientes', None)
+    if pendientes is not None:
+        pendientes.add(documento)
+        return
+    recalcular_saldo_alumno(documento)
+
+
+def registrar_cambio_familia(documento, familias):
+    """
+    Punto de entrada de las señales de Alumno (alta, baja o cambio de grupo
+    familiar): recalcula las familias indicadas (la anterior y la nueva).
+    """
+    pendientes = getattr(_estado, 'pendientes', None)
+    if pendientes is not None:
+        pendientes.add(documento)
+        return
+    with transaction.atomic():
+        for familia in sorted({familia for familia in familias if familia}):
+            recalcular_saldo_familia(familia)
+
+
+@contextmanager
+def saldos_diferidos():
+    """
+    Suspende el recálculo por deuda dentro del bloque y, si hubo cambios,
+    recalcula todos los saldos en bloque al salir (importaciones, reset).
+    Al salir invalida además la caché de familias del portal.
+    """
+    if en_lote():
+        yield
+        return
+    _estado.pendientes = set()
+    try:
+        with indice_diferido():
+            yield
+    finally:
+        tocados = _estado.pendientes
+        _estado.pendientes = None
+        if tocados:
+            recalcular_saldos()
+        invalidar_todas_las_familias()
+
+
+def recalcular_saldos(batch_size=500):
+    """
+    Reconstruye en bloque los saldos de todos los alumnos y familias:
+    una consulta agrupada de deudas, un bulk_update de los alumnos que
+    cambiaron y la tabla SaldoFamilia regenerada.
+
+    Returns:
+        dict con claves: alumnos, actualizados, familias
+    """
+    from .models import Alumno, RegistroDeuda, SaldoFamilia
+
+    with transaction.atomic():
+        totales = {
+            fila['alumno_id']: fila
+            for fila in RegistroDeuda.objects.filter(FILTRO_CON_SALDO)
+            .values('alumno_id').annotate(saldo=Sum('monto'), cantidad=Count('id')).order_by()
+        }
+
+        alumnos = list(Alumno.objects.only('documento', 'saldo_moroso', 'deudas_pendientes').order_by())
+        cambiados = []
+        for alumno in alumnos:
+            fila = totales.get(alumno.documento)
+            saldo = fila['saldo'] if fila else Decimal('0')
+            cantidad = fila['cantidad'] if fila else 0
+            if alumno.saldo_moroso != saldo or alumno.deudas_pendientes != cantidad:
+                alumno.saldo_moroso = saldo
+                alumno.deudas_pendientes = cantidad
+                cambiados.append(alumno)
+        Alumno.objects.bulk_update(cambiados, ['saldo_moroso', 'deudas_pendientes'], batch_size=batch_size)
+
+        familias = [
+            SaldoFamilia(
+                familia=fila['familia'], saldo=fila['saldo'] or 0,
+                deudas_pendientes=fila['pendientes'] or 0, alumnos=fila['alumnos'],
+            )
+            for fila in Alumno.objects.exclude(familia=0).values('familia').annotate(
+                saldo=Sum('saldo_moroso'), pendientes=Sum('deudas_pendientes'), alumnos=Count('documento'),
+            ).order_by('familia')
+        ]
+        SaldoFamilia.objects.all().delete()
+        SaldoFamilia.objects.bulk_create(familias, batch_size=batch_size)
+
+    logger.info(f"[SALDOS] Recalculados: {len(cambiados)}/{len(alumnos)} alumnos, {len(familias)} familias")
+    return {'alumnos': len(alumnos), 'actualizados': len(cambiados), 'familias': len(familias)}
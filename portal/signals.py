@@ -0,0 +1,174 @@
+"""
+signals.py — Receptores de señales del portal.
+
+Webhooks de anymail (Resend): los rebotes, rechazos y quejas que informa el
+proveedor alimentan la lista de supresión de emails.
+
+Alumno: cada alta o edición de nombres/DNIs regenera sus términos de búsqueda
+y sus vínculos con responsables.
+
+RegistroDeuda: cada alta, cambio o baja recalcula el saldo del alumno y de su familia.
+Alumno: el alta, la baja o el cambio de grupo familiar recalculan la familia
+anterior y la nueva.
+
+Portal de padres: los cambios de deudas y pagos invalidan la vista cacheada
+de los DNIs que ven a ese alumno; los de alumnos y conceptos, la de todos.
+"""
+
+import logging
+
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .busqueda_services import CAMPOS_INDEXADOS, indexar_alumno
+from .email_services import suprimir_email
+from .models import Alumno, ConceptoDeuda, Pago, RegistroDeuda
+from .responsables_services import CAMPOS_ROL, sincronizar_vinculos
+from .saldos_services import en_lote, registrar_cambio_familia, registrar_cambio_saldo
+from .vista_familia_services import invalidar_familias_de, invalidar_todas_las_familias
+
+logger = logging.getLogger(__name__)
+
+try:
+    from anymail.signals import tracking, EventType
+except ImportError:
+    tracking = None
+    EventType = None
+
+
+# Tipo de evento de anymail -> motivo de EmailSuprimido
+if EventType is not None:
+    MOTIVOS_SUPRESION = {
+        EventType.BOUNCED: 'rebote',
+        EventType.REJECTED: 'rechazado',
+        EventType.COMPLAINED: 'queja',
+    }
+else:
+    MOTIVOS_SUPRESION = {}
+
+
+def registrar_evento_email(sender, event, esp_name, **kwargs):
+    """Suprime la dirección si el proveedor informa un fallo definitivo."""
+    motivo = MOTIVOS_SUPRESION.get(event.event_type)
+    if not motivo or not event.recipient:
+        return
+
+    detalle = f"{esp_name}: {event.description or event.reject_reason or event.event_type}"
+    suprimir_email(event.recipient, motivo, detalle)
+
+
+if tracking is not None:
+    tracking.connect(registrar_evento_email, dispatch_uid='portal_email_supresion')
+
+
+CAMPOS_BUSQUEDA = {campo for grupo in CAMPOS_INDEXADOS.values() for campo in grupo}
+
+
+def actualizar_indice_busqueda(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Reindexa el alumno salvo que el save no haya tocado campos indexados."""
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_BUSQUEDA.intersection(update_fields):
+        return
+    indexar_alumno(instance)
+
+
+post_save.connect(actualizar_indice_busqueda, sender=Alumno, dispatch_uid='portal_indice_busqueda')
+
+
+CAMPOS_VINCULOS = {'apellido', 'nombres'} | {campo for campos in CAMPOS_ROL.values() for campo in campos if campo}
+
+
+def actualizar_vinculos(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Regenera los vínculos del alumno salvo que el save no haya tocado sus responsables."""
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_VINCULOS.intersection(update_fields):
+        return
+    sincronizar_vinculos([instance])
+
+
+post_save.connect(actualizar_vinculos, sender=Alumno, dispatch_uid='portal_vinculos_alumno')
+
+
+CAMPOS_SALDO = {'alumno', 'alumno_id', 'monto', 'estado'}
+
+
+def actualizar_saldo_por_deuda(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Recalcula el saldo del alumno si cambió algo que lo afecta."""
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_SALDO.intersection(update_fields):
+        return
+    registrar_cambio_saldo(instance.alumno_id)
+
+
+post_save.connect(actualizar_saldo_por_deuda, sender=RegistroDeuda, dispatch_uid='portal_saldo_deuda_save')
+post_delete.connect(actualizar_saldo_por_deuda, sender=RegistroDeuda, dispatch_uid='portal_saldo_deuda_delete')
+
+
+def recordar_familia_anterior(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Guarda el grupo familiar previo del alumno (1 consulta) si el save puede cambiarlo."""
+    if raw or instance._state.adding or en_lote():
+        return
+    if update_fields is not None and 'familia' not in update_fields:
+        return
+    instance._familia_anterior = (
+        Alumno.objects.filter(pk=instance.pk).values_list('familia', flat=True).first()
+    )
+
+
+def actualizar_saldo_por_familia(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """Recalcula la familia anterior y la nueva si el alumno es nuevo o cambió de grupo."""
+    if raw:
+        return
+    if update_fields is not None and 'familia' not in update_fields:
+        return
+    anterior = instance.__dict__.pop('_familia_anterior', None)
+    if created or anterior != instance.familia:
+        registrar_cambio_familia(instance.documento, [anterior, instance.familia])
+
+
+def actualizar_saldo_por_baja_alumno(sender, instance, **kwargs):
+    registrar_cambio_familia(instance.documento, [instance.familia])
+
+
+pre_save.connect(recordar_familia_anterior, sender=Alumno, dispatch_uid='portal_saldo_alumno_pre_save')
+post_save.connect(actualizar_saldo_por_familia, sender=Alumno, dispatch_uid='portal_saldo_alumno_save')
+post_delete.connect(actualizar_saldo_por_baja_alumno, sender=Alumno, dispatch_uid='portal_saldo_alumno_delete')
+
+
+def invalidar_vista_por_deuda(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_familias_de(Alumno.objects.filter(documento=instance.alumno_id))
+
+
+def invalidar_vista_por_pago(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_familias_de(Alumno.objects.filter(deudas=instance.deuda_id))
+
+
+def invalidar_vista_por_alumno(sender, instance, raw=False, **kwargs):
+    """
+    El alumno puede haber cambiado de responsables y los DNIs anteriores ya
+    no se conocen: se descartan todas las vistas (cambio poco frecuente).
+    """
+    if raw or en_lote():
+        return
+    invalidar_todas_las_familias()
+
+
+def invalidar_vista_por_concepto(sender, instance, raw=False, **kwargs):
+    if raw or en_lote():
+        return
+    invalidar_todas_las_familias()
+
+
+post_save.connect(invalidar_vista_por_deuda, sender=RegistroDeuda, dispatch_uid='portal_familia_deuda_save')
+post_delete.connect(invalidar_vista_por_deuda, sender=RegistroDeuda, dispatch_uid='portal_familia_deuda_delete')
+post_save.connect(invalidar_vista_por_pago, sender=Pago, dispatch_uid='portal_familia_pago_save')
+post_delete.connect(invalidar_vista_por_pago, sender=Pago, dispatch_uid='portal_familia_pago_delete')
+post_save.connect(invalidar_vista_por_alumno, sender=Alumno, dispatch_uid='portal_familia_alumno_save')
+post_delete.connect(invalidar_vista_por_alumno, sender=Alumno, dispatch_uid='portal_familia_alumno_delete')
+post_save.connect(invalidar_vista_por_concepto, sender=ConceptoDeuda, dispatch_uid='portal_familia_concepto_save')
@@ -1,3 +1,1130 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .auditoria_services import limite_retencion, vaciar_auditoria
+from .busqueda_services import (
+    CLAVE_VERSION_INDICE, buscar_alumnos, buscar_similares, obtener_indice_ngramas,
+)
+from .comprobantes_services import url_cloudinary
+from .datos_prueba import sembrar_datos
+from .duplicados_services import buscar_duplicados, guardar_bandas
+from .email_backends import _error_rate_limit
+from .email_services import emails_por_alumno, enviar_emails_masivos, preparar_destinatarios
+from .estadisticas_services import (
+    CLAVE_FACETAS, calcular_estadisticas, obtener_estadisticas, obtener_facetas_deudas, recalcular_estadisticas,
+    registrar_cambio_deuda, registrar_cambios,
+)
+from .paginacion import paginar_por_cursor
+from .pagos_services import procesar_pagos
+from .saldos_services import recalcular_saldos, saldos_diferidos
+from .responsables_services import (
+    PRIORIDAD_EMAIL_USUARIOS, alumnos_de_responsable, email_contacto, propagar_email, reconstruir_vinculos,
+)
+from .vista_familia_services import obtener_vista_familia
+from .models import (
+    Alumno, CampaniaAviso, ConceptoDeuda, EjecucionCampania, EmailSuprimido, EnvioCampania, Pago, PerfilUsuario,
+    RegistroAuditoria, RegistroDeuda, Responsable, SaldoFamilia, Vinculo,
+)
+
+# La auditoría diferida se activa solo en AuditoriaDiferidaTests: en el resto
+# el hilo de vaciado no vería las transacciones de cada test.
+_auditoria_sincronica = override_settings(AUDITORIA_ASINCRONA=False)
+
+
+def setUpModule():
+    _auditoria_sincronica.enable()
+
+
+def tearDownModule():
+    _auditoria_sincronica.disable()
+
+
+class EstadisticasPanelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        for dni in (1, 2, 3):
+            alumno = Alumno.objects.create(documento=dni, apellido='Apellido', nombres='Nombre')
+            RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('100'),
+                                         periodo='2026-03')
+            RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=0, estado='pagado',
+                                         periodo='2026-02')
+            pagada = RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=0,
+                                                  estado='pago_verificado', periodo='2026-01')
+            Pago.objects.create(deuda=pagada, monto_pagado=Decimal('50'), estado='verificado')
+            Pago.objects.create(deuda=pagada, monto_pagado=Decimal('10'), estado='pendiente')
+
+    def test_calcular_estadisticas_una_consulta_por_tabla(self):
+        with self.assertNumQueries(3):
+            stats = calcular_estadisticas()
+
+        self.assertEqual(stats, {
+            'deudas_count': 3,
+            'total_deuda': Decimal('300'),
+            'pagos_pendientes': 3,
+            'pagos_verificados': 3,
+            'total_recaudado': Decimal('150'),
+            'alumnos_count': 3,
+        })
+
+    def test_obtener_estadisticas_materializadas_una_consulta(self):
+        recalcular_estadisticas()
+        with self.assertNumQueries(1):
+            stats = obtener_estadisticas()
+        self.assertEqual(stats['deudas_count'], 3)
+
+    @override_settings(ESTADISTICAS_EN_VIVO=True)
+    def test_obtener_estadisticas_en_vivo(self):
+        with self.assertNumQueries(3):
+            stats = obtener_estadisticas()
+        self.assertEqual(stats['total_recaudado'], Decimal('150'))
+
+    def test_facetas_siguen_al_listado_de_deudas(self):
+        # pago_verificado con saldo se lista; pagado no. deudas_count no cambia (0 -> 0)
+        antes, despues = (Decimal('50'), 'pago_verificado'), (Decimal('50'), 'pagado')
+        for registrar in (lambda: registrar_cambio_deuda(antes, despues),
+                          lambda: registrar_cambios(deudas=[(antes, despues)])):
+            obtener_facetas_deudas()
+            registrar()
+            self.assertIsNone(cache.get(CLAVE_FACETAS))
+
+        # Un cambio que no mueve la deuda del listado conserva la caché
+        obtener_facetas_deudas()
+        registrar_cambio_deuda((Decimal('0'), 'pago_verificado'), (Decimal('0'), 'pagado'))
+        self.assertIsNotNone(cache.get(CLAVE_FACETAS))
+
+
+class BusquedaAlumnosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Alumno.objects.create(documento=45123456, apellido='Núñez', nombres='Sofía',
+                              padre_nombre='Carlos Pérez', padre_dni=20111222)
+        Alumno.objects.create(documento=45123999, apellido='Nuñez Gil', nombres='Mateo',
+                              tutor_nombre='Ana Ruiz', tutor_dni=27333444)
+        Alumno.objects.create(documento=46000000, apellido='Gómez', nombres='Emma')
+
+    def documentos(self, texto):
+        return sorted(buscar_alumnos(texto).values_list('documento', flat=True))
+
+    def test_dni_completo_es_exacto(self):
+        self.assertEqual(self.documentos('45123456'), [45123456])
+        self.assertEqual(self.documentos('20111222'), [45123456])
+        self.assertEqual(self.documentos('4512345'), [])
+
+    def test_prefijo_de_dni_y_apellido_sin_acentos(self):
+        self.assertEqual(self.documentos('451'), [45123456, 45123999])
+        self.assertEqual(self.documentos('nun'), [45123456, 45123999])
+        self.assertEqual(self.documentos('NUÑEZ gil'), [45123999])
+
+    def test_busca_en_responsables(self):
+        self.assertEqual(self.documentos('perez'), [45123456])
+        self.assertEqual(self.documentos('ruiz an'), [45123999])
+        self.assertEqual(self.documentos('2733'), [45123999])
+
+    def test_editar_alumno_reindexa(self):
+        alumno = Alumno.objects.get(documento=46000000)
+        alumno.madre_nombre = 'Laura Díaz'
+        alumno.save()
+        self.assertEqual(self.documentos('diaz'), [46000000])
+
+    def test_texto_sin_palabras(self):
+        self.assertIsNone(buscar_alumnos(' ,; '))
+
+    def test_similares_tolera_errores_de_tipeo(self):
+        resultado = buscar_similares('nunes')
+        self.assertEqual({a.documento for a in resultado}, {45123456, 45123999})
+        self.assertEqual([a.documento for a in buscar_similares('carlos peres')], [45123456])
+
+    def test_similares_ve_cambios(self):
+        self.assertEqual(buscar_similares('fernandez'), [])
+        alumno = Alumno.objects.get(documento=46000000)
+        alumno.apellido = 'Fernández'
+        with self.captureOnCommitCallbacks(execute=True):
+            alumno.save()
+        self.assertEqual([a.documento for a in buscar_similares('fernandez')], [46000000])
+
+    def test_importacion_invalida_el_indice_una_vez(self):
+        obtener_indice_ngramas()
+        version = cache.get(CLAVE_VERSION_INDICE)
+        with mock.patch('portal.busqueda_services._publicar_version') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                with saldos_diferidos():
+                    for documento in range(47000000, 47000005):
+                        Alumno.objects.create(documento=documento, apellido='Torres', nombres='Luz')
+        publicar.assert_called_once_with()
+        self.assertEqual(cache.get(CLAVE_VERSION_INDICE), version)
+
+    def test_version_faltante_no_reusa_un_indice_viejo(self):
+        indice = obtener_indice_ngramas()
+        cache.delete(CLAVE_VERSION_INDICE)
+        Alumno.objects.filter(documento=46000000).update(texto_busqueda='emma fernandez')
+        self.assertIsNot(obtener_indice_ngramas(), indice)
+        self.assertEqual([a.documento for a in buscar_similares('fernandez')], [46000000])
+
+
+class AdminUsuariosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x')
+        PerfilUsuario.objects.create(usuario=cls.admin, rol='admin', must_change_password=False)
+
+    def crear_curso(self, division, cantidad):
+        for i in range(cantidad):
+            dni = 40000000 + ord(division) * 1000 + i
+            Alumno.objects.create(documento=dni, apellido=f'Ap{i}', nombres='N', nivel='P', curso='3', division=division)
+            usuario = User.objects.create_user(str(dni), email=f'{dni}@example.com')
+            PerfilUsuario.objects.create(usuario=usuario, dni=dni)
+
+    def consultas(self, **params):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('portal:admin_usuarios'), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(ctx), respuesta
+
+    def test_consultas_constantes_por_curso(self):
+        self.crear_curso('A', 2)
+        self.crear_curso('B', 25)
+        chico, respuesta = self.consultas(grupo='P-3°A')
+        grande, respuesta = self.consultas(grupo='P-3°B')
+        self.assertEqual(chico, grande)
+        self.assertEqual(len(respuesta.context['cursos']), 2)
+        expandido = [c for c in respuesta.context['cursos'] if c['expandido']]
+        self.assertEqual([c['nombre'] for c in expandido], ['P-3°B'])
+        self.assertTrue(all(f['tiene_usuario'] for f in expandido[0]['alumnos']))
+
+    def test_sin_grupo_solo_resumen(self):
+        self.crear_curso('A', 3)
+        _, respuesta = self.consultas()
+        self.assertEqual([(c['nombre'], c['total'], c['alumnos']) for c in respuesta.context['cursos']],
+                         [('P-3°A', 3, [])])
+
+    def test_busqueda_expande_coincidencias(self):
+        self.crear_curso('A', 3)
+        _, respuesta = self.consultas(q='ap1')
+        self.assertEqual([f['nombre_completo'] for c in respuesta.context['cursos'] for f in c['alumnos']], ['N Ap1'])
+
+
+class SaldosDesnormalizadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        cls.hermano1 = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', familia=7)
+        cls.hermano2 = Alumno.objects.create(documento=2, apellido='A', nombres='Dos', familia=7)
+
+    def saldo(self, alumno):
+        alumno.refresh_from_db()
+        return alumno.saldo_moroso, alumno.deudas_pendientes
+
+    def test_alta_y_cambio_de_deuda(self):
+        deuda = RegistroDeuda.objects.create(alumno=self.hermano1, concepto=self.concepto, monto=Decimal('100'))
+        RegistroDeuda.objects.create(alumno=self.hermano2, concepto=self.concepto, monto=Decimal('40'),
+                                     estado='parcial')
+        self.assertEqual(self.saldo(self.hermano1), (Decimal('100'), 1))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).saldo, Decimal('140'))
+
+        deuda.estado = 'comprobante_enviado'
+        deuda.save()
+        self.assertEqual(self.saldo(self.hermano1), (Decimal('0'), 0))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).deudas_pendientes, 1)
+
+    def test_verificar_pago_parcial_y_borrado(self):
+        admin = User.objects.create_user('admin')
+        deuda = RegistroDeuda.objects.create(alumno=self.hermano1, concepto=self.concepto, monto=Decimal('100'))
+        pago = Pago.objects.create(deuda=deuda, monto_pagado=Decimal('30'))
+        pago.verificar(admin)
+        self.assertEqual(self.saldo(self.hermano1), (Decimal('70'), 1))
+
+        deuda.delete()
+        self.assertEqual(self.saldo(self.hermano1), (Decimal('0'), 0))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).saldo, Decimal('0'))
+
+    def test_diferido_recalcula_al_salir(self):
+        with saldos_diferidos():
+            RegistroDeuda.objects.create(alumno=self.hermano2, concepto=self.concepto, monto=Decimal('50'))
+            self.assertEqual(self.saldo(self.hermano2), (Decimal('0'), 0))
+        self.assertEqual(self.saldo(self.hermano2), (Decimal('50'), 1))
+
+    def test_recalcular_saldos_corrige_desvios(self):
+        RegistroDeuda.objects.create(alumno=self.hermano1, concepto=self.concepto, monto=Decimal('100'))
+        Alumno.objects.filter(documento=1).update(saldo_moroso=999, deudas_pendientes=9)
+        SaldoFamilia.objects.all().delete()
+
+        resultado = recalcular_saldos()
+
+        self.assertEqual(resultado, {'alumnos': 2, 'actualizados': 1, 'familias': 1})
+        self.assertEqual(self.saldo(self.hermano1), (Decimal('100'), 1))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).saldo, Decimal('100'))
+
+    def test_cambio_de_familia_y_baja_de_alumno(self):
+        RegistroDeuda.objects.create(alumno=self.hermano1, concepto=self.concepto, monto=Decimal('100'))
+        RegistroDeuda.objects.create(alumno=self.hermano2, concepto=self.concepto, monto=Decimal('40'))
+
+        alumno = Alumno.objects.get(documento=2)
+        alumno.familia = 8
+        alumno.save()
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).saldo, Decimal('100'))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).alumnos, 1)
+        self.assertEqual(SaldoFamilia.objects.get(familia=8).saldo, Decimal('40'))
+
+        alumno.delete()
+        self.assertFalse(SaldoFamilia.objects.filter(familia=8).exists())
+        Alumno.objects.get(documento=1).delete()
+        self.assertFalse(SaldoFamilia.objects.exists())
+
+
+class ResponsablesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hijo = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', padre_dni=500,
+                                         padre_nombre='Padre A', madre_dni=600, madre_email='m@a.com')
+        cls.hija = Alumno.objects.create(documento=2, apellido='A', nombres='Dos', padre_dni=500,
+                                         padre_email='p@a.com', tutor_dni=700)
+
+    def documentos(self, dni):
+        return sorted(alumnos_de_responsable(dni).values_list('documento', flat=True))
+
+    def test_vinculos_desde_columnas(self):
+        self.assertEqual(self.documentos(500), [1, 2])
+        self.assertEqual(self.documentos(700), [2])
+        self.assertEqual(self.documentos(1), [1])
+        self.assertEqual(self.documentos(999), [])
+        responsable = Responsable.objects.get(dni=500)
+        self.assertEqual((responsable.nombre, responsable.email), ('Padre A', 'p@a.com'))
+
+    def test_cambio_de_responsable(self):
+        self.hija.tutor_dni = 800
+        self.hija.save()
+        self.assertEqual(self.documentos(700), [])
+        self.assertEqual(self.documentos(800), [2])
+
+    def test_mas_de_tres_responsables(self):
+        abuela = Responsable.objects.create(dni=900, nombre='Abuela')
+        Vinculo.objects.create(responsable=abuela, alumno=self.hijo, rol='otro')
+        self.hijo.padre_dni = 501
+        self.hijo.save()
+        self.assertEqual(self.documentos(900), [1])
+        self.assertEqual(self.hijo.vinculos.count(), 4)
+
+    def test_reconstruir_y_email_de_contacto(self):
+        Vinculo.objects.all().delete()
+        self.assertEqual(reconstruir_vinculos(), 6)
+        self.assertEqual(self.documentos(600), [1])
+        self.assertEqual(email_contacto(self.hijo), 'm@a.com')
+
+    def test_orden_del_email_de_contacto(self):
+        # Avisos: padre > madre > tutor > alumno; listado de usuarios: tutor primero
+        alumno = Alumno(documento=3, padre_email='juan@', madre_email='M@a.com', tutor_email='t@a.com')
+        self.assertEqual(email_contacto(alumno), 'm@a.com')
+        self.assertEqual(email_contacto(alumno, PRIORIDAD_EMAIL_USUARIOS), 't@a.com')
+        alumno.tutor_email = ''
+        self.assertEqual(email_contacto(alumno, PRIORIDAD_EMAIL_USUARIOS), 'm@a.com')
+
+    def test_primer_login_propaga_email(self):
+        usuario = User.objects.create_user('padre500', password='x')
+        PerfilUsuario.objects.create(usuario=usuario, dni=500, must_change_password=True)
+        Alumno.objects.filter(documento=2).update(tutor_dni=500)
+        self.client.force_login(usuario)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('portal:primer_login'), {
+                'email': 'nuevo@a.com', 'password': 'Clave1234', 'confirm_password': 'Clave1234',
+            })
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "portal_alumno"')]), 4)
+        self.assertEqual(propagar_email(500, 'nuevo@a.com'), 0)
+
+        hija = Alumno.objects.get(documento=2)
+        self.assertEqual((hija.padre_email, hija.tutor_email), ('nuevo@a.com', 'nuevo@a.com'))
+        self.assertEqual(Alumno.objects.get(documento=1).padre_email, 'nuevo@a.com')
+        self.assertEqual(Responsable.objects.get(dni=500).email, 'nuevo@a.com')
+
+
+class VistaFamiliaCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        cls.hijo = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', padre_dni=500)
+        cls.otro = Alumno.objects.create(documento=2, apellido='B', nombres='Dos', padre_dni=600)
+        cls.deuda = RegistroDeuda.objects.create(alumno=cls.hijo, concepto=cls.concepto, monto=Decimal('100'))
+        RegistroDeuda.objects.create(alumno=cls.otro, concepto=cls.concepto, monto=Decimal('70'))
+
+    def consultas(self, dni):
+        with CaptureQueriesContext(connection) as ctx:
+            vista = obtener_vista_familia(dni)
+        return vista, len([q for q in ctx.captured_queries if 'portal_alumno' in q['sql']])
+
+    def test_repetir_no_consulta(self):
+        self.assertEqual(self.consultas(500)[1], 1)
+        vista, consultas = self.consultas(500)
+        self.assertEqual(consultas, 0)
+        self.assertEqual(vista['total_adeudado'], Decimal('100'))
+
+    def test_pago_invalida_solo_su_familia(self):
+        self.consultas(500)
+        self.consultas(600)
+        Pago.objects.create(deuda=self.deuda, monto_pagado=Decimal('30'))
+
+        vista, consultas = self.consultas(500)
+        self.assertEqual(consultas, 1)
+        self.assertEqual(len(vista['alumnos'][0]['deudas'][0].pagos.all()), 1)
+        self.assertEqual(self.consultas(600)[1], 0)
+
+    def test_cambio_de_deuda_invalida(self):
+        self.consultas(1)
+        self.deuda.monto = Decimal('80')
+        self.deuda.save()
+        self.assertEqual(self.consultas(1)[0]['total_adeudado'], Decimal('80'))
+
+    def test_version_descartada_no_vuelve_a_una_vista_vieja(self):
+        self.consultas(500)
+        Pago.objects.create(deuda=self.deuda, monto_pagado=Decimal('30'))
+        self.assertEqual(len(self.consultas(500)[0]['alumnos'][0]['deudas'][0].pagos.all()), 1)
+
+        # La caché llena descarta las versiones (sin vencimiento) por orden de clave
+        cache.delete_many(['portal:familia_version', 'portal:familia_version:500'])
+        Pago.objects.filter(deuda=self.deuda).update(monto_pagado=Decimal('40'))
+        vista, consultas = self.consultas(500)
+        self.assertEqual(consultas, 1)
+        self.assertEqual(vista['alumnos'][0]['deudas'][0].pagos.all()[0].monto_pagado, Decimal('40'))
+
+    def test_operacion_masiva_invalida_todas(self):
+        self.consultas(600)
+        with saldos_diferidos():
+            RegistroDeuda.objects.filter(alumno=self.otro).delete()
+        vista, consultas = self.consultas(600)
+        self.assertEqual(consultas, 1)
+        self.assertEqual(vista['total_adeudado'], Decimal('0'))
+
+
+class AvisosEmailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        # Email del padre mal cargado: vale el de la madre (compartido con la hermana)
+        cls.hijo = Alumno.objects.create(documento=1, apellido='A', nombres='Uno',
+                                         padre_email='juan@', madre_email=' Ana@Mail.com ')
+        cls.hija = Alumno.objects.create(documento=2, apellido='A', nombres='Dos', madre_email='ana@mail.com')
+        cls.sin_email = Alumno.objects.create(documento=3, apellido='B', nombres='Tres', tutor_email='sin-arroba')
+        for alumno in (cls.hijo, cls.hija, cls.sin_email):
+            RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('100'))
+
+    def test_emails_por_alumno_toma_el_primer_valido(self):
+        usuario = User.objects.create_user('padre2', email='no es un email')
+        PerfilUsuario.objects.create(usuario=usuario, dni=2, must_change_password=False)
+        self.assertEqual(emails_por_alumno([self.hijo, self.hija, self.sin_email]),
+                         {1: 'ana@mail.com', 2: 'ana@mail.com', 3: ''})
+
+    def test_preparar_destinatarios(self):
+        EmailSuprimido.objects.create(email='rebota@mail.com', motivo='rebote')
+        preparados = preparar_destinatarios(['A@Mail.com', ' a@mail.com ', 'nope', '', 'Rebota@mail.com', 'b@mail.com'])
+        self.assertEqual(preparados, {
+            'validos': ['a@mail.com', 'b@mail.com'],
+            'invalidos': ['nope'],
+            'suprimidos': ['rebota@mail.com'],
+        })
+
+    def test_webhook_de_rebote_suprime_la_direccion(self):
+        from anymail.signals import AnymailTrackingEvent, tracking
+
+        for tipo, email in (('bounced', 'Ana@Mail.com'), ('delivered', 'b@mail.com')):
+            evento = AnymailTrackingEvent(event_type=tipo, recipient=email, description='550 mailbox full')
+            tracking.send(sender=object, event=evento, esp_name='Resend')
+        suprimido = EmailSuprimido.objects.get()
+        self.assertEqual((suprimido.email, suprimido.motivo), ('ana@mail.com', 'rebote'))
+        self.assertIn('550 mailbox full', suprimido.detalle)
+
+    def test_aviso_masivo(self):
+        EmailSuprimido.objects.create(email='otra@mail.com', motivo='queja')
+        Alumno.objects.filter(documento=3).update(tutor_email='otra@mail.com')
+        admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=admin, rol='admin', must_change_password=False)
+        self.client.force_login(admin)
+        with mock.patch('portal.email_services.enviar_emails_masivos_async') as enviar:
+            respuesta = self.client.post(reverse('portal:admin_enviar_avisos_masivos'),
+                                         {'asunto': 'Aviso', 'mensaje': 'Hay cuotas pendientes'}).json()
+        self.assertEqual(enviar.call_args.kwargs['destinatarios'], ['ana@mail.com'])
+        self.assertEqual(respuesta['descartados'], ['otra@mail.com'])
+
+
+@override_settings(EMAIL_BACKEND='portal.email_backends.BenchmarkEmailBackend',
+                   EMAIL_BENCHMARK={'LATENCIA_MS': 0, 'JITTER_MS': 0, 'TASA_429': 1})
+class EnvioMasivoTests(TestCase):
+    def enviar(self, destinatarios, **opciones):
+        with mock.patch('portal.email_services.time') as tiempo, self.assertLogs('portal.email_services'):
+            resultado = enviar_emails_masivos(destinatarios, 'Aviso', 'Texto', **opciones)
+        return resultado, [llamada.args[0] for llamada in tiempo.sleep.call_args_list]
+
+    def test_reintenta_429_con_espera_exponencial(self):
+        with mock.patch('portal.email_services.send_mail',
+                        side_effect=[_error_rate_limit(), _error_rate_limit(), 1]) as send_mail:
+            resultado, esperas = self.enviar(['a@mail.com'], espera_reintento=2)
+        self.assertEqual(send_mail.call_count, 3)
+        self.assertEqual((resultado['enviados'], resultado['reintentos'], resultado['fallidos']), (1, 2, []))
+        self.assertEqual(esperas, [2, 4])
+
+    def test_429_persistente_falla_sin_suprimir(self):
+        resultado, esperas = self.enviar(['a@mail.com', 'b@mail.com'], batch_size=1, delay=5,
+                                         reintentos=3, espera_reintento=1)
+        self.assertEqual(resultado['enviados'], 0)
+        self.assertEqual([f['email'] for f in resultado['fallidos']], ['a@mail.com', 'b@mail.com'])
+        self.assertEqual(resultado['reintentos'], 6)
+        # 1, 2 y 4 s por destinatario, más la pausa entre tandas
+        self.assertEqual(esperas, [1, 2, 4, 5, 1, 2, 4])
+        self.assertFalse(EmailSuprimido.objects.exists())
+
+
+class CampaniasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        vencida = timezone.localdate() - timedelta(days=5)
+        for dni, email in ((1, 'a@mail.com'), (2, 'b@mail.com'), (3, 'c@mail.com')):
+            alumno = Alumno.objects.create(documento=dni, apellido='A', nombres=str(dni), padre_email=email)
+            RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('100'),
+                                         fecha_vencimiento=vencida)
+        cls.campania = CampaniaAviso.objects.create(nombre='Mensual', asunto='Aviso', mensaje='Hay deuda',
+                                                    dia_del_mes=1)
+
+    def ejecutar(self):
+        call_command('enviar_campanias', '--forzar', '--batch-size', '1', '--delay', '0', stdout=io.StringIO())
+        return EjecucionCampania.objects.get(campania=self.campania)
+
+    def enviados(self):
+        return sorted(email for mensaje in mail.outbox for email in mensaje.to)
+
+    def test_una_vez_por_periodo(self):
+        ejecucion = self.ejecutar()
+        self.assertEqual((ejecucion.estado, ejecucion.enviados), ('finalizada', 3))
+        self.ejecutar()
+        self.assertEqual(self.enviados(), ['a@mail.com', 'b@mail.com', 'c@mail.com'])
+
+    def test_dia_del_mes_entre_1_y_28(self):
+        self.campania.dia_del_mes = 31
+        with self.assertRaises(ValidationError):
+            self.campania.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CampaniaAviso.objects.filter(pk=self.campania.pk).update(dia_del_mes=0)
+
+    def test_abortada_se_retoma_sin_reenviar(self):
+        from anymail.exceptions import AnymailAPIError
+
+        # La API key deja de valer después del primer envío
+        with mock.patch('portal.email_services.send_mail',
+                        side_effect=[1, AnymailAPIError('Resend API response 401: unauthorized')]), \
+                self.assertLogs('portal.email_services'):
+            ejecucion = self.ejecutar()
+        self.assertEqual((ejecucion.estado, ejecucion.enviados), ('abortada', 1))
+        ya_enviado = ejecucion.envios.get().email
+
+        ejecucion = self.ejecutar()
+        self.assertEqual((ejecucion.estado, ejecucion.enviados), ('finalizada', 3))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertNotIn(ya_enviado, self.enviados())
+
+    def test_en_curso_sin_progreso_se_retoma(self):
+        periodo = timezone.localtime().strftime('%Y-%m')
+        ejecucion = EjecucionCampania.objects.create(campania=self.campania, periodo=periodo)
+        EnvioCampania.objects.create(ejecucion=ejecucion, email='b@mail.com')
+
+        # Otro proceso la está enviando: no se toca
+        self.assertEqual(self.ejecutar().estado, 'en_curso')
+        self.assertEqual(mail.outbox, [])
+
+        # El proceso murió hace más de CAMPANIAS_MINUTOS_SIN_PROGRESO
+        EjecucionCampania.objects.update(fecha_progreso=timezone.now() - timedelta(hours=2))
+        ejecucion = self.ejecutar()
+        self.assertEqual((ejecucion.estado, ejecucion.enviados), ('finalizada', 3))
+        self.assertEqual(self.enviados(), ['a@mail.com', 'c@mail.com'])
+
+
+class ConsultaPublicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        cls.hijo = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', padre_dni=500)
+        cls.hija = Alumno.objects.create(documento=2, apellido='A', nombres='Dos', madre_dni=500, tutor_dni=700)
+        cls.deuda = RegistroDeuda.objects.create(alumno=cls.hijo, concepto=concepto, monto=Decimal('100'))
+
+    def consultar(self, dni, **extra):
+        return self.client.get(reverse('portal:consulta_publica'), {'dni': dni}, **extra)
+
+    def test_resultado_cacheado_e_invalidado(self):
+        self.assertEqual(self.consultar('500').context['total_adeudado'], Decimal('100'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.consultar('500')
+        self.assertFalse([q for q in ctx.captured_queries if 'portal_alumno' in q['sql']])
+
+        self.deuda.monto = Decimal('60')
+        self.deuda.save()
+        self.assertEqual(self.consultar('500').context['total_adeudado'], Decimal('60'))
+
+    def test_dni_inexistente_cacheado(self):
+        self.assertTrue(self.consultar('999').context['mensaje_error'])
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.consultar('999')
+        self.assertTrue(respuesta.context['mensaje_error'])
+        self.assertFalse([q for q in ctx.captured_queries if 'portal_alumno' in q['sql']])
+
+    @override_settings(CONSULTA_PUBLICA_RAFAGA=3, CONSULTA_PUBLICA_POR_MINUTO=1, PROXIES_CONFIABLES=1)
+    def test_limite_por_ip(self):
+        # El proxy agrega al final de X-Forwarded-For la IP que vio
+        for _ in range(3):
+            self.assertEqual(self.consultar('500', HTTP_X_FORWARDED_FOR='200.1.1.1').status_code, 200)
+        self.assertEqual(self.consultar('500', HTTP_X_FORWARDED_FOR='200.1.1.1').status_code, 429)
+        # El cliente no puede esquivar el límite inventando entradas previas
+        self.assertEqual(self.consultar('500', HTTP_X_FORWARDED_FOR='9.9.9.9, 200.1.1.1').status_code, 429)
+        self.assertEqual(self.consultar('500', HTTP_X_FORWARDED_FOR='200.1.1.2').status_code, 200)
+
+
+class PaginacionCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        alumno = Alumno.objects.create(documento=1, apellido='A', nombres='Uno')
+        deuda = RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('100'))
+        for _ in range(5):
+            Pago.objects.create(deuda=deuda, monto_pagado=Decimal('10'))
+
+    def pagina(self, **cursores):
+        return paginar_por_cursor(Pago.objects.all(), ['-fecha_envio', '-id'], 2, **cursores)
+
+    def test_avanza_y_retrocede(self):
+        ids = list(Pago.objects.order_by('-fecha_envio', '-id').values_list('id', flat=True))
+        primera = self.pagina()
+        segunda = self.pagina(despues=primera.cursor_siguiente)
+        self.assertEqual([p.id for p in segunda], ids[2:4])
+        self.assertEqual([p.id for p in self.pagina(antes=segunda.cursor_anterior)], ids[:2])
+
+    def test_cursor_adulterado_es_la_primera_pagina(self):
+        primera = [p.id for p in self.pagina()]
+        for valores in (['x', 'y'], [None, None], [{'a': 1}, 2], ['2020-01-01', 'x'], ['2020-01-01', 1],
+                        [True, 1], [1], 'x'):
+            cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+            with self.subTest(valores=valores):
+                self.assertEqual([p.id for p in self.pagina(despues=cursor)], primera)
+                self.assertEqual([p.id for p in self.pagina(antes=cursor)], primera)
+        self.assertEqual([p.id for p in self.pagina(despues='%%%')], primera)
+
+    def test_listado_con_cursor_adulterado(self):
+        admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=admin, rol='admin', must_change_password=False)
+        self.client.force_login(admin)
+        cursor = base64.urlsafe_b64encode(b'[{"a": 1}, 2]').decode()
+        self.assertEqual(self.client.get(reverse('portal:admin_pagos'), {'despues': cursor}).status_code, 200)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}, COMPROBANTE_DIMENSION_MAXIMA=800)
+class ComprobantesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        alumno = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', padre_dni=500)
+        cls.deuda = RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('100'))
+        cls.padre = User.objects.create_user('padre500')
+        PerfilUsuario.objects.create(usuario=cls.padre, dni=500, must_change_password=False)
+
+    def enviar(self, nombre, contenido, content_type):
+        self.client.force_login(self.padre)
+        archivo = SimpleUploadedFile(nombre, contenido, content_type=content_type)
+        return self.client.post(reverse('portal:enviar_comprobante', args=[self.deuda.id]),
+                                {'monto': '100', 'comprobante': archivo}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_foto_achicada_sin_exif(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientación: rotada 90°
+        exif[0x010F] = 'Telefono'
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 2000), 'white').save(buffer, 'JPEG', exif=exif, quality=95)
+
+        self.assertTrue(self.enviar('foto.jpg', buffer.getvalue(), 'image/jpeg').json()['success'])
+
+        pago = Pago.objects.get()
+        self.assertTrue(pago.comprobante.name.endswith('.webp'))
+        with pago.comprobante.open() as archivo:
+            imagen = Image.open(archivo)
+            self.assertEqual(imagen.size, (533, 800))
+            self.assertEqual(dict(imagen.getexif()), {})
+        # Storage sin transformaciones por URL: derivado local, que usa el listado del admin
+        with pago.miniatura.open() as archivo:
+            self.assertEqual(Image.open(archivo).size, (213, 320))
+        self.assertEqual(pago.url_miniatura, pago.miniatura.url)
+
+    def test_pdf_con_miniatura(self):
+        from PIL import Image
+
+        from .comprobantes_services import pypdfium2
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 800), 'white').save(buffer, 'PDF')
+
+        self.assertTrue(self.enviar('recibo.pdf', buffer.getvalue(), 'application/pdf').json()['success'])
+
+        pago = Pago.objects.get()
+        self.assertTrue(pago.comprobante.name.endswith('.pdf'))
+        if pypdfium2 is not None:
+            with pago.miniatura.open() as archivo:
+                self.assertEqual(max(Image.open(archivo).size), 320)
+
+    def test_urls_de_cloudinary(self):
+        url = 'https://res.cloudinary.com/demo/image/upload/v1/media/comprobantes/foto.webp'
+        self.assertEqual(url_cloudinary(url, 320),
+                         'https://res.cloudinary.com/demo/image/upload/c_limit,w_320,h_320,q_auto,f_auto/v1/media/comprobantes/foto.webp')
+        self.assertEqual(url_cloudinary(url.replace('foto.webp', 'recibo.pdf'), 320, pdf=True),
+                         'https://res.cloudinary.com/demo/image/upload/pg_1,c_limit,w_320,h_320,q_auto/v1/media/comprobantes/recibo.jpg')
+
+    def test_listado_con_miniaturas_diferidas(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 1000), 'white').save(buffer, 'PNG')
+        self.enviar('foto.png', buffer.getvalue(), 'image/png')
+        admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=admin, rol='admin', must_change_password=False)
+        self.client.force_login(admin)
+
+        contenido = self.client.get(reverse('portal:admin_pagos')).content.decode()
+        self.assertIn(f'src="{Pago.objects.get().miniatura.url}" loading="lazy"', contenido)
+
+    def test_generar_miniaturas_faltantes(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'white').save(buffer, 'JPEG')
+        pago = Pago.objects.create(deuda=self.deuda, monto_pagado=Decimal('100'),
+                                   comprobante=SimpleUploadedFile('viejo.jpg', buffer.getvalue()))
+
+        call_command('generar_miniaturas', stdout=io.StringIO())
+
+        pago.refresh_from_db()
+        with pago.miniatura.open() as archivo:
+            self.assertEqual(Image.open(archivo).size, (320, 160))
+
+    def imagen(self, formato='PNG', tamanio=(1200, 900), invertida=False, **opciones):
+        from PIL import Image, ImageDraw
+
+        imagen = Image.linear_gradient('L').resize((1200, 900)).convert('RGB')
+        dibujo = ImageDraw.Draw(imagen)
+        dibujo.rectangle((100, 100, 500, 400), fill='navy')
+        dibujo.ellipse((700, 300, 1100, 800), fill='orange')
+        if invertida:
+            imagen = imagen.transpose(Image.Transpose.ROTATE_180)
+        buffer = io.BytesIO()
+        imagen.resize(tamanio).save(buffer, formato, **opciones)
+        return buffer.getvalue()
+
+    def test_comprobantes_repetidos(self):
+        self.enviar('captura.png', self.imagen(), 'image/png')
+        self.enviar('captura.png', self.imagen(), 'image/png')
+        self.enviar('otra.jpg', self.imagen('JPEG', (1000, 750), quality=60), 'image/jpeg')
+        self.enviar('distinta.png', self.imagen(invertida=True), 'image/png')
+        original, copia, parecida, distinta = Pago.objects.order_by('id')
+
+        self.assertEqual(original.comprobante_sha256, copia.comprobante_sha256)
+        self.assertNotEqual(original.comprobante_sha256, parecida.comprobante_sha256)
+        self.assertEqual(original.huellas.count(), 4)
+        duplicados = buscar_duplicados([original, distinta])
+        self.assertEqual([(d['id'], d['exacto']) for d in duplicados[original.id]],
+                         [(copia.id, True), (parecida.id, False)])
+        self.assertNotIn(distinta.id, duplicados)
+
+        admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=admin, rol='admin', must_change_password=False)
+        self.client.force_login(admin)
+        respuesta = self.client.get(reverse('portal:admin_pagos'))
+        self.assertContains(respuesta, f'⚠️ {copia.numero_operacion}', count=2)
+
+    @override_settings(COMPROBANTE_CANDIDATOS_POR_BANDA=2)
+    def test_bandas_comunes_no_traen_candidatos(self):
+        def pago(numero, phash):
+            nuevo = Pago.objects.create(deuda=self.deuda, monto_pagado=Decimal('1'), numero_operacion=numero,
+                                        comprobante_sha256=numero, comprobante_phash=phash)
+            guardar_bandas([nuevo])
+            return nuevo
+
+        # 0000 y ffff no se indexan; 1a2b la comparten tres pagos (más que el máximo)
+        original = pago('A', '0000ffff1a2b3c4d')
+        self.assertEqual(original.huellas.count(), 2)
+        parecido = pago('B', '0000ffff1a2a3c4d')
+        pago('C', '12341234' + '1a2b' + '9999')
+        distinto = pago('D', '00000000' + '1a2b' + '5555')
+        with self.assertNumQueries(3):
+            duplicados = buscar_duplicados([original, distinto])
+        self.assertEqual([d['id'] for d in duplicados[original.id]], [parecido.id])
+        self.assertNotIn(distinto.id, duplicados)
+
+    def test_generar_huellas_faltantes(self):
+        pago = Pago.objects.create(deuda=self.deuda, monto_pagado=Decimal('100'),
+                                   comprobante=SimpleUploadedFile('viejo.png', self.imagen()))
+
+        call_command('generar_huellas', stdout=io.StringIO())
+
+        pago.refresh_from_db()
+        self.assertEqual(len(pago.comprobante_sha256), 64)
+        self.assertEqual(sorted(pago.huellas.values_list('banda', flat=True))[0][0], '0')
+
+    def test_archivo_invalido(self):
+        respuesta = self.enviar('foto.jpg', b'no es una imagen', 'image/jpeg').json()
+        self.assertFalse(respuesta['success'])
+        self.assertFalse(Pago.objects.exists())
+
+
+class PagosLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        cls.alumno = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', familia=7, padre_dni=500)
+        cls.admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=cls.admin, rol='admin', must_change_password=False)
+
+    def deuda(self, monto, *pagos):
+        deuda = RegistroDeuda.objects.create(alumno=self.alumno, concepto=self.concepto, monto=Decimal(monto),
+                                             periodo=str(RegistroDeuda.objects.count()))
+        return deuda, [Pago.objects.create(deuda=deuda, monto_pagado=Decimal(p)).id for p in pagos]
+
+    def test_verificar_lote_con_pagos_parciales(self):
+        deuda1, ids1 = self.deuda('100', '30', '80')
+        deuda2, ids2 = self.deuda('50', '20')
+        recalcular_estadisticas()
+        obtener_vista_familia(500)
+
+        resultado = procesar_pagos(ids1 + ids2 + [999], 'verificar', self.admin)
+
+        self.assertEqual((len(resultado['procesados']), resultado['omitidos']), (3, 1))
+        deuda1.refresh_from_db()
+        deuda2.refresh_from_db()
+        self.assertEqual((deuda1.monto, deuda1.estado), (Decimal('0'), 'pago_verificado'))
+        self.assertEqual((deuda2.monto, deuda2.estado), (Decimal('30'), 'parcial'))
+        self.alumno.refresh_from_db()
+        self.assertEqual((self.alumno.saldo_moroso, self.alumno.deudas_pendientes), (Decimal('30'), 1))
+        self.assertEqual(SaldoFamilia.objects.get(familia=7).saldo, Decimal('30'))
+        self.assertEqual(obtener_estadisticas(), calcular_estadisticas())
+        self.assertEqual(RegistroAuditoria.objects.filter(accion='PAYMENT_VERIFIED').count(), 3)
+        self.assertEqual(obtener_vista_familia(500)['total_adeudado'], Decimal('30'))
+
+        # Repetir el lote no vuelve a descontar
+        self.assertEqual(procesar_pagos(ids1, 'verificar', self.admin)['omitidos'], 2)
+        deuda1.refresh_from_db()
+        self.assertEqual(deuda1.estado, 'pago_verificado')
+
+    def test_consultas_constantes_por_lote(self):
+        recalcular_estadisticas()
+
+        def consultas(cantidad):
+            ids = [self.deuda('100', '10')[1][0] for _ in range(cantidad)]
+            with CaptureQueriesContext(connection) as ctx:
+                procesar_pagos(ids, 'verificar', self.admin)
+            return len(ctx)
+
+        self.assertEqual(consultas(2), consultas(10))
+
+    def test_rechazar_desde_el_listado(self):
+        deuda, ids = self.deuda('100', '100', '100')
+        Pago.objects.filter(id=ids[1]).update(estado='verificado')
+        self.client.force_login(self.admin)
+
+        respuesta = self.client.post(reverse('portal:admin_pagos_lote'),
+                                     {'accion': 'rechazar', 'pagos': ids, 'estado': 'pendiente'})
+
+        self.assertRedirects(respuesta, reverse('portal:admin_pagos') + '?estado=pendiente',
+                             fetch_redirect_response=False)
+        self.assertEqual(dict(Pago.objects.values_list('id', 'estado')),
+                         {ids[0]: 'rechazado', ids[1]: 'verificado'})
+        deuda.refresh_from_db()
+        self.assertEqual(deuda.estado, 'pendiente')
+        self.assertEqual(RegistroAuditoria.objects.filter(accion='PAYMENT_REJECTED').count(), 1)
+
+        respuesta = self.client.get(reverse('portal:admin_pagos'))
+        self.assertContains(respuesta, f'name="pagos" value="{ids[0]}"')
+        self.assertNotContains(respuesta, f'name="pagos" value="{ids[1]}"')
+
+
+class VerificacionConcurrenteTests(TransactionTestCase):
+    """
+    Varios hilos verifican a la vez pagos parciales de una misma deuda, cada
+    pago dos veces. En PostgreSQL los bloqueos serializan las verificaciones;
+    el SQLite en memoria de los tests rechaza al escritor concurrente
+    ("table is locked") en lugar de esperar, y el hilo reintenta con el mismo
+    objeto (como un segundo POST con la página vieja).
+    """
+
+    def test_montos_sin_desvios(self):
+        concepto = ConceptoDeuda.objects.create(codigo='1', nombre='Cuota')
+        alumno = Alumno.objects.create(documento=1, apellido='A', nombres='Uno', familia=7)
+        deuda = RegistroDeuda.objects.create(alumno=alumno, concepto=concepto, monto=Decimal('1000'))
+        admin = User.objects.create_user('admin')
+        ids = [Pago.objects.create(deuda=deuda, monto_pagado=Decimal('30')).id for _ in range(10)]
+        recalcular_estadisticas()
+
+        # Cada hilo con su copia del pago y de la deuda, leídas antes de competir
+        copias = [Pago.objects.select_related('deuda').get(id=pago_id) for pago_id in ids for _ in range(2)]
+        barrera = threading.Barrier(len(copias))
+
+        def verificar(pago):
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        pago.verificar(admin)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=verificar, args=(pago,)) for pago in copias]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        deuda.refresh_from_db()
+        alumno.refresh_from_db()
+        self.assertEqual((deuda.monto, deuda.estado), (Decimal('700'), 'parcial'))
+        self.assertEqual(Pago.objects.filter(estado='verificado').count(), 10)
+        self.assertEqual(alumno.saldo_moroso, Decimal('700'))
+        self.assertEqual(obtener_estadisticas(), calcular_estadisticas())
+
+
+@override_settings(AUDITORIA_ASINCRONA=True, AUDITORIA_LOTE=3, AUDITORIA_INTERVALO_SEGUNDOS=60)
+class AuditoriaDiferidaTests(TransactionTestCase):
+    def esperar_registros(self, cantidad):
+        for _ in range(100):
+            if RegistroAuditoria.objects.count() >= cantidad:
+                break
+            time.sleep(0.05)
+        return RegistroAuditoria.objects.count()
+
+    def test_log_encola_e_inserta_en_lote(self):
+        usuario = User.objects.create_user('admin')
+        with self.assertNumQueries(0):
+            primero = RegistroAuditoria.log(usuario, 'LOGIN', 'uno')
+            RegistroAuditoria.log(usuario, 'LOGOUT', 'dos')
+        self.assertIsNone(primero.pk)
+        self.assertEqual(RegistroAuditoria.objects.count(), 0)
+
+        # Al completar el lote el hilo lo inserta sin esperar el intervalo
+        RegistroAuditoria.log(usuario, 'LOGIN', 'tres')
+        self.assertEqual(self.esperar_registros(3), 3)
+        self.assertEqual(RegistroAuditoria.objects.get(detalles='uno').timestamp, primero.timestamp)
+
+        # Vaciado sincrónico (el mismo que corre al terminar el proceso)
+        RegistroAuditoria.log(usuario, 'LOGOUT', 'cuatro')
+        self.assertEqual(vaciar_auditoria(), 1)
+        self.assertEqual(RegistroAuditoria.objects.count(), 4)
+
+    def test_registro_invalido_no_traba_la_cola(self):
+        usuario = User.objects.create_user('admin')
+        borrado = User.objects.create_user('borrado')
+        RegistroAuditoria.log(usuario, 'LOGIN', 'antes')
+        # Usuario borrado mientras su registro estaba en cola
+        RegistroAuditoria.log(borrado, 'LOGIN', 'huérfano')
+        User.objects.filter(pk=borrado.pk).delete()
+        with self.assertLogs('portal.auditoria_services', 'ERROR'):
+            self.assertEqual(vaciar_auditoria(), 1)
+        self.assertEqual(vaciar_auditoria(), 0)
+        self.assertEqual(list(RegistroAuditoria.objects.values_list('detalles', flat=True)), ['antes'])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class RetencionAuditoriaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin')
+        PerfilUsuario.objects.create(usuario=cls.admin, rol='admin', must_change_password=False)
+        cls.cajero = User.objects.create_user('cajero')
+        fechas = [
+            limite_retencion(14) + timedelta(days=3),
+            limite_retencion(13) + timedelta(days=10),
+            limite_retencion(13) + timedelta(days=11),
+            timezone.now() - timedelta(days=1),
+            timezone.now() - timedelta(days=10),
+        ]
+        for i, fecha in enumerate(fechas):
+            RegistroAuditoria.objects.create(usuario=cls.cajero if i % 2 else cls.admin, accion='LOGIN',
+                                             detalles=f'registro {i}', timestamp=fecha)
+
+    def test_archiva_meses_viejos(self):
+        from django.core.files.storage import default_storage
+
+        call_command('archivar_auditoria', stdout=io.StringIO())
+
+        self.assertEqual(sorted(RegistroAuditoria.objects.values_list('detalles', flat=True)),
+                         ['registro 3', 'registro 4'])
+        nombre = f"auditoria/auditoria-{limite_retencion(13):%Y-%m}.jsonl.gz"
+        with default_storage.open(nombre) as archivo:
+            filas = [json.loads(linea) for linea in gzip.decompress(archivo.read()).splitlines()]
+        self.assertEqual([(f['detalles'], f['usuario']) for f in filas],
+                         [('registro 1', 'cajero'), ('registro 2', 'admin')])
+
+    def test_filtro_por_rango_y_usuario(self):
+        self.client.force_login(self.admin)
+        desde = (timezone.localdate() - timedelta(days=15)).isoformat()
+        with CaptureQueriesContext(connection) as ctx:
+            respuesta = self.client.get(reverse('portal:admin_auditoria'), {'desde': desde, 'usuario': 'caj'})
+
+        self.assertEqual([r.detalles for r in respuesta.context['registros']], ['registro 3'])
+        self.assertFalse(any('cast_date' in q['sql'] for q in ctx.captured_queries))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class RendimientoTests(TestCase):
+    """
+    Presupuestos de consultas y de tiempo sobre un colegio realista
+    (datos_prueba: 1000 alumnos, 20 conceptos, 5000 pagos). Un N+1 nuevo
+    rompe el presupuesto de consultas; los tiempos son holgados y solo
+    atrapan degradaciones groseras.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.filas = sembrar_datos(alumnos=1000, conceptos=20, pagos=5000, auditoria=500)
+        recalcular_estadisticas()
+
+        cls.admin = User.objects.create_user('admin_rendimiento', password='x')
+        PerfilUsuario.objects.create(usuario=cls.admin, rol='admin', must_change_password=False)
+
+        # Padre de la familia 0 (alumnos 45000000 y 45000001)
+        cls.padre = User.objects.create_user('padre_rendimiento', password='x')
+        PerfilUsuario.objects.create(usuario=cls.padre, dni=20000000, must_change_password=False)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @contextmanager
+    def presupuesto(self, consultas, segundos):
+        """Falla si el bloque supera la cantidad de consultas o el tiempo."""
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            yield
+            duracion = time.perf_counter() - inicio
+        self.assertLessEqual(len(ctx), consultas, '\n'.join(q['sql'] for q in ctx.captured_queries[:50]))
+        self.assertLess(duracion, segundos, f'{duracion:.2f}s con {len(ctx)} consultas')
+
+    def get(self, usuario, nombre, consultas, segundos=2.0, **params):
+        if usuario:
+            self.client.force_login(usuario)
+        with self.presupuesto(consultas, segundos):
+            respuesta = self.client.get(reverse(f'portal:{nombre}'), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_datos_sembrados(self):
+        self.assertEqual(self.filas['alumnos'], 1000)
+        self.assertEqual(self.filas['pagos'], 5000)
+
+    def test_portal_padre(self):
+        # Sesión, usuario, perfil, configuración (get_or_create), versiones (la
+        # primera vez se crean con add), alumnos, deudas con concepto, pagos y
+        # el guardado en caché
+        respuesta = self.get(self.padre, 'portal_padre', consultas=28)
+        hijos = respuesta.context['alumnos']
+        self.assertEqual(len(hijos), 2)
+        for hijo in hijos:
+            self.assertEqual(hijo['total'], hijo['alumno'].saldo_moroso)
+
+        # La segunda visita sale de la caché: ninguna consulta a alumnos, deudas ni pagos
+        with CaptureQueriesContext(connection) as ctx:
+            self.get(self.padre, 'portal_padre', consultas=8)
+        self.assertFalse([q for q in ctx.captured_queries if 'portal_alumno' in q['sql']])
+
+    def test_consulta_publica(self):
+        # Límite por IP (lectura y escritura del balde), versiones (creadas con
+        # add), alumnos del DNI en una sola consulta (subconsulta a Vinculo, que
+        # ya cubre al alumno y a sus responsables), deudas con concepto y
+        # guardado en caché; después, el balde, las versiones y la caché
+        self.get(None, 'consulta_publica', consultas=26, dni='20000000')
+        self.get(None, 'consulta_publica', consultas=8, dni='20000000')
+
+    def test_admin_deudas(self):
+        # La primera carga llena la caché de facetas y totales
+        respuesta = self.get(self.admin, 'admin_deudas', consultas=20)
+        self.get(self.admin, 'admin_deudas', consultas=14, nivel='P', curso='3', division='A')
+        self.get(self.admin, 'admin_deudas', consultas=14, dni='gomez')
+        self.get(self.admin, 'admin_deudas', consultas=8, despues=respuesta.context['deudas'].cursor_siguiente)
+
+    def test_admin_pagos(self):
+        respuesta = self.get(self.admin, 'admin_pagos', consultas=13)
+        self.get(self.admin, 'admin_pagos', consultas=13, estado='pendiente')
+        self.get(self.admin, 'admin_pagos', consultas=7, despues=respuesta.context['pagos'].cursor_siguiente)
+
+    def test_admin_usuarios(self):
+        self.get(self.admin, 'admin_usuarios', consultas=5)
+        self.get(self.admin, 'admin_usuarios', consultas=7, grupo='P-3°A')
+
+    def test_admin_avisos(self):
+        self.get(self.admin, 'admin_avisos', consultas=10)
+
+    def exportar(self, formato, consultas, segundos):
+        self.client.force_login(self.admin)
+        with self.presupuesto(consultas, segundos):
+            respuesta = self.client.post(reverse('portal:admin_exportar'), {'formato': formato})
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = b''.join(respuesta.streaming_content)
+        respuesta.close()
+        return contenido
+
+    def test_exportar_csv(self):
+        contenido = self.exportar('csv', consultas=8, segundos=8)
+        self.assertEqual(len(contenido.decode('utf-8-sig').splitlines()), 1001)
+
+    def test_exportar_excel(self):
+        self.exportar('excel', consultas=8, segundos=12)
+
+    def importar(self, filas, consultas, segundos):
+        archivo = SimpleUploadedFile('deudas.csv', '\n'.join(filas).encode('utf-8'), content_type='text/csv')
+        with self.presupuesto(consultas, segundos):
+            respuesta = self.client.post(reverse('portal:admin_importar'), {'archivo': archivo, 'reemplazar': 'on'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_importar_csv(self):
+        # Reimporta filas del export. El importador consulta concepto y deuda
+        # por cada celda (20 conceptos): ~53 consultas por fila más ~70 fijas.
+        # Presupuestos medidos: 25 filas 1395 y 50 filas 2719, así que una
+        # consulta más por celda o por fila rompe los dos.
+        encabezado, *filas = self.exportar('csv', consultas=8, segundos=8).decode('utf-8-sig').splitlines()
+        self.importar([encabezado] + filas[:25], consultas=1400, segundos=6)
+        self.importar([encabezado] + filas[25:75], consultas=2730, segundos=12)
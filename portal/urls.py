@@ -23,6 +23,8 @@ urlpatterns = [
     path('admin-panel/deudas/', views.admin_deudas, name='admin_deudas'),
     path('admin-panel/pagos/', views.admin_pagos, name='admin_pagos'),
     path('admin-panel/verificar/<int:pago_id>/', views.admin_verificar_pago, name='admin_verificar_pago'),
+    path('admin-panel/pagos/lote/', views.admin_pagos_lote, name='admin_pagos_lote'),
+    path('admin-panel/buscar-alumnos/', views.admin_buscar_alumnos, name='admin_buscar_alumnos'),
     path('admin-panel/usuarios/', views.admin_usuarios, name='admin_usuarios'),
     path('admin-panel/usuarios/crear/', views.admin_crear_alumno, name='admin_crear_alumno'),
     path('admin-panel/reset-password/<int:usuario_id>/', views.admin_reset_password, name='admin_reset_password'),
@@ -36,7 +38,4 @@ urlpatterns = [
     path('admin-panel/config/', views.admin_config, name='admin_config'),
     path('admin-panel/auditoria/', views.admin_auditoria, name='admin_auditoria'),
     path('admin-panel/nuclear-reset/', views.reset_database_nuclear, name='nuclear_reset'),
-
-    # Test de email
-    path('admin-panel/test-email/', views.test_email_batch, name='test_email_batch'),
 ]
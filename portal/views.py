@@ -3,17 +3,31 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q, Sum, Count
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Count
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
-from django.core.paginator import Paginator
 import csv
 import re
 from decimal import Decimal
 
 from .models import (
     Alumno, RegistroDeuda, ConceptoDeuda, 
-    PerfilUsuario, Pago, ConfiguracionSistema, RegistroAuditoria
+    PerfilUsuario, Pago, ConfiguracionSistema, RegistroAuditoria, Responsable
+)
+from .paginacion import paginar_por_cursor, contar_con_cache
+from .comprobantes_services import normalizar_comprobante
+from .duplicados_services import buscar_duplicados, calcular_huellas, guardar_bandas, marcar_duplicados
+from .pagos_services import procesar_pagos
+from .busqueda_services import buscar_alumnos, buscar_similares
+from .saldos_services import saldos_diferidos
+from .limites_services import permitir_consulta_publica
+from .responsables_services import PRIORIDAD_EMAIL_USUARIOS, email_contacto, propagar_email
+from .vista_familia_services import obtener_consulta_publica, obtener_vista_familia
+from .estadisticas_services import (
+    obtener_estadisticas, recalcular_estadisticas, obtener_facetas_deudas,
+    registrar_cambio_deuda, registrar_cambio_pago, registrar_alta_alumno,
 )
 
 
@@ -124,32 +138,7 @@ def primer_login_view(request):
             
             # Actualizar email de alumnos vinculados a este DNI
             if request.user.perfil.dni:
-                alumnos_vinculados = Alumno.objects.filter(
-                    Q(padre_dni=request.user.perfil.dni) |
-                    Q(madre_dni=request.user.perfil.dni) |
-                    Q(tutor_dni=request.user.perfil.dni)
-                )
-                
-                for alumno in alumnos_vinculados:
-                    modificado = False
-                    if alumno.padre_dni == request.user.perfil.dni:
-                        alumno.padre_email = email
-                        modificado = True
-                    if alumno.madre_dni == request.user.perfil.dni:
-                        alumno.madre_email = email
-                        modificado = True
-                    if alumno.tutor_dni == request.user.perfil.dni:
-                        alumno.tutor_email = email
-                        modificado = True
-                    
-                    # Si no estaba registrado como tutor explícitamente pero el DNI del alumno
-                    # coincide con el DNI del usuario logueado (caso alumnos mayores)
-                    if not modificado and alumno.documento == request.user.perfil.dni:
-                        alumno.email = email
-                        modificado = True
-                        
-                    if modificado:
-                        alumno.save()
+                propagar_email(request.user.perfil.dni, email)
         
         RegistroAuditoria.log(request.user, 'PASSWORD_CHANGED', 'Primer ingreso completado', request)
         
@@ -177,33 +166,13 @@ def portal_padre(request):
     if hasattr(request.user, 'perfil') and request.user.perfil.dni:
         dni = request.user.perfil.dni
     
-    alumnos_data = []
-    total_general = 0
-    
-    if dni:
-        # Buscar alumnos por DNI de responsables
-        alumnos = Alumno.objects.filter(
-            Q(documento=dni) |
-            Q(padre_dni=dni) |
-            Q(madre_dni=dni) |
-            Q(tutor_dni=dni)
-        ).prefetch_related('deudas', 'deudas__concepto').distinct()
-        
-        for alumno in alumnos:
-            total_alumno = alumno.deudas.filter(estado__in=['pendiente', 'parcial'], monto__gt=0).aggregate(total=Sum('monto'))['total'] or 0
-            deudas_mostrar = alumno.deudas.exclude(estado='no_corresponde').order_by('concepto__orden')
-            
-            alumnos_data.append({
-                'alumno': alumno,
-                'deudas': deudas_mostrar,
-                'total': total_alumno,
-            })
-            total_general += total_alumno
+    # Hijos, deudas y pagos: desde la caché por DNI mientras la familia no cambie
+    vista = obtener_vista_familia(dni) if dni else {'alumnos': [], 'total_adeudado': 0}
     
     context = {
         'config': config,
-        'alumnos': alumnos_data,
-        'total_adeudado': total_general,
+        'alumnos': vista['alumnos'],
+        'total_adeudado': vista['total_adeudado'],
         'usuario': request.user,
     }
     
@@ -229,23 +198,49 @@ def enviar_comprobante(request, deuda_id):
             messages.error(request, 'Debe adjuntar un comprobante')
             return redirect('portal:portal_padre')
         
+        # Imagen achicada y re-codificada sin EXIF; PDF con miniatura de la 1ra página
+        try:
+            comprobante, miniatura = normalizar_comprobante(comprobante)
+        except ValidationError as e:
+            if is_ajax:
+                return JsonResponse({'success': False, 'error': e.messages[0]})
+            messages.error(request, e.messages[0])
+            return redirect('portal:portal_padre')
+        
         try:
             monto_decimal = Decimal(monto)
         except:
             monto_decimal = deuda.monto
         
         # Crear registro de pago
-        pago = Pago.objects.create(
-            deuda=deuda,
-            monto_pagado=monto_decimal,
-            comprobante=comprobante,
-            usuario_responsable=request.user
-        )
+        try:
+            sha256, phash = calcular_huellas(comprobante)
+            # El pago y sus bandas juntos: un pago sin bandas no se detectaría como repetido
+            with transaction.atomic():
+                pago = Pago.objects.create(
+                    deuda=deuda,
+                    monto_pagado=monto_decimal,
+                    comprobante=comprobante,
+                    miniatura=miniatura,
+                    comprobante_sha256=sha256,
+                    comprobante_phash=phash,
+                    usuario_responsable=request.user
+                )
+                guardar_bandas([pago])
+        finally:
+            # Los temporales re-codificados no pertenecen a request.FILES: se cierran acá
+            for archivo in (comprobante, miniatura):
+                if archivo is not None:
+                    archivo.close()
         
         # Actualizar estado de la deuda
+        deuda_anterior = (deuda.monto, deuda.estado)
         deuda.estado = 'comprobante_enviado'
         deuda.save()
         
+        registrar_cambio_pago(None, (pago.estado, pago.monto_pagado))
+        registrar_cambio_deuda(deuda_anterior, (deuda.monto, deuda.estado))
+        
         RegistroAuditoria.log(
             request.user, 'PAYMENT_SUBMITTED', 
             f'Pago enviado: {pago.numero_operacion} - ${monto_decimal} - {deuda.concepto.nombre}',
@@ -286,22 +281,14 @@ def ver_recibo(request, pago_id):
 @admin_required
 def admin_dashboard(request):
     """Dashboard administrativo con estadísticas."""
-    deudas_count = RegistroDeuda.objects.filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado', 'pago_verificado']).count()
-    pagos_pendientes = Pago.objects.filter(estado='pendiente').count()
-    pagos_verificados = Pago.objects.filter(estado='verificado').count()
-    total_recaudado = Pago.objects.filter(estado='verificado').aggregate(
-        total=Sum('monto_pagado'))['total'] or 0
-    
     # Pagos recientes pendientes de verificación
     pagos_recientes = Pago.objects.filter(estado='pendiente').order_by('-fecha_envio')[:5]
     
     context = {
-        'deudas_count': deudas_count,
-        'pagos_pendientes': pagos_pendientes,
-        'pagos_verificados': pagos_verificados,
-        'total_recaudado': total_recaudado,
         'pagos_recientes': pagos_recientes,
         'active_tab': 'dashboard',
+        # Estadísticas
+        **obtener_estadisticas(),
     }
     
     return render(request, 'portal/admin/dashboard.html', context)
@@ -311,14 +298,7 @@ def admin_dashboard(request):
 @admin_required
 def admin_deudas(request):
     """Lista de deudas con filtros y estadísticas."""
-    deudas = RegistroDeuda.objects.select_related('alumno', 'concepto').filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado']).order_by('-id')
-    
-    # Estadísticas para el dashboard
-    deudas_count = RegistroDeuda.objects.filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado', 'pago_verificado']).count()
-    pagos_pendientes = Pago.objects.filter(estado='pendiente').count()
-    pagos_verificados = Pago.objects.filter(estado='verificado').count()
-    total_recaudado = Pago.objects.filter(estado='verificado').aggregate(
-        total=Sum('monto_pagado'))['total'] or 0
+    deudas = RegistroDeuda.objects.select_related('alumno', 'concepto').filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado'])
     
     # Filtros
     nivel_filter = request.GET.get('nivel', '')
@@ -336,23 +316,30 @@ def admin_deudas(request):
     if estado_filter:
         deudas = deudas.filter(estado=estado_filter)
     if dni_filter:
-        deudas = deudas.filter(alumno__documento__icontains=dni_filter)
+        # DNI exacto o prefijo de DNI/apellido/nombre de alumno, padre, madre o tutor
+        coincidencias = buscar_alumnos(dni_filter)
+        if coincidencias is None:
+            deudas = deudas.none()
+        else:
+            deudas = deudas.filter(alumno__in=coincidencias)
+    
+    # Obtener opciones para los filtros (cacheadas, con cantidad de deudas por opción)
+    facetas = obtener_facetas_deudas()
     
-    # Obtener opciones para los filtros
     # Niveles
     niveles_map = {'I4': 'Inicial 4', 'I5': 'Inicial 5', 'P': 'Primario', 'S': 'Secundario'}
-    niveles_db = set(Alumno.objects.values_list('nivel', flat=True).distinct())
+    niveles_db = facetas['niveles']
     niveles_ordenados = ['I4', 'I5', 'P', 'S'] + sorted([n for n in niveles_db if n and n not in niveles_map])
-    niveles = [{'val': n, 'label': niveles_map.get(n, n), 'selected': n == nivel_filter} for n in niveles_ordenados]
+    niveles = [{'val': n, 'label': niveles_map.get(n, n), 'count': niveles_db.get(n, 0), 'selected': n == nivel_filter} for n in niveles_ordenados]
     
     # Cursos
-    cursos_db = Alumno.objects.values_list('curso', flat=True).distinct().order_by('curso')
+    cursos_db = facetas['cursos']
     cursos_map = {'1': '1ro', '2': '2do', '3': '3ro', '4': '4to', '5': '5to', '6': '6to'}
-    cursos = [{'val': c, 'label': cursos_map.get(c, c), 'selected': c == curso_filter} for c in cursos_db if c]
+    cursos = [{'val': c, 'label': cursos_map.get(c, c), 'count': cursos_db[c], 'selected': c == curso_filter} for c in sorted(cursos_db) if c]
     
     # Divisiones
-    divisiones_db = Alumno.objects.values_list('division', flat=True).distinct().order_by('division')
-    divisiones = [{'val': d, 'label': f"División {d}", 'selected': d == division_filter} for d in divisiones_db if d]
+    divisiones_db = facetas['divisiones']
+    divisiones = [{'val': d, 'label': f"División {d}", 'count': divisiones_db[d], 'selected': d == division_filter} for d in sorted(divisiones_db) if d]
     
     # Estados
     estados_options = [
@@ -362,9 +349,15 @@ def admin_deudas(request):
     ]
     estados = [{'val': k, 'label': v, 'selected': k == estado_filter} for k, v in estados_options]
 
-    paginator = Paginator(deudas, 50)
-    page = request.GET.get('page', 1)
-    deudas_page = paginator.get_page(page)
+    # Paginación por cursor: cada página cuesta lo mismo que la primera
+    deudas_page = paginar_por_cursor(
+        deudas, ['-id'], 50,
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+    )
+    deudas_page.total = contar_con_cache(deudas, 'deudas', {
+        'nivel': nivel_filter, 'curso': curso_filter, 'division': division_filter,
+        'estado': estado_filter, 'dni': dni_filter,
+    })
     
     context = {
         'deudas': deudas_page,
@@ -379,10 +372,7 @@ def admin_deudas(request):
         'dni_filter': dni_filter,
         'active_tab': 'deudas',
         # Estadísticas
-        'deudas_count': deudas_count,
-        'pagos_pendientes': pagos_pendientes,
-        'pagos_verificados': pagos_verificados,
-        'total_recaudado': total_recaudado,
+        **obtener_estadisticas(),
     }
     
     return render(request, 'portal/admin/deudas_final.html', context)
@@ -392,32 +382,27 @@ def admin_deudas(request):
 @admin_required
 def admin_pagos(request):
     """Lista de pagos con opción de verificar."""
-    pagos = Pago.objects.select_related('deuda', 'deuda__alumno', 'usuario_responsable').all()
-    
-    # Estadísticas para el dashboard
-    deudas_count = RegistroDeuda.objects.filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado', 'pago_verificado']).count()
-    pagos_pendientes = Pago.objects.filter(estado='pendiente').count()
-    pagos_verificados = Pago.objects.filter(estado='verificado').count()
-    total_recaudado = Pago.objects.filter(estado='verificado').aggregate(
-        total=Sum('monto_pagado'))['total'] or 0
+    pagos = Pago.objects.select_related('deuda', 'deuda__alumno', 'deuda__concepto', 'usuario_responsable').all()
     
     estado_filter = request.GET.get('estado', '')
     if estado_filter:
         pagos = pagos.filter(estado=estado_filter)
     
-    paginator = Paginator(pagos, 50)
-    page = request.GET.get('page', 1)
-    pagos_page = paginator.get_page(page)
+    # Paginación por cursor sobre (-fecha_envio, -id)
+    pagos_page = paginar_por_cursor(
+        pagos, ['-fecha_envio', '-id'], 50,
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+    )
+    pagos_page.total = contar_con_cache(pagos, 'pagos', {'estado': estado_filter})
+    # Comprobantes repetidos en otros pagos (búsqueda por índice de huellas)
+    marcar_duplicados(pagos_page)
     
     context = {
         'pagos': pagos_page,
         'estado_filter': estado_filter,
         'active_tab': 'pagos',
         # Estadísticas
-        'deudas_count': deudas_count,
-        'pagos_pendientes': pagos_pendientes,
-        'pagos_verificados': pagos_verificados,
-        'total_recaudado': total_recaudado,
+        **obtener_estadisticas(),
     }
     
     return render(request, 'portal/admin/pagos_fixed.html', context)
@@ -432,25 +417,21 @@ def admin_verificar_pago(request, pago_id):
     if request.method == 'POST':
         accion = request.POST.get('accion', 'verificar')
         
-        if accion == 'verificar':
-            pago.verificar(request.user)
-            RegistroAuditoria.log(
-                request.user, 'PAYMENT_VERIFIED',
-                f'Pago verificado: {pago.numero_operacion} - ${pago.monto_pagado}',
-                request
-            )
-            messages.success(request, f'Pago {pago.numero_operacion} verificado correctamente')
-        elif accion == 'rechazar':
-            pago.estado = 'rechazado'
-            pago.save()
-            pago.deuda.estado = 'pendiente'
-            pago.deuda.save()
-            messages.warning(request, f'Pago {pago.numero_operacion} rechazado')
+        # Mismo camino que el lote: filas bloqueadas y estado controlado en la base
+        if accion in ('verificar', 'rechazar'):
+            procesados = procesar_pagos([pago.id], accion, request.user, request)['procesados']
+            if not procesados:
+                messages.info(request, f'El pago {pago.numero_operacion} ya fue procesado')
+            elif accion == 'verificar':
+                messages.success(request, f'Pago {pago.numero_operacion} verificado correctamente')
+            else:
+                messages.warning(request, f'Pago {pago.numero_operacion} rechazado')
         
         return redirect('portal:admin_pagos')
     
     context = {
         'pago': pago,
+        'duplicados': buscar_duplicados([pago]).get(pago.id, []),
         'active_tab': 'pagos',
     }
     
@@ -459,30 +440,72 @@ def admin_verificar_pago(request, pago_id):
 
 @login_required
 @admin_required
-def admin_usuarios(request):
-    """Lista de alumnos por curso con estado de usuario."""
-    # Obtener todos los alumnos agrupados por curso
-    alumnos = Alumno.objects.all().order_by('apellido', 'nombres')
+def admin_pagos_lote(request):
+    """Verificar o rechazar los pagos seleccionados en el listado."""
+    if request.method != 'POST':
+        return redirect('portal:admin_pagos')
     
-    # Agrupar por curso
-    alumnos_por_curso = {}
+    accion = request.POST.get('accion', '')
+    pago_ids = [pago_id for pago_id in request.POST.getlist('pagos') if pago_id.isdigit()]
+    estado_filter = request.POST.get('estado', '')
+    destino = redirect('portal:admin_pagos')
+    if estado_filter in dict(Pago.ESTADO_CHOICES):
+        destino['Location'] += f'?estado={estado_filter}'
+    
+    if accion not in ('verificar', 'rechazar') or not pago_ids:
+        messages.error(request, 'Seleccione al menos un pago y una acción')
+        return destino
+    
+    resultado = procesar_pagos(pago_ids, accion, request.user, request)
+    cantidad = len(resultado['procesados'])
+    if accion == 'verificar':
+        messages.success(request, f'{cantidad} pagos verificados correctamente')
+    else:
+        messages.warning(request, f'{cantidad} pagos rechazados')
+    if resultado['omitidos']:
+        messages.info(request, f"{resultado['omitidos']} pagos omitidos (ya procesados o inexistentes)")
+    return destino
+
+
+@login_required
+@admin_required
+def admin_buscar_alumnos(request):
+    """Typeahead: alumnos parecidos al texto (nombres, responsables, DNIs, curso, barrio)."""
+    alumnos = buscar_similares(request.GET.get('q', ''), limite=10)
+    
+    return JsonResponse({'resultados': [
+        {
+            'documento': alumno.documento,
+            'nombre': alumno.nombre_completo,
+            'curso': alumno.curso_completo,
+            'responsables': [n for n in (alumno.padre_nombre, alumno.madre_nombre, alumno.tutor_nombre) if n],
+        }
+        for alumno in alumnos
+    ]})
+
+
+def _filas_usuarios(alumnos):
+    """
+    Filas del listado de usuarios: cada alumno con su perfil, buscado en una
+    sola consulta dni__in y unido en memoria.
+    """
+    perfiles = {}
+    for perfil in PerfilUsuario.objects.select_related('usuario').filter(
+        dni__in=[alumno.documento for alumno in alumnos]
+    ).order_by('id'):
+        perfiles.setdefault(perfil.dni, perfil)
+    
+    filas = []
     for alumno in alumnos:
-        curso = alumno.curso_completo if alumno.curso_completo else 'Sin curso asignado'
-        
-        if curso not in alumnos_por_curso:
-            alumnos_por_curso[curso] = []
-        
-        # Buscar si tiene usuario asociado
-        perfil = PerfilUsuario.objects.select_related('usuario').filter(dni=alumno.documento).first()
+        perfil = perfiles.get(alumno.documento)
         
         # Obtener email: Primero del usuario si existe, luego del tutor/responsable
-        email_responsable = ''
         if perfil and perfil.usuario.email:
             email_responsable = perfil.usuario.email
         else:
-            email_responsable = alumno.tutor_email or alumno.padre_email or alumno.madre_email or alumno.email or ''
+            email_responsable = email_contacto(alumno, PRIORIDAD_EMAIL_USUARIOS)
         
-        alumnos_por_curso[curso].append({
+        filas.append({
             'alumno': alumno,
             'nombre_completo': f"{alumno.nombres} {alumno.apellido}",
             'dni': alumno.documento,
@@ -491,9 +514,60 @@ def admin_usuarios(request):
             'tiene_usuario': perfil is not None,
             'must_change_password': perfil.must_change_password if perfil else True,
         })
+    return filas
+
+
+@login_required
+@admin_required
+def admin_usuarios(request):
+    """
+    Lista de alumnos por curso con estado de usuario. Solo se muestran los
+    cursos con su cantidad de alumnos; el curso elegido (o los resultados de
+    la búsqueda) se expande con sus alumnos.
+    """
+    grupo_filter = request.GET.get('grupo', '')
+    busqueda = request.GET.get('q', '').strip()
+    
+    # Cursos: una consulta agrupada y ordenada (varias combinaciones pueden dar la misma etiqueta)
+    grupos = {}
+    for fila in Alumno.objects.values('nivel', 'curso', 'division').annotate(
+        total=Count('documento')
+    ).order_by('nivel', 'curso', 'division'):
+        etiqueta = Alumno(**{k: fila[k] for k in ('nivel', 'curso', 'division')}).curso_completo or 'Sin curso asignado'
+        grupo = grupos.setdefault(etiqueta, {'total': 0, 'filtro': Q()})
+        grupo['total'] += fila['total']
+        grupo['filtro'] |= Q(nivel=fila['nivel'], curso=fila['curso'], division=fila['division'])
+    
+    alumnos = []
+    if busqueda:
+        coincidencias = buscar_alumnos(busqueda)
+        if coincidencias is not None:
+            alumnos = list(Alumno.objects.filter(documento__in=coincidencias).order_by('apellido', 'nombres')[:300])
+    elif grupo_filter in grupos:
+        alumnos = list(Alumno.objects.filter(grupos[grupo_filter]['filtro']).order_by('apellido', 'nombres'))
+    
+    # Agrupar por curso los alumnos expandidos (ya vienen ordenados por apellido)
+    expandidos = {}
+    for fila in _filas_usuarios(alumnos):
+        curso = fila['alumno'].curso_completo or 'Sin curso asignado'
+        expandidos.setdefault(curso, []).append(fila)
+    
+    cursos = []
+    for etiqueta in sorted(grupos):
+        grupo = grupos[etiqueta]
+        cursos.append({
+            'nombre': etiqueta,
+            'total': grupo['total'],
+            'expandido': etiqueta in expandidos,
+            'alumnos': expandidos.get(etiqueta, []),
+        })
+    if busqueda:
+        cursos = [c for c in cursos if c['expandido']]
     
     context = {
-        'alumnos_por_curso': dict(sorted(alumnos_por_curso.items())),
+        'cursos': cursos,
+        'grupo_filter': grupo_filter,
+        'busqueda': busqueda,
         'active_tab': 'usuarios',
     }
     
@@ -600,6 +674,7 @@ def admin_crear_alumno(request):
             tutor_nombre=tutor_nombre,
             tutor_dni=int(tutor_dni) if tutor_dni else None,
         )
+        registrar_alta_alumno()
         
         # Crear User
         user = User.objects.create_user(
@@ -640,27 +715,20 @@ def admin_crear_alumno(request):
 @admin_required
 def admin_avisos(request):
     """Envío de avisos de deuda."""
-    # Obtener morosos (deudas pendientes agrupadas por alumno)
+    from .email_services import emails_por_alumno
+    
+    # Obtener morosos (saldo desnormalizado, con índice)
     morosos = []
-    alumnos_con_deuda = Alumno.objects.filter(
-        deudas__estado='pendiente'
-    ).annotate(
-        total_deuda=Sum('deudas__monto', filter=Q(deudas__estado='pendiente'))
-    ).distinct()
+    alumnos_con_deuda = Alumno.objects.filter(saldo_moroso__gt=0)
+    
+    alumnos_con_deuda = list(alumnos_con_deuda)
+    emails = emails_por_alumno(alumnos_con_deuda)
     
     for alumno in alumnos_con_deuda:
-        # Buscar email del responsable
-        perfil = PerfilUsuario.objects.select_related('usuario').filter(dni=alumno.documento).first()
-        email = ''
-        if perfil and perfil.usuario.email:
-            email = perfil.usuario.email
-        else:
-            email = alumno.padre_email or alumno.madre_email or alumno.tutor_email or alumno.email
-        
         morosos.append({
             'alumno': alumno,
-            'email': email,
-            'total_deuda': alumno.total_deuda or 0,
+            'email': emails[alumno.documento],
+            'total_deuda': alumno.saldo_moroso,
         })
     
     context = {
@@ -680,7 +748,10 @@ def admin_enviar_avisos_masivos(request):
     Envía el mismo mensaje genérico a todos los morosos con email.
     Lanza el envío en un hilo separado para no trabar Railway.
     """
-    from .email_services import enviar_emails_masivos_async
+    from .email_services import (
+        enviar_emails_masivos_async, preparar_destinatarios,
+        emails_por_alumno, mensaje_a_html,
+    )
     
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Método no permitido'})
@@ -692,29 +763,27 @@ def admin_enviar_avisos_masivos(request):
         return JsonResponse({'success': False, 'error': 'Debe completar el asunto y el mensaje'})
     
     # Obtener morosos con deuda pendiente
-    alumnos_con_deuda = Alumno.objects.filter(
-        deudas__estado='pendiente'
-    ).distinct()
+    alumnos_con_deuda = Alumno.objects.filter(saldo_moroso__gt=0)
     
     destinatarios = []
     emails_sin_correo = []
     
+    # Prioridad: email del User (actualizado en primer login) > emails del Alumno
+    alumnos_con_deuda = list(alumnos_con_deuda)
+    emails = emails_por_alumno(alumnos_con_deuda)
+    
     for alumno in alumnos_con_deuda:
-        # Prioridad: email del User (actualizado en primer login) > emails del Alumno
-        perfil = PerfilUsuario.objects.select_related('usuario').filter(dni=alumno.documento).first()
-        email = ''
-        if perfil and perfil.usuario.email:
-            email = perfil.usuario.email
-        else:
-            email = alumno.padre_email or alumno.madre_email or alumno.tutor_email or alumno.email
-        
+        email = emails[alumno.documento]
         if email:
             destinatarios.append(email)
         else:
             emails_sin_correo.append(alumno.nombre_completo)
     
-    # Deduplicar emails (un padre puede tener varios hijos)
-    destinatarios = list(set(destinatarios))
+    # Normalizar, validar y deduplicar (un padre puede tener varios hijos);
+    # las direcciones en la lista de supresión no se encolan
+    preparados = preparar_destinatarios(destinatarios)
+    destinatarios = preparados['validos']
+    descartados = preparados['invalidos'] + preparados['suprimidos']
     
     if not destinatarios:
         return JsonResponse({
@@ -723,15 +792,7 @@ def admin_enviar_avisos_masivos(request):
         })
     
     # Construir versión HTML del mensaje con links clicables
-    import re
-    mensaje_html = mensaje.replace('\n', '<br>')
-    # Hacer clicables las URLs del portal
-    mensaje_html = re.sub(
-        r'(https?://[^\s<]+)',
-        r'<a href="\1" target="_blank" style="color:#1976D2;font-weight:bold;">\1</a>',
-        mensaje_html
-    )
-    mensaje_html = f'<div style="font-family:Arial,sans-serif;font-size:15px;line-height:1.6;color:#333;">{mensaje_html}</div>'
+    mensaje_html = mensaje_a_html(mensaje)
     
     # Lanzar envío en hilo separado (no bloquea Railway)
     enviar_emails_masivos_async(
@@ -756,6 +817,7 @@ def admin_enviar_avisos_masivos(request):
         'enviados': len(destinatarios),
         'emails': destinatarios,
         'sin_correo': emails_sin_correo,
+        'descartados': descartados,
         'message': f'Envío masivo iniciado: {len(destinatarios)} emails se están enviando en segundo plano'
     })
 
@@ -824,16 +886,13 @@ def admin_cobro(request):
 def admin_archivos(request):
     """Vista unificada de Archivos (Importar/Exportar)."""
     # Datos para Exportar
-    alumnos_count = Alumno.objects.count()
-    deudas_count = RegistroDeuda.objects.filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado', 'pago_verificado']).count()
-    total_deuda = RegistroDeuda.objects.filter(monto__gt=0).exclude(estado__in=['no_corresponde', 'pagado', 'pago_verificado']).aggregate(
-        total=Sum('monto'))['total'] or 0
+    estadisticas = obtener_estadisticas()
     
     # Contexto base
     context = {
-        'alumnos_count': alumnos_count,
-        'deudas_count': deudas_count,
-        'total_deuda': total_deuda,
+        'alumnos_count': estadisticas['alumnos_count'],
+        'deudas_count': estadisticas['deudas_count'],
+        'total_deuda': estadisticas['total_deuda'],
         'active_tab': 'archivos',
         'fecha_actual': timezone.now().strftime('%Y%m%d'),
         'resultados': request.session.pop('import_resultados', None) # Recuperar resultados si existen
@@ -844,6 +903,7 @@ def admin_archivos(request):
 
 @login_required
 @admin_required
+@saldos_diferidos()
 def admin_importar(request):
     """Importar deudas desde Excel o CSV - Soporta formato del colegio."""
     import openpyxl
@@ -1196,6 +1256,9 @@ def admin_importar(request):
                     if result.get('user_created'):
                         users_created += 1
             
+            # La importación cambia deudas y alumnos en bloque: recálculo completo
+            recalcular_estadisticas()
+            
             # Guardar resultados
             resultados = {
                 'added': added,
@@ -1539,12 +1602,7 @@ def admin_exportar(request):
         response = FileResponse(file_handle, as_attachment=True, filename=filename)
         return response
     
-    # GET - Mostrar página
-    alumnos_count = Alumno.objects.count()
-    deudas_count = RegistroDeuda.objects.filter(estado='pendiente').count()
-    total_deuda = RegistroDeuda.objects.filter(estado='pendiente').aggregate(
-        total=Sum('monto'))['total'] or 0
-    
+    # GET - La página de exportación vive en Archivos
     return redirect('portal:admin_archivos')
 
 
@@ -1579,29 +1637,40 @@ def admin_config(request):
 @admin_required
 def admin_auditoria(request):
     """Log de auditoría."""
-    from datetime import datetime
+    from datetime import datetime, timedelta
     
+    # `fecha` (un solo día) se mantiene por compatibilidad con links viejos
     fecha = request.GET.get('fecha', '')
+    desde = request.GET.get('desde', '') or fecha
+    hasta = request.GET.get('hasta', '') or fecha
     usuario = request.GET.get('usuario', '')
 
     registros = RegistroAuditoria.objects.select_related('usuario').all()
     
-    if fecha:
-        try:
-            dt = datetime.strptime(fecha, '%Y-%m-%d')
-            registros = registros.filter(timestamp__date=dt.date())
-        except ValueError:
-            pass
+    # Rango sobre timestamp (usa el índice), en lugar de timestamp__date
+    try:
+        if desde:
+            inicio = timezone.make_aware(datetime.strptime(desde, '%Y-%m-%d'))
+            registros = registros.filter(timestamp__gte=inicio)
+        if hasta:
+            fin = timezone.make_aware(datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1))
+            registros = registros.filter(timestamp__lt=fin)
+    except ValueError:
+        pass
             
     if usuario:
-        registros = registros.filter(usuario__username__icontains=usuario)
+        # Primero los usuarios (tabla chica), después el índice (usuario, -timestamp)
+        registros = registros.filter(
+            usuario_id__in=User.objects.filter(username__icontains=usuario).values('id')
+        )
 
     registros = registros[:200]
     
     context = {
         'registros': registros,
         'active_tab': 'auditoria',
-        'filtro_fecha': fecha,
+        'filtro_desde': desde,
+        'filtro_hasta': hasta,
         'filtro_usuario': usuario,
     }
     
@@ -1609,6 +1678,7 @@ def admin_auditoria(request):
 
 
 @user_passes_test(lambda u: u.is_superuser)
+@saldos_diferidos()
 def reset_database_nuclear(request):
     try:
         # Borrado en orden para respetar claves foráneas
@@ -1616,9 +1686,11 @@ def reset_database_nuclear(request):
         RegistroDeuda.objects.all().delete()
         ConceptoDeuda.objects.all().delete()
         Alumno.objects.all().delete()
+        Responsable.objects.all().delete()
         
         # Borrar usuarios normales (padres), preservando superusuarios y staff
         User.objects.filter(is_superuser=False, is_staff=False).delete()
+        recalcular_estadisticas()
         
         return HttpResponse('''
             <div style="font-family: sans-serif; text-align: center; margin-top: 50px;">
@@ -1654,82 +1726,19 @@ def consulta_publica(request):
         
         try:
             dni_int = int(dni)
-            
-            alumnos = Alumno.objects.filter(
-                Q(documento=dni_int) |
-                Q(padre_dni=dni_int) |
-                Q(madre_dni=dni_int) |
-                Q(tutor_dni=dni_int)
-            ).prefetch_related('deudas', 'deudas__concepto').distinct()
-            
-            if alumnos.exists():
-                alumnos_data = []
-                total_general = 0
-                
-                for alumno in alumnos:
-                    total_alumno = alumno.deudas.filter(estado__in=['pendiente', 'parcial'], monto__gt=0).aggregate(total=Sum('monto'))['total'] or 0
-                    
-                    alumnos_data.append({
-                        'alumno': alumno,
-                        'deudas': alumno.deudas.all(),
-                        'total': total_alumno,
-                    })
-                    total_general += total_alumno
-                
-                context['alumnos'] = alumnos_data
-                context['total_adeudado'] = total_general
-            else:
-                context['mensaje_error'] = f'No se encontraron registros para el DNI {dni}'
-                
         except ValueError:
             context['mensaje_error'] = 'Por favor ingrese un DNI válido (solo números)'
+            return render(request, 'portal/consulta_publica.html', context)
+        
+        if not permitir_consulta_publica(request):
+            context['mensaje_error'] = 'Demasiadas consultas seguidas. Espere un minuto e intente nuevamente.'
+            return render(request, 'portal/consulta_publica.html', context, status=429)
+        
+        vista = obtener_consulta_publica(dni_int)
+        if vista['alumnos']:
+            context['alumnos'] = vista['alumnos']
+            context['total_adeudado'] = vista['total_adeudado']
+        else:
+            context['mensaje_error'] = f'No se encontraron registros para el DNI {dni}'
     
     return render(request, 'portal/consulta_publica.html', context)
-
-
-# ==================== TEST EMAIL ====================
-
-@login_required
-@admin_required
-def test_email_batch(request):
-    """
-    Vista de prueba para verificar el sistema de envío masivo.
-    Envía 5 emails de prueba usando el servicio de batching.
-    Solo accesible para administradores.
-    """
-    from .email_services import enviar_emails_masivos
-    from django.conf import settings as django_settings
-
-    # 5 emails de prueba (cambiar por direcciones propias)
-    emails_prueba = [
-        'joeljjs100@gmail.com',
-        'clientmagnetweb@gmail.com',
-    ]
-
-    resultado = enviar_emails_masivos(
-        destinatarios=emails_prueba,
-        asunto='[TEST] Prueba de envío masivo — Colegio Nuevo Siglo',
-        mensaje_texto=(
-            'Este es un email de prueba del sistema de envío masivo.\n'
-            'Si recibís este mensaje, el sistema funciona correctamente.\n\n'
-            'Colegio Nuevo Siglo'
-        ),
-        mensaje_html=(
-            '<h2>Prueba de Envío Masivo</h2>'
-            '<p>Este es un email de prueba del sistema de envío masivo.</p>'
-            '<p>Si recibís este mensaje, el sistema funciona correctamente.</p>'
-            '<br><p><strong>Colegio Nuevo Siglo</strong></p>'
-        ),
-        batch_size=1,
-        delay=30,
-    )
-
-    backend_actual = django_settings.EMAIL_BACKEND
-    test_mode = getattr(django_settings, 'EMAIL_TEST_MODE', True)
-
-    return JsonResponse({
-        'success': True,
-        'modo': 'CONSOLA (test)' if test_mode else 'SMTP REAL',
-        'backend': backend_actual,
-        'resultado': resultado,
-    })
@@ -0,0 +1,188 @@
+"""
+vista_familia_services.py — Caché por DNI del portal de padres y de la
+consulta pública de deudas.
+
+La vista de una familia (hijos, deudas con concepto, historial de pagos y
+totales) se arma una vez y se guarda en la caché compartida con una clave
+que incluye la versión de datos de ese DNI. Mientras nada de la familia
+cambie, las visitas siguientes no consultan Alumno, RegistroDeuda ni Pago.
+La caché es la tabla portal_cache (DatabaseCache): un acierto sigue siendo
+un par de lecturas a la base (versiones y vista), más las de sesión y
+usuario de cualquier pedido; lo que se evita es armar la vista.
+
+Invalidación:
+- Cada alta, cambio o baja de una deuda o de un pago de un alumno renueva la
+  versión de los DNIs que lo ven (sus vínculos: el propio alumno, padre,
+  madre, tutor y otros responsables).
+- Un cambio de datos del alumno o de un concepto, o una operación masiva
+  (importación, reset), renueva la versión global y descarta todas.
+Las entradas viejas quedan huérfanas y vencen solas (PORTAL_CACHE_SEGUNDOS).
+Una versión que falta (nunca creada, o descartada al llenarse la caché) se
+crea con un valor nuevo en lugar de asumir 0: así nunca se vuelve a una
+clave vieja que todavía tenga una vista guardada.
+
+La consulta pública usa las mismas versiones con vencimientos cortos
+(CONSULTA_PUBLICA_CACHE_SEGUNDOS) y guarda también los DNIs sin alumnos,
+para que los reintentos con DNIs inexistentes no lleguen a la base.
+"""
+
+import logging
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION_GLOBAL = 'portal:familia_version'
+
+
+def _clave_version(dni):
+    return f'{CLAVE_VERSION_GLOBAL}:{dni}'
+
+
+def _nueva_version():
+    return time.time_ns()
+
+
+def _versiones(claves):
+    """
+    Versiones actuales de las claves (1 lectura). Las que faltan se crean con
+    add() (si otro worker la creó antes, gana la suya) y se vuelven a leer.
+    """
+    versiones = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in versiones]
+    if faltantes:
+        for clave in faltantes:
+            cache.add(clave, _nueva_version(), None)
+        versiones.update(cache.get_many(faltantes))
+    # Si aun así no está (descartada en el medio), una versión de un solo uso
+    return [versiones.get(clave) or _nueva_version() for clave in claves]
+
+
+def _clave_vista(prefijo, dni):
+    """Clave de caché con la versión global y la del DNI."""
+    version_global, version_dni = _versiones([CLAVE_VERSION_GLOBAL, _clave_version(dni)])
+    return f"portal:{prefijo}:{dni}:{version_global}:{version_dni}"
+
+
+def construir_vista_familia(dni):
+    """
+    Hijos del DNI con sus deudas (sin las que no corresponden), pagos y
+    totales, en 3 consultas fijas; los totales se calculan en memoria.
+
+    Returns:
+        dict con claves: alumnos (list de dicts alumno/deudas/total), total_adeudado
+    """
+    from .models import Pago, RegistroDeuda
+    from .responsables_services import alumnos_de_responsable
+    from .saldos_services import ESTADOS_CON_SALDO
+
+    alumnos = alumnos_de_responsable(dni).prefetch_related(
+        Prefetch(
+            'deudas',
+            queryset=RegistroDeuda.objects.exclude(estado='no_corresponde')
+            .select_related('concepto')
+            .order_by('concepto__orden', 'concepto__codigo')
+            .prefetch_related(Prefetch('pagos', queryset=Pago.objects.order_by('-fecha_envio', '-id'))),
+            to_attr='deudas_mostrar',
+        )
+    )
+
+    alumnos_data = []
+    total_general = Decimal('0')
+    for alumno in alumnos:
+        total_alumno = sum(
+            (d.monto for d in alumno.deudas_mostrar if d.estado in ESTADOS_CON_SALDO and d.monto > 0),
+            Decimal('0'),
+        )
+        alumnos_data.append({
+            'alumno': alumno,
+            'deudas': alumno.deudas_mostrar,
+            'total': total_alumno,
+        })
+        total_general += total_alumno
+
+    return {'alumnos': alumnos_data, 'total_adeudado': total_general}
+
+
+def obtener_vista_familia(dni):
+    """
+    Vista de la familia del DNI desde la caché; se arma y se guarda si la
+    versión cambió desde la última visita.
+    """
+    clave = _clave_vista('familia', dni)
+    vista = cache.get(clave)
+    if vista is None:
+        vista = construir_vista_familia(dni)
+        cache.set(clave, vista, getattr(settings, 'PORTAL_CACHE_SEGUNDOS', 3600))
+    return vista
+
+
+def construir_consulta_publica(dni):
+    """
+    Alumnos del DNI con todas sus deudas y el saldo desnormalizado
+    (2 consultas fijas).
+
+    Returns:
+        dict con claves: alumnos (list de dicts alumno/deudas/total), total_adeudado
+    """
+    from .models import RegistroDeuda
+    from .responsables_services import alumnos_de_responsable
+
+    alumnos = alumnos_de_responsable(dni).prefetch_related(
+        Prefetch('deudas', queryset=RegistroDeuda.objects.select_related('concepto'))
+    )
+
+    alumnos_data = [
+        {'alumno': alumno, 'deudas': alumno.deudas.all(), 'total': alumno.saldo_moroso}
+        for alumno in alumnos
+    ]
+    return {
+        'alumnos': alumnos_data,
+        'total_adeudado': sum((data['total'] for data in alumnos_data), Decimal('0')),
+    }
+
+
+def obtener_consulta_publica(dni):
+    """
+    Resultado de la consulta pública desde la caché. Los DNIs sin alumnos
+    también se guardan (caché negativa), con su propio vencimiento.
+    """
+    clave = _clave_vista('consulta', dni)
+    vista = cache.get(clave)
+    if vista is None:
+        vista = construir_consulta_publica(dni)
+        if vista['alumnos']:
+            segundos = getattr(settings, 'CONSULTA_PUBLICA_CACHE_SEGUNDOS', 60)
+        else:
+            segundos = getattr(settings, 'CONSULTA_PUBLICA_CACHE_NEGATIVA_SEGUNDOS', 300)
+        cache.set(clave, vista, segundos)
+    return vista
+
+
+def invalidar_familias(dnis):
+    """Renueva la versión de los DNIs indicados (ignora vacíos)."""
+    dnis = {dni for dni in dnis if dni}
+    if not dnis:
+        return
+    version = _nueva_version()
+    cache.set_many({_clave_version(dni): version for dni in dnis}, None)
+
+
+def invalidar_familias_de(alumnos):
+    """Renueva la versión de todos los DNIs que ven a estos alumnos (queryset de Alumno)."""
+    from .responsables_services import dnis_vinculados
+    from .saldos_services import en_lote
+
+    if en_lote():
+        return
+    invalidar_familias(dnis_vinculados(alumnos))
+
+
+def invalidar_todas_las_familias():
+    """Descarta la vista cacheada de todas las familias."""
+    cache.set(CLAVE_VERSION_GLOBAL, _nueva_version(), None)
+    logger.info("[PORTAL] Caché de familias invalidada")